@@ -0,0 +1,254 @@
+"""
+Scaling benchmark for the Unreal publish collector.
+
+Runs the full Level Sequences collection pass of
+`hooks/tk-multi-publish2/unreal/collector.py` outside of Unreal, against a
+synthetic project generated with the stand-in :mod:`fake_unreal` module, and
+reports wall time, `unreal.load_asset` calls, scanned Level Sequences and peak
+Python memory for each scenario.
+
+Usage::
+
+    python benchmarks/collector/bench_collector.py --sequences 20 --shots 50 --cuts 2
+    python benchmarks/collector/bench_collector.py --sequences 10 20 40 --json bench_output.txt
+
+With `--json`, one JSON record per scenario is appended to the given file, so
+results can be tracked over time.
+"""
+import argparse
+import datetime
+import importlib.util
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(BENCHMARK_DIR, os.pardir, os.pardir))
+COLLECTOR_PATH = os.path.join(
+    REPO_ROOT, "hooks", "tk-multi-publish2", "unreal", "collector.py"
+)
+
+sys.path.insert(0, BENCHMARK_DIR)
+import fake_unreal  # noqa: E402
+
+
+class _Setting(object):
+    def __init__(self, value):
+        self.value = value
+
+
+class _Item(object):
+    def __init__(self, item_type, display_type, name):
+        self.type = item_type
+        self.display_type = display_type
+        self.name = name
+        self.properties = {}
+        self.children = []
+
+    def create_item(self, item_type, display_type, name):
+        item = _Item(item_type, display_type, name)
+        self.children.append(item)
+        return item
+
+    def set_icon_from_path(self, path):
+        pass
+
+
+class _UnrealSGEngine(object):
+    selected_assets = []
+
+    def object_path(self, asset):
+        return asset.object_path
+
+
+class _Engine(object):
+    unreal_sg_engine = _UnrealSGEngine()
+
+
+class _HookBase(object):
+    def __init__(self, *args, **kwargs):
+        self.logger = logging.getLogger("bench_collector")
+        self.parent = None
+        self.disk_location = BENCHMARK_DIR
+
+    @property
+    def settings(self):
+        return {}
+
+
+def _install_fake_modules():
+    """
+    Install the fake `unreal` and `sgtk` modules needed to import the collector.
+    """
+    sgtk = types.ModuleType("sgtk")
+    sgtk.get_hook_baseclass = lambda: _HookBase
+    platform = types.ModuleType("sgtk.platform")
+    # The same engine is used for the whole session.
+    engine = _Engine()
+    platform.current_engine = lambda: engine
+    qt = types.ModuleType("sgtk.platform.qt")
+
+    class QCoreApplication(object):
+        @staticmethod
+        def processEvents():
+            pass
+
+    qt.QtCore = types.SimpleNamespace(QCoreApplication=QCoreApplication)
+    sgtk.platform = platform
+    platform.qt = qt
+    sys.modules["sgtk"] = sgtk
+    sys.modules["sgtk.platform"] = platform
+    sys.modules["sgtk.platform.qt"] = qt
+    sys.modules["unreal"] = fake_unreal
+
+
+def _load_collector_class():
+    _install_fake_modules()
+    spec = importlib.util.spec_from_file_location("unreal_collector", COLLECTOR_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.UnrealSessionCollector
+
+
+def _get_revision():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=REPO_ROOT,
+                stderr=subprocess.DEVNULL,
+            )
+            .decode("utf-8")
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_collection(collector_class, settings):
+    """
+    Run a single collection pass and return its measurements.
+
+    :returns: A dictionary with the measurements.
+    """
+    fake_unreal.reset_stats()
+    collector = collector_class()
+    root_item = _Item("root", "root", "root")
+    tracemalloc.start()
+    start = time.perf_counter()
+    collector.collect_selected_assets(root_item, settings)
+    wall_time = time.perf_counter() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "wall_time": wall_time,
+        "load_asset_calls": fake_unreal.stats["load_asset"],
+        "scanned_sequences": fake_unreal.stats["find_master_tracks_by_type"],
+        "peak_memory": peak_memory,
+        "items": len(root_item.children),
+    }
+
+
+def run_scenarios(collector_class, sequences, shots, cuts):
+    """
+    Run all benchmark scenarios for a project of the given size.
+
+    :returns: A list of (scenario name, measurements) tuples.
+    """
+    root_dir = tempfile.mkdtemp(prefix="bench_collector_")
+    try:
+        project = fake_unreal.build_project(root_dir, sequences, shots, cuts)
+        results = []
+        for name, lazy, cache, index, clear_cache in [
+            ("eager, no cache", False, False, False, False),
+            ("lazy, cold cache", True, True, False, True),
+            ("lazy, warm cache", True, True, False, False),
+            # The first pass populates the session index from the disk cache.
+            (None, True, True, True, False),
+            ("lazy, session index", True, True, True, False),
+        ]:
+            if clear_cache:
+                shutil.rmtree(project.saved_dir, ignore_errors=True)
+            # Every pass starts from a freshly started editor.
+            project.unload_all()
+            settings = {
+                "Lazy Level Sequence Items": _Setting(lazy),
+                "Cache Sequence Edits": _Setting(cache),
+                "Keep Sequence Edits Index": _Setting(index),
+                "Scope To Context": _Setting(False),
+            }
+            result = run_collection(collector_class, settings)
+            if name:
+                results.append((name, result))
+        return results
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sequences",
+        type=int,
+        nargs="+",
+        default=[10, 20, 40],
+        help="Number of sequences, several values can be given.",
+    )
+    parser.add_argument(
+        "--shots", type=int, default=20, help="Number of shots per sequence."
+    )
+    parser.add_argument(
+        "--cuts", type=int, default=2, help="Number of master sequences."
+    )
+    parser.add_argument("--json", help="Append JSON records to the given file.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    collector_class = _load_collector_class()
+    revision = _get_revision()
+    records = []
+    print(
+        "%-9s %-20s %6s %10s %8s %8s %12s"
+        % ("sequences", "scenario", "items", "wall (s)", "loads", "scans", "peak (KiB)")
+    )
+    for sequences in args.sequences:
+        for name, result in run_scenarios(
+            collector_class, sequences, args.shots, args.cuts
+        ):
+            print(
+                "%-9d %-20s %6d %10.3f %8d %8d %12.1f"
+                % (
+                    sequences,
+                    name,
+                    result["items"],
+                    result["wall_time"],
+                    result["load_asset_calls"],
+                    result["scanned_sequences"],
+                    result["peak_memory"] / 1024.0,
+                )
+            )
+            record = {
+                "date": datetime.datetime.now().isoformat(),
+                "revision": revision,
+                "sequences": sequences,
+                "shots": args.shots,
+                "cuts": args.cuts,
+                "scenario": name,
+            }
+            record.update(result)
+            records.append(record)
+    if args.json:
+        with open(args.json, "a") as fh:
+            for record in records:
+                fh.write("%s\n" % json.dumps(record))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Stand-in for the Unreal Python API used by the Unreal publish collector.
+
+Only the subset of the API needed by the collector is implemented. A project
+is described with :func:`build_project`, which populates a fake asset registry
+with Level Sequences laid out like a typical cinematic project.
+
+Calls to :func:`load_asset` are counted in :data:`stats`, together with the
+number of Level Sequences scanned for shot tracks.
+"""
+import os
+
+# Counters updated by the fake API, reset with reset_stats().
+stats = {
+    "load_asset": 0,
+    "find_master_tracks_by_type": 0,
+    "collect_garbage": 0,
+}
+
+_project = None
+
+
+def reset_stats():
+    """
+    Reset all counters in :data:`stats`.
+    """
+    for key in stats:
+        stats[key] = 0
+
+
+class TopLevelAssetPath(object):
+    def __init__(self, package_name, asset_name):
+        self.package_name = package_name
+        self.asset_name = asset_name
+
+
+class ARFilter(object):
+    def __init__(self, class_paths=None, package_paths=None, recursive_paths=False):
+        self.class_paths = class_paths or []
+        self.package_paths = package_paths or []
+        self.recursive_paths = recursive_paths
+
+
+class AssetRegistryDependencyOptions(object):
+    pass
+
+
+class AssetData(object):
+    def __init__(self, package_name, asset_name, class_name):
+        self.package_name = package_name
+        self.package_path = package_name.rsplit("/", 1)[0]
+        self.asset_name = asset_name
+        self.asset_class_path = TopLevelAssetPath("/Script/LevelSequence", class_name)
+
+    @property
+    def object_path(self):
+        return "%s.%s" % (self.package_name, self.asset_name)
+
+
+class MovieSceneCinematicShotTrack(object):
+    def __init__(self, name, sections):
+        self._name = name
+        self._sections = sections
+
+    def get_name(self):
+        return self._name
+
+    def get_sections(self):
+        return list(self._sections)
+
+
+class MovieSceneCinematicShotSection(object):
+    def __init__(self, name, sequence):
+        self._name = name
+        self._sequence = sequence
+
+    def get_name(self):
+        return self._name
+
+    def get_sequence(self):
+        return self._sequence
+
+
+class LevelSequence(object):
+    def __init__(self, asset_data):
+        self._asset_data = asset_data
+        self._tracks = []
+        # Some payload so loaded sequences show up in memory measurements.
+        self._payload = bytearray(1024)
+
+    def get_name(self):
+        return self._asset_data.asset_name
+
+    def get_path_name(self):
+        return self._asset_data.object_path
+
+    def find_master_tracks_by_type(self, track_type):
+        stats["find_master_tracks_by_type"] += 1
+        return [track for track in self._tracks if isinstance(track, track_type)]
+
+
+class FakeProject(object):
+    """
+    A fake project with Level Sequences and their shot tracks.
+    """
+
+    def __init__(self, content_dir, saved_dir):
+        self.content_dir = content_dir
+        self.saved_dir = saved_dir
+        self.assets = []
+        # Object path -> (asset data, list of child asset data)
+        self._sequences = {}
+        self._loaded = {}
+        self._referencers = {}
+
+    def add_sequence(self, package_name, children=None):
+        asset_data = AssetData(
+            package_name, package_name.rsplit("/", 1)[-1], "LevelSequence"
+        )
+        self.assets.append(asset_data)
+        self._sequences[asset_data.object_path] = (asset_data, list(children or []))
+        for child in children or []:
+            self._referencers.setdefault(child.package_name, []).append(package_name)
+        return asset_data
+
+    def write_package_files(self):
+        for asset_data in self.assets:
+            package_file = os.path.join(
+                self.content_dir,
+                "%s.uasset" % asset_data.package_name[len("/Game/") :],
+            )
+            package_dir = os.path.dirname(package_file)
+            if not os.path.isdir(package_dir):
+                os.makedirs(package_dir)
+            with open(package_file, "wb") as fh:
+                fh.write(b"\0" * 64)
+
+    def unload_all(self):
+        self._loaded = {}
+
+    def load(self, object_path):
+        lvseq = self._loaded.get(object_path)
+        if lvseq:
+            return lvseq
+        entry = self._sequences.get(object_path)
+        if not entry:
+            return None
+        asset_data, children = entry
+        lvseq = LevelSequence(asset_data)
+        self._loaded[object_path] = lvseq
+        if children:
+            sections = [
+                MovieSceneCinematicShotSection(
+                    "MovieSceneCinematicShotSection_%d" % i,
+                    self.load(child.object_path),
+                )
+                for i, child in enumerate(children)
+            ]
+            lvseq._tracks.append(
+                MovieSceneCinematicShotTrack("MovieSceneCinematicShotTrack_0", sections)
+            )
+        return lvseq
+
+    def get_referencers(self, package_name):
+        return self._referencers.get(package_name, [])
+
+
+def build_project(root_dir, sequences, shots, cuts, write_files=True):
+    """
+    Populate the fake asset registry with a synthetic cinematic project.
+
+    The project has `cuts` master sequences, each of them containing the same
+    `sequences` sequences, each of them containing `shots` shots.
+
+    :param str root_dir: Folder for the fake project Content and Saved folders.
+    :param int sequences: Number of sequences.
+    :param int shots: Number of shots per sequence.
+    :param int cuts: Number of master sequences, i.e. alternate cuts.
+    :param bool write_files: Whether to write package files on disk, which are
+                             needed to validate the collector cache.
+    :returns: A :class:`FakeProject` instance.
+    """
+    global _project
+    project = FakeProject(
+        os.path.join(root_dir, "Content"),
+        os.path.join(root_dir, "Saved"),
+    )
+    seq_assets = []
+    for seq_index in range(sequences):
+        seq_name = "Seq_%03d" % (seq_index + 1)
+        shot_assets = [
+            project.add_sequence(
+                "/Game/Cinematics/Sequences/%s/Shot_%03d_%04d/Shot_%03d_%04d"
+                % (
+                    seq_name,
+                    seq_index + 1,
+                    (shot_index + 1) * 10,
+                    seq_index + 1,
+                    (shot_index + 1) * 10,
+                )
+            )
+            for shot_index in range(shots)
+        ]
+        seq_assets.append(
+            project.add_sequence(
+                "/Game/Cinematics/Sequences/%s/%s" % (seq_name, seq_name),
+                shot_assets,
+            )
+        )
+    for cut_index in range(cuts):
+        project.add_sequence(
+            "/Game/Cinematics/Master_Cut%02d" % (cut_index + 1),
+            seq_assets,
+        )
+    if write_files:
+        project.write_package_files()
+    _project = project
+    return project
+
+
+class _AssetRegistry(object):
+    def get_assets_by_class(self, class_path):
+        return [
+            asset
+            for asset in _project.assets
+            if asset.asset_class_path.asset_name == class_path.asset_name
+        ]
+
+    def get_assets(self, ar_filter):
+        class_names = set(class_path.asset_name for class_path in ar_filter.class_paths)
+        assets = []
+        for asset in _project.assets:
+            if class_names and asset.asset_class_path.asset_name not in class_names:
+                continue
+            if ar_filter.package_paths:
+                matched = False
+                for package_path in ar_filter.package_paths:
+                    if asset.package_path == package_path or (
+                        ar_filter.recursive_paths
+                        and asset.package_path.startswith(package_path + "/")
+                    ):
+                        matched = True
+                        break
+                if not matched:
+                    continue
+            assets.append(asset)
+        return assets
+
+    def get_assets_by_package_name(self, package_name):
+        return [
+            asset for asset in _project.assets if asset.package_name == package_name
+        ]
+
+    def get_referencers(self, package_name, options=None):
+        return _project.get_referencers(package_name)
+
+
+_asset_registry = _AssetRegistry()
+
+
+class AssetRegistryHelpers(object):
+    @staticmethod
+    def get_asset_registry():
+        return _asset_registry
+
+
+class EditorLoadingAndSavingUtils(object):
+    @staticmethod
+    def get_dirty_content_packages():
+        return []
+
+
+class Paths(object):
+    @staticmethod
+    def project_content_dir():
+        return _project.content_dir
+
+    @staticmethod
+    def project_saved_dir():
+        return _project.saved_dir
+
+    @staticmethod
+    def convert_relative_path_to_full(path):
+        return os.path.abspath(path)
+
+
+class ScopedSlowTask(object):
+    def __init__(self, work, desc=""):
+        self.work = work
+        self.desc = desc
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def make_dialog(self, can_cancel=False):
+        pass
+
+    def enter_progress_frame(self, work=1, desc=""):
+        pass
+
+    def should_cancel(self):
+        return False
+
+
+class SystemLibrary(object):
+    @staticmethod
+    def collect_garbage():
+        stats["collect_garbage"] += 1
+        _project.unload_all()
+
+
+def load_asset(object_path, type=None):
+    stats["load_asset"] += 1
+    return _project.load(object_path)
@@ -2,19 +2,532 @@
 # This file has been modified by Epic Games, Inc. and is subject to the license
 # file included in this repository.
 
-from collections import namedtuple, defaultdict
-import copy
+from collections import namedtuple, defaultdict, deque
+import json
 import os
+import re
+import sys
+import tempfile
 
 import unreal
 
 import sgtk
 
-# A named tuple to store LevelSequence edits: the sequence/track/section
-# the edit is in.
+# A named tuple to store LevelSequence edits: the object path of the parent
+# Level Sequence and the names of the track/section the edit is in.
 SequenceEdit = namedtuple("SequenceEdit", ["sequence", "track", "section"])
 
 
+def _get_package_stamp(package_name):
+    """
+    Return a stamp for the given package which changes each time the package
+    is saved.
+
+    The stamp is built from the package file modification time and size. Only
+    packages from the project content folder can be resolved to a file on disk.
+
+    :param str package_name: A long package name, e.g. `/Game/Cinematics/Shot_010`.
+    :returns: A string or None if the package file can't be found.
+    """
+    if not package_name.startswith("/Game/"):
+        return None
+    package_file = os.path.join(
+        unreal.Paths.convert_relative_path_to_full(unreal.Paths.project_content_dir()),
+        "%s.uasset" % package_name[len("/Game/"):],
+    )
+    try:
+        stat = os.stat(package_file)
+    except OSError:
+        return None
+    return "%d:%d" % (stat.st_mtime_ns, stat.st_size)
+
+
+def _get_process_memory():
+    """
+    Return the memory used by the current process.
+
+    :returns: The resident memory size in bytes, or None if it can't be
+              retrieved.
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(PROCESS_MEMORY_COUNTERS)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+    try:
+        with open("/proc/self/statm", "r") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+
+def _get_object_name(object_path):
+    """
+    Return the object name from the given object path.
+
+    :param str object_path: An object path, e.g. `/Game/Cinematics/Shot_010.Shot_010`.
+    :returns: The object name, e.g. `Shot_010`.
+    """
+    return object_path.rsplit("/", 1)[-1].rsplit(".", 1)[-1]
+
+
+def _apply_fields_to_prefix(definition, fields):
+    """
+    Apply fields to the given template definition, up to the first key which
+    is not available in the fields.
+
+    :param str definition: A template definition, e.g. `/Game/{Sequence}/{Shot}/`.
+    :param dict fields: A dictionary of field values.
+    :returns: A string, e.g. `/Game/seq_010/`.
+    """
+    resolved = []
+    for token in re.split(r"(\{[^}]+\})", definition):
+        if token.startswith("{") and token.endswith("}"):
+            key_name = token[1:-1]
+            if fields.get(key_name) is None:
+                break
+            token = "%s" % fields[key_name]
+        resolved.append(token)
+    return "".join(resolved)
+
+
+class SequenceEditCache(object):
+    """
+    On disk cache of Level Sequence edits.
+
+    Each entry is keyed by a Level Sequence package name and stores the package
+    stamp it was computed with, its object path and the list of shots found in
+    its cinematic shot tracks. Entries are only returned for packages whose
+    stamp didn't change since they were written.
+    """
+    # Bump this when the layout of entries changes to discard stale caches.
+    VERSION = 1
+
+    def __init__(self, path):
+        """
+        Instantiate a new cache for the given file, call :meth:`load` to read it.
+
+        :param str path: Full path to the cache file.
+        """
+        self.path = path
+        self._packages = {}
+        self._modified = False
+
+    def load(self):
+        """
+        Read the cache file, if any.
+
+        A missing, unreadable or outdated cache file results in an empty cache.
+
+        :returns: This :class:`SequenceEditCache` instance.
+        """
+        self._packages = {}
+        self._modified = False
+        try:
+            with open(self.path, "r") as fh:
+                data = json.load(fh)
+        except (IOError, OSError, ValueError):
+            return self
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            return self
+        self._packages = data.get("packages") or {}
+        return self
+
+    def save(self):
+        """
+        Write the cache file if it was modified.
+
+        The file is written to a temporary file first and then moved in place,
+        so concurrent editor sessions never read a partial cache.
+        """
+        if not self._modified:
+            return
+        cache_dir = os.path.dirname(self.path)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        f, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=cache_dir)
+        with os.fdopen(f, "w") as fh:
+            json.dump({"version": self.VERSION, "packages": self._packages}, fh)
+        os.replace(tmp_path, self.path)
+        self._modified = False
+
+    def get(self, package_name):
+        """
+        Return the cached entry for the given package if it is still valid.
+
+        :param str package_name: A long package name.
+        :returns: A dictionary or None.
+        """
+        entry = self._packages.get(package_name)
+        if not entry:
+            return None
+        stamp = _get_package_stamp(package_name)
+        if not stamp or entry["stamp"] != stamp:
+            return None
+        return entry
+
+    def set(self, package_name, object_path, shots):
+        """
+        Store an entry for the given package, with its current stamp.
+
+        Nothing is stored if the package stamp can't be retrieved.
+
+        :param str package_name: A long package name.
+        :param str object_path: The Level Sequence object path.
+        :param shots: A list of (child object path, track name, section name) lists.
+        """
+        stamp = _get_package_stamp(package_name)
+        if not stamp:
+            return
+        self._packages[package_name] = {
+            "stamp": stamp,
+            "object_path": object_path,
+            "shots": shots,
+        }
+        self._modified = True
+
+    def prune(self, package_names):
+        """
+        Discard entries for packages which are not in the given list.
+
+        :param package_names: A set of long package names to keep.
+        """
+        for package_name in list(self._packages.keys()):
+            if package_name not in package_names:
+                del self._packages[package_name]
+                self._modified = True
+
+
+class SequenceEditIndex(SequenceEditCache):
+    """
+    Session lifetime, in memory index of Level Sequence edits.
+
+    The index is a :class:`SequenceEditCache` whose entries are kept in memory
+    for the whole Unreal session, so the cache file is only read the first
+    time the publisher is opened. Entries are stored on the current engine
+    rather than in this module, so they survive hook reloads. Like with the
+    on disk cache, entries are only returned for packages whose stamp didn't
+    change since they were stored.
+
+    Use :func:`get_sequence_edit_index` to retrieve the index for the current
+    session.
+    """
+    # Name of the engine attribute storing entries for the session, as a
+    # dictionary where keys are cache file paths and values their entries.
+    ENGINE_ATTRIBUTE = "_publish2_sequence_edits"
+
+    def load(self):
+        """
+        Retrieve entries for the current session, reading the cache file the
+        first time.
+
+        :returns: This :class:`SequenceEditIndex` instance.
+        """
+        engine = sgtk.platform.current_engine()
+        session_entries = getattr(engine, self.ENGINE_ATTRIBUTE, None)
+        if session_entries is None:
+            session_entries = {}
+            setattr(engine, self.ENGINE_ATTRIBUTE, session_entries)
+        packages = session_entries.get(self.path)
+        if packages is None:
+            super(SequenceEditIndex, self).load()
+            session_entries[self.path] = self._packages
+        else:
+            self._packages = packages
+            self._modified = False
+        return self
+
+
+def get_sequence_edit_index(cache_path):
+    """
+    Return the :class:`SequenceEditIndex` for the current session.
+
+    :param str cache_path: Full path to the on disk cache file used by the index.
+    :returns: A :class:`SequenceEditIndex` instance.
+    """
+    return SequenceEditIndex(cache_path).load()
+
+
+class SequenceEditGraph(object):
+    """
+    Edit graph for all Level Sequences in the project.
+
+    The graph is built in a single pass over the asset registry: each Level
+    Sequence asset is enumerated once and its cinematic shot tracks are scanned
+    to record child -> parent edits. When a :class:`SequenceEditCache` is used,
+    only Level Sequences whose package changed since the cache was written are
+    loaded and scanned. The graph is meant to be built once per collection and
+    shared by everything which needs to know about Level Sequences and their
+    edits.
+
+    Level Sequences are identified by their object path in the graph, use
+    :meth:`load` to retrieve the actual :class:`unreal.LevelSequence`.
+    """
+    def __init__(self, cache=None):
+        """
+        Instantiate an empty graph, call :meth:`build` to populate it.
+
+        :param cache: Optional :class:`SequenceEditCache` instance.
+        """
+        self._cache = cache
+        # Level Sequence asset data, in the order returned by the asset registry.
+        self.assets = []
+        # Child -> parent adjacency: keys are Level Sequence object paths,
+        # values the list of SequenceEdit they are in.
+        self.edits = defaultdict(list)
+        # Object paths of Level Sequences which are not a sub-sequence of
+        # another one.
+        self.roots = []
+        # Loaded Level Sequences, keyed by their object path.
+        self.sequences = {}
+        # Number of Level Sequences scanned during the last build.
+        self.scanned_count = 0
+        # Edit paths to the top Level Sequences computed from the edits, keyed
+        # by Level Sequence object path.
+        self.paths_cache = {}
+        # Whether the last build completed.
+        self.complete = False
+
+    def build(self, package_paths=None):
+        """
+        Enumerate Level Sequences and record their edits.
+
+        See :meth:`iter_build` for details.
+
+        :param package_paths: Optional list of content paths, e.g. `/Game/Cinematics`,
+                              to restrict the enumeration to.
+        :returns: This :class:`SequenceEditGraph` instance.
+        """
+        for _ in self.iter_build(package_paths):
+            pass
+        return self
+
+    def iter_build(self, package_paths=None, chunk_size=100):
+        """
+        Enumerate Level Sequences and record their edits, by chunks.
+
+        If package paths are given, only Level Sequences under them are
+        enumerated with a recursive asset registry filter. Level Sequences they
+        are a sub-sequence of are then retrieved from the asset registry
+        referencers and added to the graph, so edits paths can still be
+        resolved up to the top Level Sequences, without enumerating the whole
+        project.
+
+        This is a generator which yields after each chunk of Level Sequences
+        is processed, so callers can report progress and stop the build. The
+        graph is only complete when the generator is exhausted, but the cache is
+        saved with the Level Sequences scanned so far even if the build is
+        stopped.
+
+        :param package_paths: Optional list of content paths, e.g. `/Game/Cinematics`,
+                              to restrict the enumeration to.
+        :param int chunk_size: Number of Level Sequences to process in each chunk.
+        :yields: A (number of processed Level Sequences, total number of Level
+                 Sequences) tuple. The total can grow when parent Level Sequences
+                 are discovered.
+        """
+        # Start from an empty graph, the same instance can be built again,
+        # e.g. for the whole project if nothing was found under the given paths.
+        self.complete = False
+        self.paths_cache = {}
+        self.edits = defaultdict(list)
+        self.roots = []
+        self.sequences = {}
+        self.scanned_count = 0
+        asset_helper = unreal.AssetRegistryHelpers.get_asset_registry()
+        level_sequence_class = unreal.TopLevelAssetPath("/Script/LevelSequence", "LevelSequence")
+        if package_paths:
+            # Retrieve Level Sequence assets under the given paths
+            ar_filter = unreal.ARFilter(
+                class_paths=[level_sequence_class],
+                package_paths=package_paths,
+                recursive_paths=True,
+            )
+            self.assets = asset_helper.get_assets(ar_filter)
+        else:
+            # Retrieve all Level Sequence assets
+            self.assets = asset_helper.get_assets_by_class(level_sequence_class)
+        # Packages modified in the editor but not saved yet can't be trusted
+        # from the cache.
+        dirty_packages = set(
+            "%s" % package.get_name()
+            for package in unreal.EditorLoadingAndSavingUtils.get_dirty_content_packages()
+        )
+        object_paths = []
+        pending = deque(self.assets)
+        package_names = set("%s" % lvseq_asset.package_name for lvseq_asset in self.assets)
+        processed_count = 0
+        try:
+            while pending:
+                lvseq_asset = pending.popleft()
+                processed_count += 1
+                object_path = self.add_asset(lvseq_asset, dirty_packages)
+                if object_path:
+                    object_paths.append(object_path)
+                    if package_paths:
+                        # Bring in Level Sequences outside of the given paths which this
+                        # one is a sub-sequence of.
+                        for parent_asset in self._get_parent_assets(asset_helper, lvseq_asset):
+                            package_name = "%s" % parent_asset.package_name
+                            if package_name not in package_names:
+                                package_names.add(package_name)
+                                pending.append(parent_asset)
+                if processed_count % chunk_size == 0 and pending:
+                    yield processed_count, processed_count + len(pending)
+            self.roots = [
+                object_path for object_path in object_paths if not self.edits.get(object_path)
+            ]
+            self.complete = True
+            # Only a subset of the Level Sequences is known when the enumeration
+            # is restricted, keep other entries in this case.
+            if self._cache and not package_paths:
+                self._cache.prune(package_names)
+            yield processed_count, processed_count
+        finally:
+            if self._cache:
+                self._cache.save()
+
+    def add_asset(self, lvseq_asset, dirty_packages=None):
+        """
+        Add the given Level Sequence asset to the graph.
+
+        Edits for the Level Sequence are retrieved from the cache if its package
+        didn't change, otherwise the Level Sequence is loaded and scanned.
+
+        :param lvseq_asset: An :class:`unreal.AssetData` instance for a Level Sequence.
+        :param dirty_packages: Optional set of package names modified but not saved
+                               in the editor.
+        :returns: The Level Sequence object path or None if it couldn't be loaded.
+        """
+        object_path = self.get_object_path(lvseq_asset)
+        package_name = "%s" % lvseq_asset.package_name
+        shots = None
+        use_cache = self._cache and package_name not in (dirty_packages or ())
+        if use_cache:
+            entry = self._cache.get(package_name)
+            if entry:
+                shots = entry["shots"]
+        if shots is None:
+            lvseq = self.load(object_path)
+            if not lvseq:
+                return None
+            shots = self._scan_shots(lvseq)
+            self.scanned_count += 1
+            if use_cache:
+                self._cache.set(package_name, object_path, shots)
+        for child_path, track_name, section_name in shots:
+            self.edits[child_path].append(
+                SequenceEdit(object_path, track_name, section_name)
+            )
+        return object_path
+
+    def _get_parent_assets(self, asset_helper, lvseq_asset):
+        """
+        Return Level Sequence assets referencing the given Level Sequence asset.
+
+        :param asset_helper: An :class:`unreal.AssetRegistry` instance.
+        :param lvseq_asset: An :class:`unreal.AssetData` instance for a Level Sequence.
+        :returns: A list of :class:`unreal.AssetData` instances.
+        """
+        parent_assets = []
+        referencers = asset_helper.get_referencers(
+            lvseq_asset.package_name,
+            unreal.AssetRegistryDependencyOptions(),
+        )
+        for referencer in referencers or []:
+            for asset in asset_helper.get_assets_by_package_name(referencer):
+                if asset.asset_class_path.asset_name == "LevelSequence":
+                    parent_assets.append(asset)
+        return parent_assets
+
+    def _scan_shots(self, lvseq):
+        """
+        Return the shots in the cinematic shot tracks of the given Level Sequence.
+
+        :param lvseq: A :class:`unreal.LevelSequence` instance.
+        :returns: A list of (child object path, track name, section name) lists.
+        """
+        shots = []
+        for track in lvseq.find_master_tracks_by_type(unreal.MovieSceneCinematicShotTrack):
+            for section in track.get_sections():
+                # Not sure if you can have anything else than a MovieSceneSubSection
+                # in a MovieSceneCinematicShotTrack, but let's be cautious here.
+                try:
+                    # Get the Sequence attached to the section.
+                    section_seq = section.get_sequence()
+                except AttributeError:
+                    continue
+                if not section_seq:
+                    continue
+                shots.append([
+                    section_seq.get_path_name(),
+                    track.get_name(),
+                    section.get_name(),
+                ])
+        return shots
+
+    def load(self, object_path):
+        """
+        Return the Level Sequence for the given object path, loading it if needed.
+
+        :param str object_path: A Level Sequence object path.
+        :returns: A :class:`unreal.LevelSequence` instance or None.
+        """
+        lvseq = self.sequences.get(object_path)
+        if lvseq is None:
+            lvseq = unreal.load_asset(object_path, unreal.LevelSequence)
+            if lvseq:
+                self.sequences[object_path] = lvseq
+        return lvseq
+
+    def release(self):
+        """
+        Release references to all Level Sequences loaded by this graph.
+
+        Level Sequences are not unloaded until Unreal garbage collection runs,
+        and only if nothing else references them.
+
+        :returns: The number of Level Sequences released.
+        """
+        released_count = len(self.sequences)
+        self.sequences = {}
+        return released_count
+
+    def get_object_path(self, asset):
+        """
+        Return the object path for the given asset.
+
+        :param asset: An :class:`unreal.AssetData` instance.
+        :returns: A string.
+        """
+        unreal_sg = sgtk.platform.current_engine().unreal_sg_engine
+        return "%s" % unreal_sg.object_path(asset)
+
+
 HookBaseClass = sgtk.get_hook_baseclass()
 
 print("COLLECTOR LOADING")
@@ -40,6 +553,17 @@ class UnrealSessionCollector(HookBaseClass):
             os.environ['WONJIN_COLLECTOR'] += os.pathsep + 'COLLECTOR_INIT'
         else:
             os.environ['WONJIN_COLLECTOR'] = 'COLLECTOR_INIT'
+        # Set to True to stop the current collection after the current chunk.
+        self._cancel_requested = False
+
+    def cancel_collection(self):
+        """
+        Request the current collection to stop as soon as possible.
+
+        The collection is stopped after the Level Sequences chunk being
+        processed.
+        """
+        self._cancel_requested = True
             
     @property
     def settings(self):
@@ -75,6 +599,64 @@ class UnrealSessionCollector(HookBaseClass):
                                "to publish plugins via the collected item's "
                                "properties. ",
             },
+            "Lazy Level Sequence Items": {
+                "type": "bool",
+                "default": True,
+                "description": "If True, Level Sequences are not loaded when "
+                               "items are collected but only when a publish "
+                               "plugin needs them.",
+            },
+            "Scope To Context": {
+                "type": "bool",
+                "default": True,
+                "description": "If True, only Level Sequences under the content "
+                               "paths for the current Shot, Sequence or Asset "
+                               "context are collected. All Level Sequences in "
+                               "the project are collected otherwise, or if no "
+                               "Level Sequences are found under these paths.",
+            },
+            "Shot Content Path Template": {
+                "type": "str",
+                "default": "unreal_loader_shot_path",
+                "description": "Name of the template string used to retrieve "
+                               "the content path for Shot and Sequence contexts.",
+            },
+            "Asset Content Path Template": {
+                "type": "str",
+                "default": "unreal_loader_asset_path",
+                "description": "Name of the template string used to retrieve "
+                               "the content path for Asset contexts.",
+            },
+            "Collection Chunk Size": {
+                "type": "int",
+                "default": 100,
+                "description": "Number of Level Sequences processed between "
+                               "progress reports, when the collection can "
+                               "be cancelled.",
+            },
+            "Garbage Collection Threshold": {
+                "type": "int",
+                "default": 50,
+                "description": "Number of Level Sequences loaded during the "
+                               "collection from which Unreal garbage "
+                               "collection is run after the collection, to "
+                               "unload them. 0 disables it.",
+            },
+            "Cache Sequence Edits": {
+                "type": "bool",
+                "default": True,
+                "description": "If True, Level Sequence edits are cached in the "
+                               "project Saved folder and only Level Sequences "
+                               "saved since the last collection are scanned.",
+            },
+            "Keep Sequence Edits Index": {
+                "type": "bool",
+                "default": True,
+                "description": "If True, Level Sequence edits are also kept in "
+                               "memory for the whole Unreal session, so the "
+                               "cache file is only read once. Only used if "
+                               "'Cache Sequence Edits' is True.",
+            },
         }
 
         collector_settings.update(work_template_setting)
@@ -93,7 +675,7 @@ class UnrealSessionCollector(HookBaseClass):
         parent_item = self.collect_current_session(settings, parent_item)
 
         # Collect assets selected in Unreal
-        self.collect_selected_assets(parent_item)
+        self.collect_selected_assets(parent_item, settings)
         
     def collect_current_session(self, settings, parent_item):
         """
@@ -172,47 +754,81 @@ class UnrealSessionCollector(HookBaseClass):
         asset_item.properties["asset_type"] = asset_type
         return asset_item
 
-    def collect_selected_assets(self, parent_item):
+    def collect_selected_assets(self, parent_item, settings=None):
         """
         Creates items for all Level Sequences and selected assets in Unreal.
+
+        Level Sequences are processed by chunks. Progress is reported after each
+        chunk, Unreal and Qt events are processed and the collection can be
+        cancelled, either from the Unreal progress dialog or with
+        :meth:`cancel_collection`.
         
         :param parent_item: Parent Item instance
+        :param dict settings: Optional configured settings for this collector
         """
         unreal_sg = sgtk.platform.current_engine().unreal_sg_engine
+        self._cancel_requested = False
+        chunk_size = 100
+        lazy = True
+        gc_threshold = 50
+        if settings:
+            gc_setting = settings.get("Garbage Collection Threshold")
+            if gc_setting and gc_setting.value is not None:
+                gc_threshold = gc_setting.value
+            chunk_setting = settings.get("Collection Chunk Size")
+            if chunk_setting and chunk_setting.value:
+                chunk_size = max(1, chunk_setting.value)
+            lazy_setting = settings.get("Lazy Level Sequence Items")
+            if lazy_setting:
+                lazy = lazy_setting.value
         
-        # First collect all Level Sequences in the project
-        sequence_edits = self.retrieve_sequence_edits()
-        asset_helper = unreal.AssetRegistryHelpers.get_asset_registry()
-        level_sequence_class = unreal.TopLevelAssetPath("/Script/LevelSequence", "LevelSequence")
-        
-        # Get all Level Sequences in the project
-        all_level_sequences = asset_helper.get_assets_by_class(level_sequence_class)
-        
-        # Create items for all Level Sequences first
-        for level_sequence_asset in all_level_sequences:
-            asset_path = "%s" % unreal_sg.object_path(level_sequence_asset)
-            asset_name = "%s" % level_sequence_asset.asset_name
-            level_sequence = unreal.load_asset(asset_path)
-            
-            if level_sequence:
-                for edits_path in self.get_all_paths_from_sequence(level_sequence, sequence_edits):
-                    # Reverse the path to have it from top master sequence to the shot
-                    edits_path.reverse()
-                    self.logger.info("Collected %s" % [x.get_name() for x in edits_path])
-                    if len(edits_path) > 1:
-                        display_name = "%s (%s)" % (edits_path[0].get_name(), edits_path[-1].get_name())
-                    else:
-                        display_name = edits_path[0].get_name()
-                    
-                    item = self.create_asset_item(
-                        parent_item,
-                        edits_path[0].get_path_name(),
-                        "LevelSequence",
-                        edits_path[0].get_name(),
-                        display_name,
+        # First collect all Level Sequences in the project, the edit graph
+        # enumerates each of them exactly once and only loads the ones which
+        # are not up to date in the cache.
+        content_paths = self.get_context_content_paths(settings)
+        if content_paths:
+            self.logger.info("Collecting Level Sequences under %s" % ", ".join(content_paths))
+        sequence_graph = SequenceEditGraph(self.get_sequence_edit_cache(settings))
+        with unreal.ScopedSlowTask(2, "Collecting Level Sequences...") as slow_task:
+            slow_task.make_dialog(True)
+            slow_task.enter_progress_frame(1, "Scanning Level Sequences edits...")
+            self._build_sequence_graph(sequence_graph, content_paths, chunk_size, slow_task)
+            if content_paths and sequence_graph.complete and not sequence_graph.assets:
+                # Level Sequences for the context are not where the templates
+                # expect them, don't silently collect nothing.
+                self.logger.warning(
+                    "No Level Sequences found under %s, collecting Level Sequences "
+                    "from the whole project. Check the content path templates or "
+                    "disable the \"Scope To Context\" setting." % ", ".join(content_paths)
+                )
+                self._build_sequence_graph(sequence_graph, None, chunk_size, slow_task)
+            if not sequence_graph.complete:
+                self.logger.warning(
+                    "Level Sequences collection cancelled, scanned Level Sequences "
+                    "will be reused next time."
+                )
+            else:
+                self.logger.info(
+                    "Scanned %d of %d Level Sequences for edits." % (
+                        sequence_graph.scanned_count, len(sequence_graph.assets)
                     )
-                    # Store the edits on the item so we can leverage them later when publishing
-                    item.properties["edits_path"] = edits_path
+                )
+                slow_task.enter_progress_frame(1, "Creating Level Sequences items...")
+                # Create items for all Level Sequences first
+                total_count = len(sequence_graph.assets)
+                for i, level_sequence_asset in enumerate(sequence_graph.assets, 1):
+                    self.collect_level_sequence(parent_item, level_sequence_asset, sequence_graph, lazy)
+                    if i % chunk_size == 0 or i == total_count:
+                        self.logger.info("Collected %d of %d Level Sequences..." % (i, total_count))
+                        if self._should_cancel_collection(slow_task):
+                            self.logger.warning(
+                                "Level Sequences collection cancelled after %d of %d "
+                                "Level Sequences." % (i, total_count)
+                            )
+                            break
+        # Items only store object paths, Level Sequences loaded for the
+        # collection are not needed anymore.
+        self.release_loaded_sequences(sequence_graph, gc_threshold)
         
         # Then collect any other selected assets that aren't Level Sequences
         for asset in unreal_sg.selected_assets:
@@ -224,7 +840,167 @@ class UnrealSessionCollector(HookBaseClass):
                     "%s" % asset.asset_name,
                 )
 
-    def get_all_paths_from_sequence(self, level_sequence, sequence_edits, visited=None):
+    def _build_sequence_graph(self, sequence_graph, content_paths, chunk_size, slow_task):
+        """
+        Build the given Level Sequences edit graph, reporting progress and
+        stopping if the collection is cancelled.
+
+        :param sequence_graph: A :class:`SequenceEditGraph` instance.
+        :param content_paths: A list of content paths to restrict the build to,
+                              or None for the whole project.
+        :param int chunk_size: Number of Level Sequences to process in each chunk.
+        :param slow_task: The :class:`unreal.ScopedSlowTask` used to report progress.
+        """
+        graph_build = sequence_graph.iter_build(content_paths, chunk_size)
+        for processed_count, total_count in graph_build:
+            self.logger.info(
+                "Scanned %d of %d Level Sequences..." % (processed_count, total_count)
+            )
+            if self._should_cancel_collection(slow_task):
+                break
+        # Ensure the cache is saved if the build was stopped.
+        graph_build.close()
+
+    def release_loaded_sequences(self, sequence_graph, threshold):
+        """
+        Release Level Sequences loaded by the given graph and run Unreal garbage
+        collection if there are enough of them, so the editor returns to its
+        footprint before the collection.
+
+        Level Sequences still used by the editor, e.g. opened in Sequencer,
+        are not unloaded by the garbage collection.
+
+        :param sequence_graph: A :class:`SequenceEditGraph` instance.
+        :param int threshold: Minimum number of loaded Level Sequences to run
+                              the garbage collection, 0 to never run it.
+        """
+        released_count = sequence_graph.release()
+        if not threshold or released_count < threshold:
+            self.logger.debug(
+                "Released %d Level Sequences, garbage collection not needed." % released_count
+            )
+            return
+        memory_before = _get_process_memory()
+        unreal.SystemLibrary.collect_garbage()
+        memory_after = _get_process_memory()
+        if memory_before is None or memory_after is None:
+            self.logger.info(
+                "Released %d Level Sequences and ran garbage collection." % released_count
+            )
+        else:
+            self.logger.info(
+                "Released %d Level Sequences and ran garbage collection, %.1f MB reclaimed." % (
+                    released_count,
+                    (memory_before - memory_after) / (1024.0 * 1024.0),
+                )
+            )
+
+    def _should_cancel_collection(self, slow_task):
+        """
+        Process pending Unreal and Qt events and check if the collection should
+        be cancelled.
+
+        :param slow_task: The :class:`unreal.ScopedSlowTask` for the collection.
+        :returns: True if the collection should be cancelled, False otherwise.
+        """
+        # Let Unreal refresh its UI and process the cancel button.
+        slow_task.enter_progress_frame(0)
+        # Keep the publisher UI responsive
+        from sgtk.platform.qt import QtCore
+        QtCore.QCoreApplication.processEvents()
+        if slow_task.should_cancel():
+            self._cancel_requested = True
+        return self._cancel_requested
+
+    def get_context_content_paths(self, settings=None):
+        """
+        Return the Unreal content paths to restrict the collection to for the
+        current context.
+
+        Content paths are built from template strings, by default the ones used
+        by the Loader to import Shot and Asset files, with values from the
+        current context. For Sequence contexts, the Shot template is truncated
+        before the first key which can't be resolved.
+
+        :param dict settings: Optional configured settings for this collector
+        :returns: A list of content paths, empty if the whole project should be
+                  collected.
+        """
+        if not settings:
+            return []
+        scope_setting = settings.get("Scope To Context")
+        if not scope_setting or not scope_setting.value:
+            return []
+        context = self.parent.context
+        entity = context.entity
+        if not entity:
+            return []
+        if entity["type"] in ["Shot", "Sequence"]:
+            template_setting = settings.get("Shot Content Path Template")
+        elif entity["type"] == "Asset":
+            template_setting = settings.get("Asset Content Path Template")
+        else:
+            return []
+        if not template_setting or not template_setting.value:
+            return []
+        template = self.parent.sgtk.templates.get(template_setting.value)
+        if not template:
+            self.logger.warning(
+                "Template %s is not defined, collecting the whole project." % template_setting.value
+            )
+            return []
+        try:
+            fields = context.as_template_fields(template)
+        except Exception as e:
+            self.logger.warning(
+                "Unable to resolve %s from the current context: %s" % (template_setting.value, e)
+            )
+            return []
+        if entity["type"] == "Sequence":
+            # The Sequence name key is retrieved from Shots, set it from the
+            # context instead.
+            for key in template.keys.values():
+                if getattr(key, "shotgun_field_name", None) == "sg_sequence":
+                    fields[key.name] = entity["name"]
+        content_path = _apply_fields_to_prefix(template.definition, fields)
+        content_path = content_path.rstrip("/")
+        # Don't restrict anything if no specific folder could be resolved.
+        if not content_path.startswith("/") or content_path.count("/") < 2:
+            return []
+        return [content_path]
+
+    def get_sequence_edit_cache(self, settings=None):
+        """
+        Return the Level Sequence edits cache to use for this collection.
+
+        The session :class:`SequenceEditIndex` is returned unless disabled in
+        settings, so edits are read from memory when the publisher is opened
+        again in the same Unreal session.
+
+        :param dict settings: Optional configured settings for this collector
+        :returns: A :class:`SequenceEditIndex` or :class:`SequenceEditCache`
+                  instance, or None if caching is disabled.
+        """
+        use_index = True
+        if settings:
+            cache_setting = settings.get("Cache Sequence Edits")
+            if cache_setting and not cache_setting.value:
+                return None
+            index_setting = settings.get("Keep Sequence Edits Index")
+            if index_setting:
+                use_index = index_setting.value
+        cache_path = os.path.abspath(
+            os.path.join(
+                unreal.Paths.project_saved_dir(),
+                "ShotGrid",
+                "sequence_edits.json",
+            )
+        )
+        if use_index:
+            return get_sequence_edit_index(cache_path)
+        return SequenceEditCache(cache_path).load()
+
+    def get_all_paths_from_sequence(self, level_sequence, sequence_edits, paths_cache=None):
         """
         Retrieve all edit paths from the given Level Sequence to top Level Sequences.
 
@@ -243,106 +1019,146 @@ class UnrealSessionCollector(HookBaseClass):
         paths would be detected and returned by this method, e.g.
         `[[Shot_001_010, Seq_001, Master sequence], [Shot_001_010, Seq_001, Master sequence 2]]`
 
-        Maintain a list of visited Level Sequences to detect cycles.
+        Paths to the top Level Sequences are computed once for each Level Sequence
+        and stored in the given cache, so shots sharing parents reuse them. Cycles
+        are detected with the set of Level Sequences currently being explored.
+
+        :param str level_sequence: A Level Sequence object path.
+        :param sequence_edits: A dictionary with Level Sequence object paths as keys and
+                               lists of :class:`SequenceEdit` as values.
+        :param paths_cache: Optional dictionary used to store computed paths, which
+                            can be shared between calls for the same edits.
+        :returns: A list of lists of Level Sequence object paths.
+        """
+        if paths_cache is None:
+            paths_cache = {}
+        all_paths, _ = self._get_cached_paths_from_sequence(
+            level_sequence,
+            sequence_edits,
+            paths_cache,
+            [],
+            set(),
+        )
+        return [list(edits_path) for edits_path in all_paths]
 
-        :param level_sequence: A :class:`unreal.LevelSequence` instance.
-        :param sequence_edits: A dictionary with  :class:`unreal.LevelSequence as keys and
-                                              lists of :class:`SequenceEdit` as values.
-        :param visited: A list of :class:`unreal.LevelSequence` instances, populated
-                        as nodes are visited.
-        :returns: A list of lists of Level Sequences.
+    def _get_cached_paths_from_sequence(self, level_sequence, sequence_edits, paths_cache, stack, on_stack):
         """
-        if not visited:
-            visited = []
-        visited.append(level_sequence)
-        self.logger.info("Treating %s" % level_sequence.get_name())
-        if not sequence_edits[level_sequence]:
-            # No parent, return a list with a single entry with the current
-            # sequence
-            return [[level_sequence]]
+        Retrieve all edit paths from the given Level Sequence to top Level Sequences
+        as tuples, using and populating the given cache.
+
+        Paths for a Level Sequence from which a cycle can be reached depend on the
+        Level Sequences being explored, so they are never cached.
 
+        :param str level_sequence: A Level Sequence object path.
+        :param sequence_edits: A dictionary with Level Sequence object paths as keys and
+                               lists of :class:`SequenceEdit` as values.
+        :param paths_cache: A dictionary where computed paths are stored.
+        :param stack: A list of the Level Sequence object paths being explored.
+        :param on_stack: A set with the same entries than `stack`, for fast lookups.
+        :returns: A tuple of tuples of Level Sequence object paths and a boolean
+                  set to True if a cycle was detected while exploring.
+        """
+        if level_sequence in paths_cache:
+            return paths_cache[level_sequence], False
+
+        self.logger.debug("Treating %s" % level_sequence)
+        edits = sequence_edits.get(level_sequence)
+        if not edits:
+            # No parent, return a single entry with the current sequence
+            all_paths = ((level_sequence,),)
+            paths_cache[level_sequence] = all_paths
+            return all_paths, False
+
+        stack.append(level_sequence)
+        on_stack.add(level_sequence)
         all_paths = []
+        has_cycle = False
         # Loop over parents get all paths starting from them
-        for edit in sequence_edits[level_sequence]:
-            if edit.sequence in visited:
+        for edit in edits:
+            if edit.sequence in on_stack:
                 self.logger.warning(
                     "Detected a cycle in edits path %s to %s" % (
-                        "->".join(visited), edit.sequence
+                        "->".join(stack), edit.sequence
                     )
                 )
-            else:
-                # Get paths from the parent and prepend the current sequence
-                # to them.
-                for edit_path in self.get_all_paths_from_sequence(
-                    edit.sequence,
-                    sequence_edits,
-                    copy.copy(visited),  # Each visit needs its own stack
-                ):
-                    self.logger.info("Got %s from %s" % (edit_path, edit.sequence.get_name()))
-                    all_paths.append([level_sequence] + edit_path)
-        return all_paths
-
-    def collect_level_sequence(self, parent_item, asset, sequence_edits):
+                has_cycle = True
+                continue
+            # Get paths from the parent and prepend the current sequence
+            # to them.
+            parent_paths, parent_has_cycle = self._get_cached_paths_from_sequence(
+                edit.sequence,
+                sequence_edits,
+                paths_cache,
+                stack,
+                on_stack,
+            )
+            has_cycle = has_cycle or parent_has_cycle
+            for edit_path in parent_paths:
+                all_paths.append((level_sequence,) + edit_path)
+        stack.pop()
+        on_stack.discard(level_sequence)
+
+        all_paths = tuple(all_paths)
+        if not has_cycle:
+            paths_cache[level_sequence] = all_paths
+        return all_paths, has_cycle
+
+    def collect_level_sequence(self, parent_item, asset, sequence_graph, lazy=False):
         """
         Collect the items for the given Level Sequence asset.
 
         Multiple items can be collected for a given Level Sequence if it appears
         in multiple edits.
 
+        The edit is stored in the "edits_path" item property as a tuple of
+        Level Sequence object paths, from the top master sequence to the shot,
+        which publish plugins resolve when they need the Level Sequences. This
+        keeps items light and serializable.
+
+        Lazy items are created from the asset data and the edit graph alone.
+        Otherwise Level Sequences are loaded during the collection and items
+        are only created for edits which can be loaded.
+
         :param parent_item: Parent Item instance.
         :param asset: An Unreal LevelSequence asset.
-        :param sequence_edits: A dictionary with  :class:`unreal.LevelSequence as keys and
-                                              lists of :class:`SequenceEdit` as values.
+        :param sequence_graph: A :class:`SequenceEditGraph` instance.
+        :param bool lazy: Whether to create lazy items.
         """
-        unreal_sg = sgtk.platform.current_engine().unreal_sg_engine
-        level_sequence = unreal.load_asset(unreal_sg.object_path(asset))
-        for edits_path in self.get_all_paths_from_sequence(level_sequence, sequence_edits):
+        object_path = sequence_graph.get_object_path(asset)
+        for object_paths in self.get_all_paths_from_sequence(
+            object_path,
+            sequence_graph.edits,
+            sequence_graph.paths_cache,
+        ):
             # Reverse the path to have it from top master sequence to the shot.
-            edits_path.reverse()
-            self.logger.info("Collected %s" % [x.get_name() for x in edits_path])
-            if len(edits_path) > 1:
-                display_name = "%s (%s)" % (edits_path[0].get_name(), edits_path[-1].get_name())
+            object_paths.reverse()
+            if not lazy:
+                if not all(sequence_graph.load(path) for path in object_paths):
+                    self.logger.warning("Unable to load all Level Sequences in %s" % object_paths)
+                    continue
+            names = [_get_object_name(path) for path in object_paths]
+            self.logger.info("Collected %s" % names)
+            if len(names) > 1:
+                display_name = "%s (%s)" % (names[0], names[-1])
             else:
-                display_name = edits_path[0].get_name()
+                display_name = names[0]
             item = self.create_asset_item(
                 parent_item,
-                edits_path[0].get_path_name(),
+                object_paths[0],
                 "LevelSequence",
-                edits_path[0].get_name(),
+                names[0],
                 display_name,
             )
             # Store the edits on the item so we can leverage them later when
             # publishing.
-            item.properties["edits_path"] = edits_path
+            item.properties["edits_path"] = tuple(object_paths)
 
     def retrieve_sequence_edits(self):
         """
-        Build a dictionary for all Level Sequences where keys are Level Sequences
-        and values the list of edits they are in.
+        Build a dictionary for all Level Sequences where keys are Level Sequence
+        object paths and values the list of edits they are in.
 
-        :returns: A dictionary of :class:`unreal.LevelSequence` where values are
+        :returns: A dictionary of Level Sequence object paths where values are
                   lists of :class:`SequenceEdit`.
         """
-        sequence_edits = defaultdict(list)
-        unreal_sg = sgtk.platform.current_engine().unreal_sg_engine
-        level_sequence_class = unreal.TopLevelAssetPath("/Script/LevelSequence", "LevelSequence")
-        asset_helper = unreal.AssetRegistryHelpers.get_asset_registry()
-        # Retrieve all Level Sequence assets
-        all_level_sequences = asset_helper.get_assets_by_class(level_sequence_class)
-        for lvseq_asset in all_level_sequences:
-            lvseq = unreal.load_asset(unreal_sg.object_path(lvseq_asset), unreal.LevelSequence)
-            # Check shots
-            for track in lvseq.find_master_tracks_by_type(unreal.MovieSceneCinematicShotTrack):
-                for section in track.get_sections():
-                    # Not sure if you can have anything else than a MovieSceneSubSection
-                    # in a MovieSceneCinematicShotTrack, but let's be cautious here.
-                    try:
-                        # Get the Sequence attached to the section and check if
-                        # it is the one we're looking for.
-                        section_seq = section.get_sequence()
-                        sequence_edits[section_seq].append(
-                            SequenceEdit(lvseq, track, section)
-                        )
-                    except AttributeError:
-                        pass
-        return sequence_edits
+        return SequenceEditGraph(self.get_sequence_edit_cache()).build().edits
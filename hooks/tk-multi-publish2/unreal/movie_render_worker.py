@@ -0,0 +1,281 @@
+# This file has been modified by Epic Games, Inc. and is subject to the license
+# file included in this repository.
+
+"""
+Long lived Movie Render Queue worker, run in a headless Unreal process by the
+movie publish plugin.
+
+The worker is started with the command line used for Movie Render Queue
+renders, with this script passed to -ExecutePythonScript and the executor
+below set as the Movie Render Queue executor. It then renders manifests
+submitted as request files in a spool folder one after the other, so back to
+back renders only pay the Unreal startup and warm up costs once.
+
+Requests are JSON files named <request id>.request.json with a "manifest" key
+giving the full path to a Movie Render Queue manifest file. When a request
+completes, the worker writes a <request id>.result.json file with "success"
+and "error" keys. When no request is pending, the worker quits if a "stop"
+file is found in the spool folder or if it was idle for too long. It quits
+right away if the process which started it is gone.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import unreal
+
+# Environment variables used to configure the worker.
+SPOOL_DIR_ENV = "SG_UNREAL_RENDER_WORKER_SPOOL"
+IDLE_TIMEOUT_ENV = "SG_UNREAL_RENDER_WORKER_IDLE_TIMEOUT"
+PARENT_PID_ENV = "SG_UNREAL_RENDER_WORKER_PARENT_PID"
+
+REQUEST_SUFFIX = ".request.json"
+RESULT_SUFFIX = ".result.json"
+STOP_FILE = "stop"
+# Interval, in seconds, at which the parent process is checked.
+PARENT_CHECK_INTERVAL = 5
+
+
+def _write_json(path, data):
+    """
+    Write the given data to the given JSON file.
+
+    The data is written to a temporary file first and then moved in place,
+    so readers never see a partial file.
+
+    :param str path: Full path to the file.
+    :param data: JSON serializable data.
+    """
+    f, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+    with os.fdopen(f, "w") as fh:
+        json.dump(data, fh)
+    os.replace(tmp_path, path)
+
+
+def _is_process_running(pid):
+    """
+    Return True if the process with the given id is running.
+
+    :param int pid: A process id.
+    :returns: A boolean.
+    """
+    if sys.platform == "win32":
+        import ctypes
+
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        process_query_limited_information = 0x1000
+        still_active = 259
+        error_access_denied = 5
+        handle = kernel32.OpenProcess(process_query_limited_information, False, pid)
+        if not handle:
+            # The process exists if we are not allowed to query it.
+            return ctypes.get_last_error() == error_access_denied
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return True
+            return exit_code.value == still_active
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@unreal.uclass()
+class ShotGridRenderWorkerExecutor(unreal.MoviePipelinePythonHostExecutor):
+    """
+    Movie Render Queue executor rendering manifests from a spool folder.
+    """
+
+    active_pipeline = unreal.uproperty(unreal.MoviePipeline)
+    active_queue = unreal.uproperty(unreal.MoviePipelineQueue)
+
+    def _post_init(self):
+        """
+        Initialize the worker state.
+        """
+        self.spool_dir = os.environ.get(SPOOL_DIR_ENV)
+        self.idle_timeout = float(os.environ.get(IDLE_TIMEOUT_ENV) or 0)
+        self.parent_pid = int(os.environ.get(PARENT_PID_ENV) or 0)
+        self.last_parent_check = time.time()
+        self.last_activity = time.time()
+        self.request_id = None
+        self.pending_jobs = []
+        self.errors = []
+        self.waiting_for_map = False
+        self.reported_percent = -1
+
+    @unreal.ufunction(override=True)
+    def execute_delayed(self, in_pipeline_queue):
+        """
+        Start the worker, the queue given on the command line, if any, is ignored.
+        """
+        unreal.log("Render worker started, watching %s" % self.spool_dir)
+        self.last_activity = time.time()
+
+    @unreal.ufunction(override=True)
+    def is_rendering(self):
+        return self.active_pipeline is not None or self.request_id is not None
+
+    @unreal.ufunction(override=True)
+    def on_begin_frame(self):
+        super(ShotGridRenderWorkerExecutor, self).on_begin_frame()
+        try:
+            self._tick()
+        except Exception as e:
+            unreal.log_error("Render worker error: %s" % e)
+            self._complete_request("%s" % e)
+
+    @unreal.ufunction(override=True)
+    def on_map_load(self, in_world):
+        if not self.waiting_for_map:
+            return
+        self.waiting_for_map = False
+        self._start_pipeline(self.pending_jobs.pop(0))
+
+    @unreal.ufunction(ret=None, params=[unreal.MoviePipelineOutputData])
+    def on_movie_pipeline_finished(self, results):
+        """
+        Called when the active render completed.
+        """
+        if not results.success:
+            self.errors.append("Render of %s failed." % results.job.job_name)
+        self.active_pipeline = None
+        if not self.pending_jobs:
+            self._complete_request()
+
+    def _tick(self):
+        """
+        Report progress, start the next job or pick up the next request.
+        """
+        if self.active_pipeline:
+            percent = int(
+                unreal.MoviePipelineLibrary.get_completion_percentage(
+                    self.active_pipeline
+                )
+                * 100
+            )
+            if percent != self.reported_percent:
+                unreal.log("Render worker progress: %d%%" % percent)
+                self.reported_percent = percent
+            return
+        if self.waiting_for_map:
+            return
+        if self.pending_jobs:
+            self._start_next_job()
+            return
+        if self.request_id:
+            return
+        self._pick_request()
+
+    def _pick_request(self):
+        """
+        Pick up the oldest request from the spool folder, if any, or quit if
+        asked to or idle for too long.
+        """
+        if (
+            self.parent_pid
+            and time.time() - self.last_parent_check > PARENT_CHECK_INTERVAL
+        ):
+            self.last_parent_check = time.time()
+            if not _is_process_running(self.parent_pid):
+                # Nobody is left to collect results.
+                unreal.log("Render worker parent process is gone, quitting.")
+                self.on_executor_finished_impl()
+                return
+        # Pending requests are always processed, so a request submitted right
+        # before quitting is not lost.
+        requests = sorted(
+            [
+                name
+                for name in os.listdir(self.spool_dir)
+                if name.endswith(REQUEST_SUFFIX)
+            ],
+            key=lambda name: os.path.getmtime(os.path.join(self.spool_dir, name)),
+        )
+        if not requests:
+            if os.path.exists(os.path.join(self.spool_dir, STOP_FILE)) or (
+                self.idle_timeout
+                and time.time() - self.last_activity > self.idle_timeout
+            ):
+                unreal.log("Render worker quitting.")
+                self.on_executor_finished_impl()
+            return
+        request_path = os.path.join(self.spool_dir, requests[0])
+        self.request_id = requests[0][: -len(REQUEST_SUFFIX)]
+        self.errors = []
+        self.reported_percent = -1
+        with open(request_path, "r") as fh:
+            manifest_path = json.load(fh)["manifest"]
+        os.remove(request_path)
+        unreal.log("Render worker rendering %s" % manifest_path)
+        self.active_queue = unreal.MoviePipelineLibrary.load_manifest_file_from_string(
+            manifest_path
+        )
+        if not self.active_queue:
+            self._complete_request("Unable to load manifest %s." % manifest_path)
+            return
+        self.pending_jobs = list(self.active_queue.get_jobs())
+        if not self.pending_jobs:
+            self._complete_request()
+
+    def _start_next_job(self):
+        """
+        Start rendering the next pending job, loading its map first if needed.
+        """
+        job = self.pending_jobs[0]
+        map_package = job.map.export_text().split(".")[0]
+        world = self.get_last_loaded_world()
+        if world and world.get_outermost().get_name() == map_package:
+            self._start_pipeline(self.pending_jobs.pop(0))
+            return
+        self.waiting_for_map = True
+        unreal.GameplayStatics.open_level(
+            world,
+            map_package,
+            True,
+            "?game=/Script/MovieRenderPipelineCore.MoviePipelineGameMode",
+        )
+
+    def _start_pipeline(self, job):
+        """
+        Render the given job in the current world.
+
+        :param job: A :class:`unreal.MoviePipelineExecutorJob` instance.
+        """
+        self.active_pipeline = unreal.new_object(
+            self.target_pipeline_class,
+            outer=self.get_last_loaded_world(),
+            base_type=unreal.MoviePipeline,
+        )
+        self.active_pipeline.on_movie_pipeline_work_finished_delegate.add_function_unique(
+            self, "on_movie_pipeline_finished"
+        )
+        self.active_pipeline.initialize(job)
+
+    def _complete_request(self, error=None):
+        """
+        Report the result of the current request and get ready for the next one.
+
+        :param str error: Optional error which prevented the request to complete.
+        """
+        if error:
+            self.errors.append(error)
+        if self.request_id:
+            _write_json(
+                os.path.join(self.spool_dir, "%s%s" % (self.request_id, RESULT_SUFFIX)),
+                {"success": not self.errors, "error": " ".join(self.errors) or None},
+            )
+        self.request_id = None
+        self.pending_jobs = []
+        self.active_pipeline = None
+        self.active_queue = None
+        self.waiting_for_map = False
+        self.last_activity = time.time()
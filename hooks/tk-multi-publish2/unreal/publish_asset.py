@@ -346,6 +346,12 @@ class UnrealAssetPublishPlugin(HookBaseClass):
             self.logger.debug("Asset path or name not configured.")
             return False
 
+        # Items are collected from the asset registry without loading assets,
+        # make sure the asset still exists before going further.
+        if not unreal.EditorAssetLibrary.does_asset_exist(asset_path):
+            self.logger.warning("Asset %s does not exist anymore." % asset_path)
+            return False
+
         publish_template = item.properties["publish_template"]
 
         # Add the Unreal asset name to the fields
@@ -6,13 +6,24 @@ import sgtk
 import unreal
 from tank_vendor import six
 
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import atexit
 import copy
 import datetime
+import hashlib
+import json
+import logging
 import os
 import pprint
+import re
+import shutil
+import signal
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 
 # Local storage path field for known Oses.
 _OS_LOCAL_STORAGE_PATH_FIELD = {
@@ -22,6 +33,1432 @@ _OS_LOCAL_STORAGE_PATH_FIELD = {
     "linux2": "linux_path",
 }[sys.platform]
 
+# A named tuple to store what is needed to render a Level Sequence with the
+# Movie Render Queue.
+MovieRenderRequest = namedtuple(
+    "MovieRenderRequest",
+    ["output_path", "unreal_map_path", "sequence_path", "presets", "shot_name", "profile", "frame_range"],
+)
+
+# Default render profiles, they can be overridden with the "Render Profiles"
+# setting. Each profile is a dictionary with the following keys:
+# - resolution: the output resolution, as a [width, height] list.
+# - frame_rate: the output frame rate. If None, Movie Render Queue renders
+#   use the sequence frame rate and Sequencer renders 24 fps.
+# - movie_quality: the compression quality for Sequencer renders, 0 to 100.
+# - texture_streaming: whether texture streaming is allowed.
+# - spatial_samples, temporal_samples: Movie Render Queue anti-aliasing sample
+#   counts. If None, the presets values are kept.
+# - cvars: console variables set in the render process.
+# - exec_cmds: console commands run in the render process.
+# - sequencer_console_settings: whether cvars and exec_cmds are also used for
+#   Sequencer renders. They are only used for Movie Render Queue renders
+#   otherwise.
+# - priority: optional priority of the render process, one of the
+#   _PROCESS_PRIORITIES keys.
+# - cpu_affinity: optional list of CPU indexes the render process can run on.
+# - memory_limit: optional maximum committed memory of the render process, in
+#   megabytes, enforced with a Windows Job Object. The process fails to
+#   allocate memory past the limit. Processes it starts, e.g. shader compile
+#   workers, are in the same Job Object and get the same limit.
+# The "final" profile matches the Movie Render Queue and Sequencer settings
+# used before profiles were added.
+_DEFAULT_RENDER_PROFILES = {
+    "draft": {
+        "resolution": [960, 540],
+        "frame_rate": None,
+        "movie_quality": 50,
+        "texture_streaming": True,
+        "spatial_samples": 1,
+        "temporal_samples": 1,
+        "cvars": [
+            "sg.ViewDistanceQuality=1",
+            "sg.AntiAliasingQuality=1",
+            "sg.ShadowQuality=1",
+            "sg.PostProcessQuality=1",
+            "sg.TextureQuality=1",
+            "sg.EffectsQuality=1",
+            "sg.FoliageQuality=1",
+            "sg.ShadingQuality=1",
+            "r.D3D12.GPUTimeout=0",
+        ],
+        "exec_cmds": [],
+        "sequencer_console_settings": True,
+        "priority": None,
+        "cpu_affinity": None,
+        "memory_limit": None,
+    },
+    "review": {
+        "resolution": [1280, 720],
+        "frame_rate": None,
+        "movie_quality": 75,
+        "texture_streaming": True,
+        "spatial_samples": 1,
+        "temporal_samples": 4,
+        "cvars": [
+            "sg.ViewDistanceQuality=3",
+            "sg.AntiAliasingQuality=3",
+            "sg.ShadowQuality=3",
+            "sg.PostProcessQuality=3",
+            "sg.TextureQuality=3",
+            "sg.EffectsQuality=3",
+            "sg.FoliageQuality=3",
+            "sg.ShadingQuality=3",
+            "r.D3D12.GPUTimeout=0",
+        ],
+        "exec_cmds": [],
+        "sequencer_console_settings": True,
+        "priority": None,
+        "cpu_affinity": None,
+        "memory_limit": None,
+    },
+    "final": {
+        "resolution": [1280, 720],
+        "frame_rate": None,
+        "movie_quality": 75,
+        "texture_streaming": False,
+        "spatial_samples": None,
+        "temporal_samples": None,
+        "cvars": [
+            "sg.ViewDistanceQuality=4",
+            "sg.AntiAliasingQuality=4",
+            "sg.ShadowQuality=4",
+            "sg.PostProcessQuality=4",
+            "sg.TextureQuality=4",
+            "sg.EffectsQuality=4",
+            "sg.FoliageQuality=4",
+            "sg.ShadingQuality=4",
+            "r.ForceLOD=0",
+            "r.SkeletalMeshLODBias=-10",
+            "r.ParticleLODBias=-10",
+            "foliage.DitheredLOD=0",
+            "foliage.ForceLOD=0",
+            "r.Shadow.DistanceScale=10",
+            "r.ShadowQuality=5",
+            "r.Shadow.RadiusThreshold=0.001000",
+            "r.ViewDistanceScale=50",
+            "r.D3D12.GPUTimeout=0",
+            "a.URO.Enable=0",
+        ],
+        "exec_cmds": ["r.HLOD 0"],
+        "sequencer_console_settings": False,
+        "priority": None,
+        "cpu_affinity": None,
+        "memory_limit": None,
+    },
+}
+
+# Render process priorities, as Windows priority class names.
+_PROCESS_PRIORITIES = {
+    "idle": "IDLE_PRIORITY_CLASS",
+    "below_normal": "BELOW_NORMAL_PRIORITY_CLASS",
+    "normal": "NORMAL_PRIORITY_CLASS",
+    "above_normal": "ABOVE_NORMAL_PRIORITY_CLASS",
+    "high": "HIGH_PRIORITY_CLASS",
+}
+
+# Windows values used to limit render processes before they run.
+_CREATE_SUSPENDED = 0x4
+_JOB_OBJECT_EXTENDED_LIMIT_INFORMATION_CLASS = 9
+_JOB_OBJECT_LIMIT_PROCESS_MEMORY = 0x100
+_TH32CS_SNAPTHREAD = 0x4
+_THREAD_SUSPEND_RESUME = 0x2
+
+# A named tuple to store the outcome of a render job.
+RenderJobResult = namedtuple(
+    "RenderJobResult",
+    ["status", "returncode", "duration", "log_path", "error"],
+)
+
+
+def _get_package_file(package_name):
+    """
+    Return the file on disk for the given package.
+
+    Only packages from the project Content folder are considered.
+
+    :param str package_name: A long package name, e.g. /Game/Cinematics/Seq_010.
+    :returns: A full path or None.
+    """
+    if not package_name.startswith("/Game/"):
+        return None
+    base_path = os.path.join(
+        unreal.Paths.convert_relative_path_to_full(unreal.Paths.project_content_dir()),
+        package_name[len("/Game/"):],
+    )
+    for extension in [".uasset", ".umap"]:
+        if os.path.isfile(base_path + extension):
+            return base_path + extension
+    return None
+
+
+def _get_external_packages_stamp(map_package_name):
+    """
+    Return a stamp for the external actor and object packages of the given map.
+
+    Levels using One File Per Actor, e.g. World Partition levels, store their
+    actors in separate packages under `__ExternalActors__` and
+    `__ExternalObjects__` folders, which are not dependencies of the map
+    package. The stamp is built from the path, modification time and size of
+    all these package files, so it changes when actors are added, removed or
+    edited, without reading thousands of files.
+
+    :param str map_package_name: A map long package name, e.g. /Game/Maps/Main.
+    :returns: A stamp as a string, or None if the map has no external packages.
+    """
+    if not map_package_name.startswith("/Game/"):
+        return None
+    content_dir = unreal.Paths.convert_relative_path_to_full(unreal.Paths.project_content_dir())
+    hasher = hashlib.sha1()
+    found = False
+    for external_folder in ["__ExternalActors__", "__ExternalObjects__"]:
+        external_dir = os.path.join(content_dir, external_folder, map_package_name[len("/Game/"):])
+        for dir_path, dir_names, file_names in os.walk(external_dir):
+            # Walk folders in a stable order.
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                file_path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                found = True
+                hasher.update(
+                    ("%s:%d:%d\n" % (
+                        os.path.relpath(file_path, content_dir).replace(os.sep, "/"),
+                        stat.st_mtime_ns,
+                        stat.st_size,
+                    )).encode("utf-8")
+                )
+    if not found:
+        return None
+    return hasher.hexdigest()
+
+
+def _get_stamp_value(value):
+    """
+    Return a JSON serializable representation of the given Unreal value which
+    does not change across Unreal sessions.
+
+    :param value: A value returned by the Unreal API.
+    :returns: A JSON serializable value.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_get_stamp_value(v) for v in value]
+    if isinstance(value, unreal.Object):
+        return value.get_path_name()
+    if hasattr(value, "export_text"):
+        # Structs representations include their address.
+        return value.export_text()
+    return str(value)
+
+
+def _get_section_stamp(section):
+    """
+    Return data describing the given Sequencer section: its range, its state
+    and the keys of all its channels.
+
+    :param section: A :class:`unreal.MovieSceneSection` instance.
+    :returns: A JSON serializable dictionary.
+    """
+    return {
+        "class": section.get_class().get_name(),
+        "active": section.is_active(),
+        "row": section.get_row_index(),
+        "range": [
+            section.get_start_frame() if section.has_start_frame() else None,
+            section.get_end_frame() if section.has_end_frame() else None,
+        ],
+        "channels": [
+            [
+                [key.get_time().frame_number.value, _get_stamp_value(key.get_value())]
+                for key in channel.get_keys()
+            ]
+            for channel in section.get_all_channels()
+        ],
+    }
+
+
+def _get_frame_cut(start_frame, end_frame, frame_rate, movie_frame_rate=None):
+    """
+    Return where to seek in a movie, and how many frames to keep, to cut the
+    given frames from it with FFmpeg stream copy.
+
+    The seek time is the middle of the first frame, so the frame is selected
+    even if its timestamp is rounded. Frames are counted rather than converted
+    to a duration for the same reason.
+
+    :param int start_frame: The first frame to cut, from the start of the movie.
+    :param int end_frame: The frame after the last frame to cut.
+    :param frame_rate: The frame rate of the given frames, as a (numerator,
+                       denominator) tuple.
+    :param movie_frame_rate: Optional frame rate of the movie, as a (numerator,
+                             denominator) tuple, if different.
+    :returns: A (seek time in seconds, frame count) tuple.
+    """
+    if movie_frame_rate and tuple(movie_frame_rate) != tuple(frame_rate):
+        # Convert frames to the movie frame rate.
+        scale = float(movie_frame_rate[0] * frame_rate[1]) / (movie_frame_rate[1] * frame_rate[0])
+        start_frame = int(round(start_frame * scale))
+        end_frame = int(round(end_frame * scale))
+        frame_rate = movie_frame_rate
+    frame_duration = float(frame_rate[1]) / frame_rate[0]
+    return (start_frame + 0.5) * frame_duration, end_frame - start_frame
+
+
+def _hash_file(path, hasher):
+    """
+    Update the given hasher with the content of the given file.
+
+    :param str path: Full path to the file.
+    :param hasher: A :mod:`hashlib` hash object.
+    """
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            hasher.update(chunk)
+
+
+class RenderCache(object):
+    """
+    On disk cache of rendered movies, keyed by a hash of everything the render
+    depends on.
+
+    Each entry stores the path of a movie previously rendered for a given key,
+    with its size so movies modified or deleted since then are not reused.
+    """
+    # Bump this when the layout of entries or keys changes to discard stale caches.
+    VERSION = 1
+
+    def __init__(self, path):
+        """
+        Instantiate a new cache for the given file, call :meth:`load` to read it.
+
+        :param str path: Full path to the cache file.
+        """
+        self.path = path
+        self._renders = {}
+
+    def load(self):
+        """
+        Read the cache file, if any.
+
+        A missing, unreadable or outdated cache file results in an empty cache.
+
+        :returns: This :class:`RenderCache` instance.
+        """
+        self._renders = {}
+        try:
+            with open(self.path, "r") as fh:
+                data = json.load(fh)
+        except (IOError, OSError, ValueError):
+            return self
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            return self
+        self._renders = data.get("renders") or {}
+        return self
+
+    def save(self):
+        """
+        Write the cache file.
+
+        The file is written to a temporary file first and then moved in place,
+        so concurrent editor sessions never read a partial cache.
+        """
+        cache_dir = os.path.dirname(self.path)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        f, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=cache_dir)
+        with os.fdopen(f, "w") as fh:
+            json.dump({"version": self.VERSION, "renders": self._renders}, fh)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key):
+        """
+        Return the path to a movie previously rendered for the given key, if
+        it is still available.
+
+        :param str key: A render key.
+        :returns: A full path or None.
+        """
+        entry = self._renders.get(key)
+        if not entry:
+            return None
+        try:
+            if os.path.getsize(entry["path"]) != entry["size"]:
+                return None
+        except OSError:
+            return None
+        return entry["path"]
+
+    def set(self, key, movie_path):
+        """
+        Store the given rendered movie for the given key and save the cache.
+
+        :param str key: A render key.
+        :param str movie_path: Full path to the rendered movie.
+        :returns: The path of the movie previously stored for the key if no
+                  other key uses it anymore, None otherwise.
+        """
+        self.load()
+        previous = self._renders.get(key)
+        self._renders[key] = {
+            "path": movie_path,
+            "size": os.path.getsize(movie_path),
+        }
+        self.save()
+        if not previous:
+            return None
+        previous_path = os.path.normcase(os.path.abspath(previous["path"]))
+        for entry in self._renders.values():
+            if os.path.normcase(os.path.abspath(entry["path"])) == previous_path:
+                return None
+        return previous["path"]
+
+    def fetch(self, key, movie_path):
+        """
+        Make the movie previously rendered for the given key available at the
+        given path.
+
+        The movie is hard linked if possible, copied otherwise.
+
+        :param str key: A render key.
+        :param str movie_path: Full path to the movie to create.
+        :returns: The path of the reused movie, or None if no movie is available
+                  for the key.
+        """
+        cached_path = self.get(key)
+        if not cached_path:
+            return None
+        if os.path.normcase(os.path.abspath(cached_path)) == os.path.normcase(os.path.abspath(movie_path)):
+            return cached_path
+        if os.path.isfile(movie_path):
+            os.remove(movie_path)
+        try:
+            os.link(cached_path, movie_path)
+        except (OSError, AttributeError):
+            shutil.copy2(cached_path, movie_path)
+        return cached_path
+
+
+def _copy_missing_files(source_dir, target_dir, max_bytes=None):
+    """
+    Copy files from the given source folder to the given target folder, keeping
+    the folder structure, unless they are already in the target folder.
+
+    Most recently modified files are copied first. Each file is copied to a
+    temporary file first and then moved in place, so processes reading the
+    target folder never see partial files.
+
+    :param str source_dir: Full path to the folder to copy files from.
+    :param str target_dir: Full path to the folder to copy files to.
+    :param max_bytes: Optional maximum number of bytes to copy.
+    :returns: A (number of copied files, number of copied bytes) tuple.
+    """
+    source_files = []
+    for dir_path, _, file_names in os.walk(source_dir):
+        for file_name in file_names:
+            source_file = os.path.join(dir_path, file_name)
+            try:
+                stat = os.stat(source_file)
+            except OSError:
+                continue
+            source_files.append((stat.st_mtime, stat.st_size, source_file))
+    source_files.sort(reverse=True)
+
+    copied_files = copied_bytes = 0
+    for _, size, source_file in source_files:
+        target_file = os.path.join(target_dir, os.path.relpath(source_file, source_dir))
+        if os.path.exists(target_file):
+            continue
+        if max_bytes and copied_bytes + size > max_bytes:
+            break
+        target_path = os.path.dirname(target_file)
+        if not os.path.isdir(target_path):
+            os.makedirs(target_path)
+        f, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=target_path)
+        os.close(f)
+        try:
+            shutil.copy2(source_file, tmp_path)
+            os.replace(tmp_path, target_file)
+        except (IOError, OSError):
+            # The source file was deleted, or the target file was created
+            # by someone else in the meantime.
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            continue
+        copied_files += 1
+        copied_bytes += os.path.getsize(target_file)
+    return copied_files, copied_bytes
+
+
+def _move_file(source_path, target_path, chunk_size=8 * 1024 * 1024):
+    """
+    Move the given file to the given path.
+
+    Files on the same device are just renamed. Otherwise the file is copied
+    to a temporary file next to the target, its checksum computed while it is
+    read, and the copy read back and checked against it before it is renamed
+    to the target path. Readers of the target path thus never see a partial
+    or corrupted file.
+
+    :param str source_path: Full path to the file to move.
+    :param str target_path: Full path to move the file to.
+    :param int chunk_size: Size of the chunks the file is copied by, in bytes.
+    :returns: The SHA-256 checksum of the file, or None if it was renamed.
+    :raises IOError: If the copy does not match the source file.
+    """
+    target_dir = os.path.dirname(target_path)
+    if os.stat(source_path).st_dev == os.stat(target_dir).st_dev:
+        os.replace(source_path, target_path)
+        return None
+    f, tmp_path = tempfile.mkstemp(
+        prefix=".%s_" % os.path.basename(target_path), suffix=".tmp", dir=target_dir
+    )
+    try:
+        source_hash = hashlib.sha256()
+        with os.fdopen(f, "wb") as target_fh:
+            with open(source_path, "rb") as source_fh:
+                while True:
+                    chunk = source_fh.read(chunk_size)
+                    if not chunk:
+                        break
+                    source_hash.update(chunk)
+                    target_fh.write(chunk)
+            target_fh.flush()
+            os.fsync(target_fh.fileno())
+        copy_hash = hashlib.sha256()
+        _hash_file(tmp_path, copy_hash)
+        if copy_hash.hexdigest() != source_hash.hexdigest():
+            raise IOError(
+                "Checksum mismatch when copying %s to %s" % (source_path, target_path)
+            )
+        shutil.copystat(source_path, tmp_path)
+        os.replace(tmp_path, target_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.remove(source_path)
+    return source_hash.hexdigest()
+
+
+# Name of the engine attribute storing the shared caches prewarmed in this
+# Unreal session, as a dictionary where keys are target folders and values the
+# threads copying files to them, so they are not prewarmed again when hooks
+# are reloaded.
+_CACHE_PREWARM_THREADS_ENGINE_ATTRIBUTE = "_publish2_cache_prewarm_threads"
+
+
+def _prewarm_cache(source_dir, target_dir, max_bytes, messages):
+    """
+    Copy cache files from the given source folder to the given target folder.
+
+    This is run from a background thread, so nothing is logged: messages are
+    added to the given list, to be logged from the main thread.
+
+    :param str source_dir: Full path to the local cache folder.
+    :param str target_dir: Full path to the shared cache folder.
+    :param max_bytes: Optional maximum number of bytes to copy.
+    :param messages: A list to add (logging level, message) tuples to.
+    """
+    start_time = time.time()
+    try:
+        copied_files, copied_bytes = _copy_missing_files(source_dir, target_dir, max_bytes)
+    except Exception as e:
+        messages.append((logging.WARNING, "Unable to prewarm %s: %s" % (target_dir, e)))
+        return
+    messages.append((
+        logging.INFO,
+        "Prewarmed %s with %d files, %.1f MB, in %s." % (
+            target_dir,
+            copied_files,
+            copied_bytes / (1024.0 * 1024.0),
+            datetime.timedelta(seconds=int(time.time() - start_time)),
+        )
+    ))
+
+
+def _kill_process_tree(process):
+    """
+    Kill the given process and all its children.
+
+    :param process: A :class:`subprocess.Popen` instance, started with
+                    :func:`_get_process_group_kwargs` keyword arguments.
+    """
+    if sys.platform == "win32":
+        with open(os.devnull, "w") as devnull:
+            subprocess.call(
+                ["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                stdout=devnull,
+                stderr=devnull,
+            )
+    else:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            process.kill()
+
+
+def _get_process_group_kwargs(priority=None, suspended=False):
+    """
+    Return keyword arguments for :class:`subprocess.Popen` to start a process
+    in its own process group, so it can be killed with all its children.
+
+    :param str priority: Optional process priority, one of the
+                         :data:`_PROCESS_PRIORITIES` keys, only used on
+                         Windows.
+    :param bool suspended: If True, the process is created suspended, only
+                           used on Windows, see :func:`_resume_process`.
+    :returns: A dictionary.
+    """
+    if sys.platform == "win32":
+        creationflags = subprocess.CREATE_NEW_PROCESS_GROUP
+        if priority:
+            creationflags |= getattr(subprocess, _PROCESS_PRIORITIES[priority])
+        if suspended:
+            creationflags |= _CREATE_SUSPENDED
+        return {"creationflags": creationflags}
+    return {"start_new_session": True}
+
+
+def _get_resource_limits(profile):
+    """
+    Return the resource limits for render processes from the given render
+    profile.
+
+    :param profile: A render profile dictionary, the "final" profile is used
+                    if not set.
+    :returns: A dictionary with "priority", "cpu_affinity" and "memory_limit"
+              keys.
+    """
+    profile = profile or _DEFAULT_RENDER_PROFILES["final"]
+    return dict(
+        (key, profile.get(key)) for key in ["priority", "cpu_affinity", "memory_limit"]
+    )
+
+
+def _check_resource_limits(resource_limits):
+    """
+    Check the given resource limits.
+
+    :param resource_limits: A dictionary returned by :func:`_get_resource_limits`.
+    :raises ValueError: If a limit is invalid.
+    """
+    priority = resource_limits.get("priority")
+    if priority and priority not in _PROCESS_PRIORITIES:
+        raise ValueError(
+            "Invalid render process priority %s, valid priorities are %s." % (
+                priority, ", ".join(sorted(_PROCESS_PRIORITIES))
+            )
+        )
+    cpu_affinity = resource_limits.get("cpu_affinity")
+    if cpu_affinity is not None and (
+        not cpu_affinity or not all(isinstance(cpu, int) and cpu >= 0 for cpu in cpu_affinity)
+    ):
+        raise ValueError("Invalid render process CPU affinity %s." % cpu_affinity)
+    memory_limit = resource_limits.get("memory_limit")
+    if memory_limit is not None and (not isinstance(memory_limit, int) or memory_limit <= 0):
+        raise ValueError("Invalid render process memory limit %s." % memory_limit)
+
+
+def _get_kernel32():
+    """
+    Return the Windows kernel32 library, with the signatures of the functions
+    used to limit render processes.
+
+    A private instance is used, so other users of :data:`ctypes.windll` are not
+    affected by the signatures set here.
+
+    :returns: A :class:`ctypes.WinDLL` instance.
+    """
+    import ctypes
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.CreateJobObjectW.argtypes = [ctypes.c_void_p, ctypes.c_wchar_p]
+    kernel32.CreateJobObjectW.restype = ctypes.c_void_p
+    kernel32.SetInformationJobObject.argtypes = [
+        ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_uint32
+    ]
+    kernel32.SetInformationJobObject.restype = ctypes.c_int
+    kernel32.AssignProcessToJobObject.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    kernel32.AssignProcessToJobObject.restype = ctypes.c_int
+    kernel32.SetProcessAffinityMask.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+    kernel32.SetProcessAffinityMask.restype = ctypes.c_int
+    kernel32.CreateToolhelp32Snapshot.argtypes = [ctypes.c_uint32, ctypes.c_uint32]
+    kernel32.CreateToolhelp32Snapshot.restype = ctypes.c_void_p
+    kernel32.Thread32First.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    kernel32.Thread32First.restype = ctypes.c_int
+    kernel32.Thread32Next.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    kernel32.Thread32Next.restype = ctypes.c_int
+    kernel32.OpenThread.argtypes = [ctypes.c_uint32, ctypes.c_int, ctypes.c_uint32]
+    kernel32.OpenThread.restype = ctypes.c_void_p
+    kernel32.ResumeThread.argtypes = [ctypes.c_void_p]
+    kernel32.ResumeThread.restype = ctypes.c_uint32
+    kernel32.CloseHandle.argtypes = [ctypes.c_void_p]
+    kernel32.CloseHandle.restype = ctypes.c_int
+    return kernel32
+
+
+def _resume_process(process):
+    """
+    Resume the threads of the given process, created suspended.
+
+    :param process: A :class:`subprocess.Popen` instance.
+    :raises OSError: If the process can't be resumed.
+    """
+    import ctypes
+
+    class ThreadEntry32(ctypes.Structure):
+        _fields_ = [
+            ("dwSize", ctypes.c_uint32),
+            ("cntUsage", ctypes.c_uint32),
+            ("th32ThreadID", ctypes.c_uint32),
+            ("th32OwnerProcessID", ctypes.c_uint32),
+            ("tpBasePri", ctypes.c_int32),
+            ("tpDeltaPri", ctypes.c_int32),
+            ("dwFlags", ctypes.c_uint32),
+        ]
+
+    kernel32 = _get_kernel32()
+    snapshot = kernel32.CreateToolhelp32Snapshot(_TH32CS_SNAPTHREAD, 0)
+    if snapshot is None or snapshot == ctypes.c_void_p(-1).value:
+        raise ctypes.WinError(ctypes.get_last_error())
+    try:
+        entry = ThreadEntry32()
+        entry.dwSize = ctypes.sizeof(entry)
+        found = kernel32.Thread32First(snapshot, ctypes.byref(entry))
+        while found:
+            if entry.th32OwnerProcessID == process.pid:
+                thread = kernel32.OpenThread(_THREAD_SUSPEND_RESUME, False, entry.th32ThreadID)
+                if not thread:
+                    raise ctypes.WinError(ctypes.get_last_error())
+                try:
+                    if kernel32.ResumeThread(thread) == 0xFFFFFFFF:
+                        raise ctypes.WinError(ctypes.get_last_error())
+                finally:
+                    kernel32.CloseHandle(thread)
+            found = kernel32.Thread32Next(snapshot, ctypes.byref(entry))
+    finally:
+        kernel32.CloseHandle(snapshot)
+
+
+def _start_render_process(cmd_args, env, resource_limits):
+    """
+    Start a render process in its own process group, with the given resource
+    limits.
+
+    On Windows the process is created suspended and only resumed once limits
+    are applied, so processes it starts, e.g. shader compile workers, can't
+    escape them.
+
+    :param cmd_args: A list of command line arguments.
+    :param env: The environment for the process.
+    :param resource_limits: A dictionary returned by :func:`_get_resource_limits`.
+    :returns: A (:class:`subprocess.Popen` instance, list of messages for
+              limits which couldn't be applied) tuple.
+    :raises OSError: If the process can't be started.
+    """
+    suspended = sys.platform == "win32"
+    process = subprocess.Popen(
+        cmd_args,
+        env=env,
+        **_get_process_group_kwargs(resource_limits.get("priority"), suspended=suspended)
+    )
+    warnings = _apply_resource_limits(process, resource_limits)
+    if suspended:
+        try:
+            _resume_process(process)
+        except OSError:
+            _kill_process_tree(process)
+            process.wait()
+            raise
+    return process, warnings
+
+
+def _set_process_memory_limit(process, memory_limit):
+    """
+    Limit the memory the given process can commit, by assigning it to a new
+    Windows Job Object.
+
+    No extra privileges are needed. The Job Object is kept alive by the
+    processes assigned to it, so its handle is closed once it is set up.
+
+    :param process: A :class:`subprocess.Popen` instance.
+    :param int memory_limit: The maximum committed memory, in megabytes.
+    :raises OSError: If the limit can't be set.
+    """
+    import ctypes
+
+    class IoCounters(ctypes.Structure):
+        _fields_ = [
+            (name, ctypes.c_ulonglong) for name in [
+                "ReadOperationCount", "WriteOperationCount", "OtherOperationCount",
+                "ReadTransferCount", "WriteTransferCount", "OtherTransferCount",
+            ]
+        ]
+
+    class JobObjectBasicLimitInformation(ctypes.Structure):
+        _fields_ = [
+            ("PerProcessUserTimeLimit", ctypes.c_longlong),
+            ("PerJobUserTimeLimit", ctypes.c_longlong),
+            ("LimitFlags", ctypes.c_uint32),
+            ("MinimumWorkingSetSize", ctypes.c_size_t),
+            ("MaximumWorkingSetSize", ctypes.c_size_t),
+            ("ActiveProcessLimit", ctypes.c_uint32),
+            ("Affinity", ctypes.c_size_t),
+            ("PriorityClass", ctypes.c_uint32),
+            ("SchedulingClass", ctypes.c_uint32),
+        ]
+
+    class JobObjectExtendedLimitInformation(ctypes.Structure):
+        _fields_ = [
+            ("BasicLimitInformation", JobObjectBasicLimitInformation),
+            ("IoInfo", IoCounters),
+            ("ProcessMemoryLimit", ctypes.c_size_t),
+            ("JobMemoryLimit", ctypes.c_size_t),
+            ("PeakProcessMemoryUsed", ctypes.c_size_t),
+            ("PeakJobMemoryUsed", ctypes.c_size_t),
+        ]
+
+    kernel32 = _get_kernel32()
+    job = kernel32.CreateJobObjectW(None, None)
+    if not job:
+        raise ctypes.WinError(ctypes.get_last_error())
+    try:
+        info = JobObjectExtendedLimitInformation()
+        info.BasicLimitInformation.LimitFlags = _JOB_OBJECT_LIMIT_PROCESS_MEMORY
+        info.ProcessMemoryLimit = memory_limit * 1024 * 1024
+        if not kernel32.SetInformationJobObject(
+            job,
+            _JOB_OBJECT_EXTENDED_LIMIT_INFORMATION_CLASS,
+            ctypes.byref(info),
+            ctypes.sizeof(info),
+        ):
+            raise ctypes.WinError(ctypes.get_last_error())
+        if not kernel32.AssignProcessToJobObject(job, int(process._handle)):
+            raise ctypes.WinError(ctypes.get_last_error())
+    finally:
+        kernel32.CloseHandle(job)
+
+
+def _apply_resource_limits(process, resource_limits):
+    """
+    Apply the given resource limits to the given process, just started.
+
+    The priority is set when the process is started, see
+    :func:`_get_process_group_kwargs`. Processes started by the process
+    afterwards, e.g. shader compile workers, inherit the limits, see
+    :func:`_start_render_process`.
+
+    :param process: A :class:`subprocess.Popen` instance, started with
+                    :func:`_get_process_group_kwargs` keyword arguments.
+    :param resource_limits: A dictionary returned by :func:`_get_resource_limits`.
+    :returns: A list of messages for limits which couldn't be applied.
+    """
+    warnings = []
+    cpu_affinity = resource_limits.get("cpu_affinity")
+    if cpu_affinity:
+        try:
+            if sys.platform != "win32":
+                raise OSError("not supported on this platform")
+            import ctypes
+            mask = 0
+            for cpu in cpu_affinity:
+                mask |= 1 << cpu
+            if not _get_kernel32().SetProcessAffinityMask(int(process._handle), mask):
+                raise ctypes.WinError(ctypes.get_last_error())
+        except OSError as e:
+            warnings.append("Unable to set render process CPU affinity to %s: %s" % (cpu_affinity, e))
+    memory_limit = resource_limits.get("memory_limit")
+    if memory_limit:
+        try:
+            if sys.platform != "win32":
+                raise OSError("not supported on this platform")
+            _set_process_memory_limit(process, memory_limit)
+        except OSError as e:
+            warnings.append("Unable to limit render process memory to %d MB: %s" % (memory_limit, e))
+    return warnings
+
+
+class RenderJob(object):
+    """
+    A render running in a separate Unreal process.
+
+    The render process is supervised from :meth:`run`, typically called from a
+    worker thread: its log file is parsed for progress, it is killed with all
+    its children if it runs for too long or if the job is cancelled.
+    :meth:`wait` can be used to wait for the job to complete.
+    """
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    TIMED_OUT = "timed out"
+    CANCELLED = "cancelled"
+
+    # Patterns used to retrieve progress from render logs: frame counts,
+    # e.g. "Frame 12/240", or percentages, e.g. "Progress: 5.2%".
+    FRAME_PATTERN = re.compile(r"[Ff]rame\s*(\d+)\s*(?:/|of)\s*(\d+)")
+    PERCENT_PATTERN = re.compile(r"[Pp]rogress[^0-9%]*(\d+(?:\.\d+)?)\s*%")
+    # Patterns used to retrieve cache statistics from render logs, keyed by
+    # cache name. The first group is the number of queries and the second one
+    # the number of hits, counts can have thousands separators.
+    CACHE_STATS_PATTERNS = {
+        "shader job cache": re.compile(
+            r"Total job queries (\d[\d,]*), among them cache hits (\d[\d,]*)"
+        ),
+        # Derived Data Cache summary, e.g. "LogDerivedDataCache: Display:
+        # Total Gets: 1,234, Hits: 1,100, Misses: 134".
+        "DDC": re.compile(
+            r"LogDerivedDataCache:.*?\b(?:Gets|Requests|Queries)\s*[:=]?\s*(\d[\d,]*)"
+            r".*?\bHits\s*[:=]?\s*(\d[\d,]*)",
+            re.IGNORECASE,
+        ),
+    }
+    # Interval, in seconds, at which the render process is checked.
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, name, cmd_args, env=None, log_path=None, output_paths=None, timeout=None, resource_limits=None):
+        """
+        :param str name: A name for the job, used in messages.
+        :param cmd_args: A list of command line arguments for the render process.
+        :param env: Optional environment for the render process.
+        :param str log_path: Optional full path to the log file of the render
+                             process.
+        :param output_paths: Optional list of files expected to be rendered.
+        :param timeout: Optional maximum duration for the render, in seconds.
+        :param resource_limits: Optional dictionary returned by
+                                :func:`_get_resource_limits`.
+        """
+        self.name = name
+        self.cmd_args = cmd_args
+        self.env = env
+        self.log_path = log_path
+        self.output_paths = output_paths or []
+        self.timeout = timeout
+        self.resource_limits = resource_limits or {}
+        # Messages for resource limits which couldn't be applied.
+        self.warnings = []
+        self.status = None
+        self.returncode = None
+        self.error = None
+        self.start_time = None
+        self.end_time = None
+        # Progress, in percent, and estimated remaining time, in seconds.
+        self.percent = None
+        self.eta = None
+        self._progress_start = None
+        # Cache statistics, as a dictionary where keys are cache names and
+        # values (queries, hits) tuples.
+        self.cache_stats = {}
+        # Offset from which the log file is read, for log files shared by
+        # several jobs.
+        self._log_offset = 0
+        self._log_buffer = ""
+        self._done = threading.Event()
+        self._cancel = threading.Event()
+
+    @property
+    def done(self):
+        """
+        Return True if the job completed, False otherwise.
+        """
+        return self._done.is_set()
+
+    @property
+    def result(self):
+        """
+        Return the outcome of this job.
+
+        :returns: A :class:`RenderJobResult` instance.
+        """
+        duration = None
+        if self.start_time is not None:
+            duration = (self.end_time or time.time()) - self.start_time
+        return RenderJobResult(self.status, self.returncode, duration, self.log_path, self.error)
+
+    def cancel(self):
+        """
+        Request the job to be cancelled.
+
+        The render process is killed if it is running, the job won't start if
+        it was not started yet.
+        """
+        self._cancel.set()
+
+    def run(self):
+        """
+        Run the render process and supervise it until it completes.
+
+        :returns: The exit code of the render process, or None if it couldn't
+                  be started or was killed.
+        """
+        self.start_time = time.time()
+        try:
+            if self._cancel.is_set():
+                self.status = self.CANCELLED
+                self.error = "Render was cancelled before it started."
+                return None
+            try:
+                process, warnings = _start_render_process(self.cmd_args, self.env, self.resource_limits)
+            except OSError as e:
+                self.status = self.FAILED
+                self.error = "Unable to start the render process: %s" % e
+                return None
+            self.warnings.extend(warnings)
+            log_file = None
+            try:
+                while process.poll() is None:
+                    log_file = self._read_log(log_file)
+                    if self._cancel.is_set():
+                        self.status = self.CANCELLED
+                        self.error = "Render was cancelled."
+                    elif self.timeout and time.time() - self.start_time > self.timeout:
+                        self.status = self.TIMED_OUT
+                        self.error = "Render did not complete within %d seconds." % self.timeout
+                    if self.status:
+                        _kill_process_tree(process)
+                        process.wait()
+                        return None
+                    time.sleep(self.POLL_INTERVAL)
+                self._read_log(log_file)
+            finally:
+                if log_file:
+                    log_file.close()
+            self.returncode = process.returncode
+            if self.returncode:
+                self.status = self.FAILED
+                self.error = "Render process exited with code %d." % self.returncode
+            else:
+                self.status = self.SUCCEEDED
+            return self.returncode
+        finally:
+            self.end_time = time.time()
+            self._done.set()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the job to complete.
+
+        :param timeout: Optional timeout, in seconds.
+        :returns: True if the job completed, False otherwise.
+        """
+        return self._done.wait(timeout)
+
+    def get_results(self):
+        """
+        Return results for all the files expected to be rendered by this job.
+
+        Files are not considered rendered if the job was cancelled or timed out,
+        since they are likely incomplete.
+
+        :returns: A list of tuples with True if the file was rendered, False
+                  otherwise, and the file path.
+        """
+        interrupted = self.status in [self.CANCELLED, self.TIMED_OUT]
+        return [
+            (not interrupted and os.path.isfile(output_path), output_path)
+            for output_path in self.output_paths
+        ]
+
+    def _read_log(self, log_file):
+        """
+        Parse new lines from the render log file for progress.
+
+        :param log_file: The opened log file, or None if it was not opened yet.
+        :returns: The opened log file, or None if it is not available yet.
+        """
+        if log_file is None:
+            if not self.log_path or not os.path.isfile(self.log_path):
+                return None
+            try:
+                log_file = open(self.log_path, "r", errors="replace")
+            except (IOError, OSError):
+                return None
+            log_file.seek(self._log_offset)
+        self._log_buffer += log_file.read()
+        lines = self._log_buffer.split("\n")
+        # Keep the last, possibly incomplete, line for later.
+        self._log_buffer = lines.pop()
+        for line in lines:
+            self._parse_progress(line)
+            self._parse_cache_stats(line)
+        return log_file
+
+    def _parse_progress(self, line):
+        """
+        Update progress and estimated remaining time from the given log line.
+
+        :param str line: A line from the render log.
+        """
+        match = self.FRAME_PATTERN.search(line)
+        if match and int(match.group(2)):
+            percent = 100.0 * int(match.group(1)) / int(match.group(2))
+        else:
+            match = self.PERCENT_PATTERN.search(line)
+            if not match:
+                return
+            percent = float(match.group(1))
+        percent = min(percent, 100.0)
+        now = time.time()
+        if self._progress_start is None:
+            self._progress_start = (now, percent)
+        start_time, start_percent = self._progress_start
+        if percent > start_percent:
+            self.eta = (now - start_time) * (100.0 - percent) / (percent - start_percent)
+        self.percent = percent
+
+    def _parse_cache_stats(self, line):
+        """
+        Update cache statistics from the given log line.
+
+        :param str line: A line from the render log.
+        """
+        for name, pattern in self.CACHE_STATS_PATTERNS.items():
+            match = pattern.search(line)
+            if match:
+                self.cache_stats[name] = (
+                    int(match.group(1).replace(",", "")),
+                    int(match.group(2).replace(",", "")),
+                )
+
+
+class RenderWorker(object):
+    """
+    A long lived Unreal process rendering Movie Render Queue manifests.
+
+    The process runs the :mod:`movie_render_worker` script. Requests are
+    submitted as files in a spool folder, which the worker picks up one after
+    the other, writing a result file for each of them. The worker is asked to
+    quit with a stop file when Python exits, and quits by itself if the
+    process which started it is gone.
+    """
+    REQUEST_SUFFIX = ".request.json"
+    RESULT_SUFFIX = ".result.json"
+    STOP_FILE = "stop"
+    # Number of seconds to wait for the worker to quit when asked to.
+    SHUTDOWN_TIMEOUT = 10
+
+    def __init__(self, cmd_args, spool_dir, env=None, log_path=None, resource_limits=None):
+        """
+        :param cmd_args: A list of command line arguments for the worker process.
+        :param str spool_dir: Full path to the spool folder.
+        :param env: Optional environment for the worker process.
+        :param str log_path: Optional full path to the log file of the worker
+                             process.
+        :param resource_limits: Optional dictionary returned by
+                                :func:`_get_resource_limits`.
+        """
+        self.cmd_args = cmd_args
+        self.spool_dir = spool_dir
+        self.env = env
+        self.log_path = log_path
+        self.resource_limits = resource_limits or {}
+        # Messages for resource limits which couldn't be applied.
+        self.warnings = []
+        self._process = None
+
+    @property
+    def running(self):
+        """
+        Return True if the worker process is running, False otherwise.
+        """
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        """
+        Start the worker process, clearing stale requests and results.
+        """
+        if not os.path.isdir(self.spool_dir):
+            os.makedirs(self.spool_dir)
+        for name in os.listdir(self.spool_dir):
+            os.remove(os.path.join(self.spool_dir, name))
+        env = dict(self.env or os.environ)
+        env["SG_UNREAL_RENDER_WORKER_PARENT_PID"] = str(os.getpid())
+        self._process, self.warnings = _start_render_process(self.cmd_args, env, self.resource_limits)
+        atexit.register(self.shutdown)
+
+    def stop(self):
+        """
+        Kill the worker process, with all its children.
+        """
+        atexit.unregister(self.shutdown)
+        if self.running:
+            _kill_process_tree(self._process)
+            self._process.wait()
+        self._process = None
+
+    def shutdown(self):
+        """
+        Ask the worker process to quit, and kill it if it doesn't.
+        """
+        if not self.running:
+            return
+        with open(os.path.join(self.spool_dir, self.STOP_FILE), "w"):
+            pass
+        try:
+            self._process.wait(self.SHUTDOWN_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            pass
+        self.stop()
+
+    def submit(self, manifest_path):
+        """
+        Submit the given manifest to the worker.
+
+        :param str manifest_path: Full path to a Movie Render Queue manifest.
+        :returns: A request id.
+        """
+        f, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.spool_dir)
+        with os.fdopen(f, "w") as fh:
+            json.dump({"manifest": manifest_path}, fh)
+        request_id = os.path.splitext(os.path.basename(tmp_path))[0]
+        os.replace(tmp_path, os.path.join(self.spool_dir, "%s%s" % (request_id, self.REQUEST_SUFFIX)))
+        return request_id
+
+    def get_result(self, request_id):
+        """
+        Return the result for the given request, if it completed.
+
+        :param str request_id: A request id, as returned by :meth:`submit`.
+        :returns: A dictionary with "success" and "error" keys, or None.
+        """
+        result_path = os.path.join(self.spool_dir, "%s%s" % (request_id, self.RESULT_SUFFIX))
+        if not os.path.isfile(result_path):
+            return None
+        with open(result_path, "r") as fh:
+            result = json.load(fh)
+        os.remove(result_path)
+        return result
+
+
+# Name of the engine attribute storing the render worker shared by all
+# publishes in this Unreal session. The worker is not stored in this module,
+# so it is not lost when hooks are reloaded.
+_RENDER_WORKER_ENGINE_ATTRIBUTE = "_publish2_render_worker"
+
+
+class WorkerRenderJob(RenderJob):
+    """
+    A render submitted to a :class:`RenderWorker`.
+
+    Progress is read from the worker log, from the point the request was
+    submitted. Cancelling the job or exceeding its timeout kills the worker,
+    which is restarted for the next render.
+    """
+    def __init__(self, name, worker, manifest_path, output_paths=None, timeout=None):
+        """
+        :param str name: A name for the job, used in messages.
+        :param worker: The :class:`RenderWorker` to submit the render to.
+        :param str manifest_path: Full path to a Movie Render Queue manifest.
+        :param output_paths: Optional list of files expected to be rendered.
+        :param timeout: Optional maximum duration for the render, in seconds.
+        """
+        super(WorkerRenderJob, self).__init__(
+            name,
+            worker.cmd_args,
+            env=worker.env,
+            log_path=worker.log_path,
+            output_paths=output_paths,
+            timeout=timeout,
+        )
+        self.worker = worker
+        self.manifest_path = manifest_path
+        # Set to True if the worker exited while rendering the job.
+        self.worker_exited = False
+
+    def run(self):
+        """
+        Submit the render to the worker and supervise it until it completes.
+
+        :returns: 0 if the render succeeded, None otherwise.
+        """
+        self.start_time = time.time()
+        log_file = None
+        try:
+            if self._cancel.is_set():
+                self.status = self.CANCELLED
+                self.error = "Render was cancelled before it started."
+                return None
+            if self.log_path and os.path.isfile(self.log_path):
+                self._log_offset = os.path.getsize(self.log_path)
+            request_id = self.worker.submit(self.manifest_path)
+            while True:
+                log_file = self._read_log(log_file)
+                # Check the worker before reading the result, so a result
+                # written just before the worker quit is not missed.
+                running = self.worker.running
+                result = self.worker.get_result(request_id)
+                if result:
+                    if result["success"]:
+                        self.status = self.SUCCEEDED
+                        self.returncode = 0
+                    else:
+                        self.status = self.FAILED
+                        self.error = result["error"]
+                    return self.returncode
+                if not running:
+                    self.status = self.FAILED
+                    self.error = "Render worker exited unexpectedly."
+                    self.worker_exited = True
+                    return None
+                if self._cancel.is_set():
+                    self.status = self.CANCELLED
+                    self.error = "Render was cancelled."
+                elif self.timeout and time.time() - self.start_time > self.timeout:
+                    self.status = self.TIMED_OUT
+                    self.error = "Render did not complete within %d seconds." % self.timeout
+                if self.status:
+                    self.worker.stop()
+                    return None
+                time.sleep(self.POLL_INTERVAL)
+        finally:
+            if log_file:
+                log_file.close()
+            self.end_time = time.time()
+            self._done.set()
+
+
+class DeferredUploadQueue(object):
+    """
+    A persistent queue of movies to upload to Versions during off-peak hours.
+
+    Entries are stored in a JSON file, so uploads which did not happen before
+    Unreal was closed are done the next time the queue is started. Uploads are
+    done from a background thread.
+    """
+    # Interval, in seconds, at which the queue is checked.
+    POLL_INTERVAL = 60
+
+    def __init__(self, path, upload_callback):
+        """
+        :param str path: Full path to the queue file.
+        :param upload_callback: A callable uploading a movie, called with a
+                                Version id, a movie path and an optional FFmpeg
+                                path to transcode a review proxy.
+        """
+        self.path = path
+        self.upload_callback = upload_callback
+        self.off_peak_hours = None
+        self.errors = []
+        self._lock = threading.Lock()
+        # The upload thread, only set while it runs, protected by the lock.
+        self._thread = None
+
+    def add(self, version_id, movie_path, ffmpeg_path=None):
+        """
+        Add a movie to upload and start the queue if needed.
+
+        :param int version_id: The id of the Version to upload the movie to.
+        :param str movie_path: Full path to the movie.
+        :param str ffmpeg_path: Optional full path to the FFmpeg executable, to
+                                upload a review proxy instead of the movie.
+        """
+        with self._lock:
+            entries = self._load()
+            entries.append({"version_id": version_id, "path": movie_path, "ffmpeg_path": ffmpeg_path})
+            self._save(entries)
+        self.start()
+
+    @property
+    def pending(self):
+        """
+        Return True if some movies are waiting to be uploaded.
+
+        :returns: A boolean.
+        """
+        with self._lock:
+            return bool(self._load())
+
+    def start(self):
+        """
+        Start the background upload thread, if not already running.
+        """
+        with self._lock:
+            # The thread clears this under the lock when it decides to exit,
+            # so entries added afterwards are picked up by a new thread.
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="Deferred Uploads")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def is_off_peak(self, now=None):
+        """
+        Return True if uploads are allowed at the given time.
+
+        :param now: Optional :class:`datetime.datetime`, current time if not set.
+        :returns: A boolean.
+        """
+        if not self.off_peak_hours:
+            return True
+        start_hour, end_hour = self.off_peak_hours
+        hour = (now or datetime.datetime.now()).hour
+        if start_hour <= end_hour:
+            return start_hour <= hour < end_hour
+        # The off-peak window spans midnight.
+        return hour >= start_hour or hour < end_hour
+
+    def _run(self):
+        """
+        Upload queued movies during off-peak hours, until the queue is empty.
+        """
+        while True:
+            if not self.is_off_peak():
+                time.sleep(self.POLL_INTERVAL)
+                continue
+            with self._lock:
+                entries = self._load()
+                if not entries:
+                    self._thread = None
+                    return
+            entry = entries[0]
+            try:
+                self.upload_callback(entry["version_id"], entry["path"], entry.get("ffmpeg_path"))
+            except Exception as e:
+                self.errors.append(
+                    "Unable to upload %s to Version %s: %s" % (entry["path"], entry["version_id"], e)
+                )
+            with self._lock:
+                entries = self._load()
+                if entry in entries:
+                    entries.remove(entry)
+                self._save(entries)
+
+    def _load(self):
+        """
+        Read queued entries.
+
+        :returns: A list of dictionaries.
+        """
+        try:
+            with open(self.path, "r") as fh:
+                return json.load(fh)
+        except (IOError, OSError, ValueError):
+            return []
+
+    def _save(self, entries):
+        """
+        Write the given entries to the queue file.
+
+        :param entries: A list of dictionaries.
+        """
+        queue_dir = os.path.dirname(self.path)
+        if not os.path.isdir(queue_dir):
+            os.makedirs(queue_dir)
+        f, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=queue_dir)
+        with os.fdopen(f, "w") as fh:
+            json.dump(entries, fh)
+        os.replace(tmp_path, self.path)
+
+
+# How rendered movies can be sent to their Version.
+_UPLOAD_MODES = ["upload", "link", "deferred"]
+
+# Name of the engine attribute storing the deferred upload queue shared by all
+# publishes in this Unreal session, so it is not lost when hooks are reloaded.
+_DEFERRED_UPLOAD_QUEUE_ENGINE_ATTRIBUTE = "_publish2_deferred_upload_queue"
+
+
 HookBaseClass = sgtk.get_hook_baseclass()
 
 print("PUBLISH_MOVIE LOADING")
@@ -49,6 +1486,31 @@ class UnrealMoviePublishPlugin(HookBaseClass):
             os.environ['WONJIN_PUBLISH_MOVIE'] += os.pathsep + 'PUBLISH_MOVIE_INIT'
         else:
             os.environ['WONJIN_PUBLISH_MOVIE'] = 'PUBLISH_MOVIE_INIT'
+        # Validated items which could be rendered together, keyed by item id.
+        self._pending_render_items = {}
+        # Render results for items rendered in a batch, keyed by item id.
+        self._render_results = {}
+        # Render jobs submitted to the render worker pool, keyed by item id.
+        self._render_jobs = {}
+        self._render_pool = None
+        self._render_pool_size = 0
+        # (future, job) tuples for the jobs submitted to the render pool.
+        self._render_pool_futures = []
+        # Background uploads, keyed by item id.
+        self._upload_pool = None
+        self._uploads = {}
+        self._deferred_upload_queue = None
+        # Master sequence renders shots are cut from, keyed by master sequence
+        # and render settings.
+        self._master_renders = {}
+        # Folder for intermediate renders, the Unreal project Saved folder is
+        # used if not set.
+        self._render_scratch_dir = None
+        # Shared caches used by render processes.
+        self._shared_ddc_path = None
+        # Messages from cache prewarming threads, to be logged from the main
+        # thread, as (logging level, message) tuples.
+        self._cache_prewarm_messages = []
     # NOTE: The plugin icon and name are defined by the base file plugin.
 
     @property
@@ -97,21 +1559,201 @@ class UnrealMoviePublishPlugin(HookBaseClass):
             "Publish Template": {
                 "type": "template",
                 "default": None,
-                "description": "Template path for published work files. Should"
-                               "correspond to a template defined in "
-                               "templates.yml.",
+                "description": "Template path for published work files. Should"
+                               "correspond to a template defined in "
+                               "templates.yml.",
+            },
+            "Movie Render Queue Presets Path": {
+                "type": "string",
+                "default": None,
+                "description": "Optional Unreal Path to saved presets "
+                               "for rendering with the Movie Render Queue"
+            },
+            "Publish Folder": {
+                "type": "string",
+                "default": None,
+                "description": "Optional folder to use as a root for publishes"
+            },
+            "Render Profiles": {
+                "type": "dict",
+                "default": _DEFAULT_RENDER_PROFILES,
+                "description": "Render profiles, keyed by name. Each profile is a "
+                               "dictionary with resolution, frame_rate, "
+                               "movie_quality, texture_streaming, spatial_samples, "
+                               "temporal_samples, cvars and exec_cmds keys, an "
+                               "optional sequencer_console_settings key to also "
+                               "use cvars and exec_cmds for Sequencer renders, and "
+                               "optional priority, cpu_affinity and memory_limit "
+                               "keys for render processes."
+            },
+            "Render Profile": {
+                "type": "string",
+                "default": "final",
+                "description": "Name of the render profile to use."
+            },
+            "Batch Render": {
+                "type": "bool",
+                "default": False,
+                "description": "If True, all Level Sequences rendered with the "
+                               "Movie Render Queue are rendered in a single "
+                               "Unreal process, when the first of them is "
+                               "published."
+            },
+            "Max Concurrent Renders": {
+                "type": "int",
+                "default": 1,
+                "description": "Maximum number of Movie Render Queue processes "
+                               "to run concurrently. With a value greater than "
+                               "one, renders for all validated items are started "
+                               "when the first of them is published, each of them "
+                               "in its own Unreal process. Ignored if "
+                               "\"Batch Render\" is on."
+            },
+            "Render Cache": {
+                "type": "bool",
+                "default": False,
+                "description": "If True, movies are not rendered again if the "
+                               "Level Sequence, its sub-sequences, the map and its "
+                               "external actors, the Movie Render Queue presets "
+                               "and the render settings "
+                               "did not change since a previous render, which is "
+                               "reused instead. Changes to other assets are not "
+                               "detected."
+            },
+            "Use Render Worker": {
+                "type": "bool",
+                "default": False,
+                "description": "If True, Movie Render Queue renders are submitted "
+                               "to a long lived Unreal render process, which is "
+                               "started on first use and kept running between "
+                               "publishes, so they don't pay the Unreal startup "
+                               "cost."
+            },
+            "Render Worker Idle Timeout": {
+                "type": "int",
+                "default": 600,
+                "description": "Number of seconds after which an idle render "
+                               "worker quits. Zero means it never quits."
+            },
+            "Background Upload": {
+                "type": "bool",
+                "default": False,
+                "description": "If True, Versions are created and movies uploaded "
+                               "from a background thread, while the next items "
+                               "are rendered. Upload errors are reported when "
+                               "items are finalized."
+            },
+            "Review Proxy": {
+                "type": "bool",
+                "default": False,
+                "description": "If True, a compact H.264 review proxy is "
+                               "transcoded locally with FFmpeg and uploaded to "
+                               "the Version instead of the rendered movie, which "
+                               "is still the published file."
+            },
+            "FFmpeg Path": {
+                "type": "string",
+                "default": "ffmpeg",
+                "description": "Path to the FFmpeg executable used to transcode "
+                               "review proxies, or its name if it is available "
+                               "from the PATH."
+            },
+            "Frame Range Chunks": {
+                "type": "int",
+                "default": 1,
+                "description": "Number of chunks the frame range of a Level "
+                               "Sequence is split into when rendered with the "
+                               "Movie Render Queue. Each chunk is rendered in its "
+                               "own Unreal process, up to \"Max Concurrent "
+                               "Renders\" chunks at a time, and "
+                               "chunks are concatenated with FFmpeg, see the "
+                               "\"FFmpeg Path\" setting. Individual shots are "
+                               "never split."
+            },
+            "Incremental Master Render": {
+                "type": "bool",
+                "default": False,
+                "description": "If True, whole Level Sequences rendered with the "
+                               "Movie Render Queue are rendered shot by shot. "
+                               "Shot renders are cached, only shots which changed "
+                               "are rendered again and all shots are spliced "
+                               "together with FFmpeg, see the \"FFmpeg Path\" "
+                               "setting. Changes to other tracks of the Level "
+                               "Sequence only cause shots they overlap to be "
+                               "rendered again."
+            },
+            "Shot Render Cache Folder": {
+                "type": "string",
+                "default": None,
+                "description": "Folder where shot renders are cached for "
+                               "incremental renders. The Unreal project Saved "
+                               "folder is used if not set."
             },
-            "Movie Render Queue Presets Path": {
+            "Upload Mode": {
+                "type": "string",
+                "default": "upload",
+                "description": "How rendered movies are sent to Versions when the "
+                               "publish path is under a ShotGrid Local Storage "
+                               "root: \"upload\" uploads them, \"link\" only "
+                               "sets the path to movie, \"deferred\" sets the "
+                               "path to movie and queues the upload for off-peak "
+                               "hours. Movies outside of Local Storage roots are "
+                               "always uploaded."
+            },
+            "Off-Peak Upload Hours": {
+                "type": "string",
+                "default": "20-7",
+                "description": "Hours during which deferred uploads are done, as "
+                               "\"<start hour>-<end hour>\", e.g. \"20-7\". "
+                               "Empty for any time."
+            },
+            "Cut Shots From Master": {
+                "type": "bool",
+                "default": False,
+                "description": "If True, individual shots rendered with the Movie "
+                               "Render Queue are cut from a single render of their "
+                               "master sequence, with FFmpeg stream copy, see the "
+                               "\"FFmpeg Path\" setting. Shots sections must not "
+                               "have start offsets or time scales."
+            },
+            "Shared DDC Path": {
                 "type": "string",
                 "default": None,
-                "description": "Optional Unreal Path to saved presets "
-                               "for rendering with the Movie Render Queue"
+                "description": "Folder of a shared file system Derived Data Cache "
+                               "used by render processes, instead of the one "
+                               "configured for the project."
             },
-            "Publish Folder": {
+            "Prewarm Render Caches": {
+                "type": "bool",
+                "default": False,
+                "description": "If True, the shared DDC is filled in the "
+                               "background with the editor local DDC, once per "
+                               "Unreal session, see the \"Prewarm Size Limit\" "
+                               "setting."
+            },
+            "Prewarm Size Limit": {
+                "type": "int",
+                "default": 2048,
+                "description": "Maximum amount of data copied when prewarming "
+                               "the shared DDC, in MB, most recently modified "
+                               "files first. Zero for no limit."
+            },
+            "Render Scratch Folder": {
                 "type": "string",
                 "default": None,
-                "description": "Optional folder to use as a root for publishes"
-            }
+                "description": "Local folder, ideally on a fast drive, where "
+                               "movies are rendered before being moved to the "
+                               "publish folder, and where master renders and "
+                               "chunks are written. Movies are rendered directly "
+                               "in the publish folder if not set."
+            },
+            "Render Timeout": {
+                "type": "int",
+                "default": 0,
+                "description": "Maximum duration of a render, in seconds. Render "
+                               "processes running longer are killed. Zero means "
+                               "no timeout."
+            },
         }
 
         # update the base settings
@@ -162,6 +1804,10 @@ class UnrealMoviePublishPlugin(HookBaseClass):
         for preset in unreal.EditorAssetLibrary.list_assets(presets_folder.path):
             settings_frame.unreal_render_presets_widget.addItem(preset.split(".")[0])
 
+        # Profiles are added when settings are set, since they can be configured.
+        settings_frame.unreal_render_profile_label = QtGui.QLabel("Render profile:")
+        settings_frame.unreal_render_profile_widget = QtGui.QComboBox()
+
         settings_frame.unreal_publish_folder_label = QtGui.QLabel("Publish folder:")
         storage_roots = self.parent.shotgun.find(
             "LocalStorage",
@@ -184,6 +1830,8 @@ class UnrealMoviePublishPlugin(HookBaseClass):
         settings_layout.addWidget(settings_frame.description_label)
         settings_layout.addWidget(settings_frame.unreal_render_presets_label)
         settings_layout.addWidget(settings_frame.unreal_render_presets_widget)
+        settings_layout.addWidget(settings_frame.unreal_render_profile_label)
+        settings_layout.addWidget(settings_frame.unreal_render_profile_widget)
         settings_layout.addWidget(settings_frame.unreal_publish_folder_label)
         settings_layout.addWidget(settings_frame.storage_roots_widget)
 
@@ -216,6 +1864,7 @@ class UnrealMoviePublishPlugin(HookBaseClass):
         settings = {
             "Movie Render Queue Presets Path": render_presets_path,
             "Publish Folder": publish_folder,
+            "Render Profile": six.ensure_str(widget.unreal_render_profile_widget.currentText()),
         }
         return settings
 
@@ -241,6 +1890,11 @@ class UnrealMoviePublishPlugin(HookBaseClass):
             preset_index = widget.unreal_render_presets_widget.findText(render_presets_path)
             self.logger.info("Index for %s is %s" % (render_presets_path, preset_index))
         widget.unreal_render_presets_widget.setCurrentIndex(preset_index)
+        widget.unreal_render_profile_widget.clear()
+        for profile_name in sorted(cur_settings["Render Profiles"]):
+            widget.unreal_render_profile_widget.addItem(profile_name)
+        profile_index = widget.unreal_render_profile_widget.findText(cur_settings["Render Profile"])
+        widget.unreal_render_profile_widget.setCurrentIndex(max(profile_index, 0))
         # Note: the template is validated in the accept method, no need to check it here.
         publish_template_setting = cur_settings.get("Publish Template")
         publisher = self.parent
@@ -282,6 +1936,11 @@ class UnrealMoviePublishPlugin(HookBaseClass):
             settings["Publish Folder"].value,
             settings_manager.SCOPE_PROJECT
         )
+        settings["Render Profile"].value = settings_manager.retrieve(
+            "publish2.render_profile",
+            settings["Render Profile"].value,
+            settings_manager.SCOPE_PROJECT
+        )
         self.logger.debug("Loaded settings %s" % settings["Publish Folder"])
         self.logger.debug("Loaded settings %s" % settings["Movie Render Queue Presets Path"])
 
@@ -301,6 +1960,8 @@ class UnrealMoviePublishPlugin(HookBaseClass):
         settings_manager.store("publish2.movie_render_queue_presets_path", render_presets_path, settings_manager.SCOPE_PROJECT)
         publish_folder = settings["Publish Folder"].value
         settings_manager.store("publish2.publish_folder", publish_folder, settings_manager.SCOPE_PROJECT)
+        render_profile = settings["Render Profile"].value
+        settings_manager.store("publish2.render_profile", render_profile, settings_manager.SCOPE_PROJECT)
 
     def accept(self, settings, item):
         """
@@ -354,6 +2015,12 @@ class UnrealMoviePublishPlugin(HookBaseClass):
         # for use in subsequent methods
         item.properties["publish_template"] = publish_template
         self.load_saved_ui_settings(settings)
+        if settings["Upload Mode"].value == "deferred":
+            # Resume uploads left over from previous sessions.
+            try:
+                self._get_deferred_upload_queue(settings)
+            except ValueError as e:
+                self.logger.warning(str(e))
         return {
             "accepted": accepted,
             "checked": checked
@@ -395,16 +2062,18 @@ class UnrealMoviePublishPlugin(HookBaseClass):
             return False
         # Retrieve the Level Sequences sections tree for this Level Sequence.
         # This is needed to get frame ranges in the "edit" context.
-        edits_path = item.properties.get("edits_path")
-        if not edits_path:
+        if not item.properties.get("edits_path"):
             self.logger.debug("Edits path not configured.")
             return False
+        edits_path = self._resolve_edits_path(item)
+        if not edits_path:
+            return False
 
-        self.logger.info("Edits path %s" % edits_path)
-        item.properties["unreal_master_sequence"] = edits_path[0]
+        self.logger.info("Edits path %s" % [lseq.get_name() for lseq in edits_path])
+        item.properties["unreal_master_sequence"] = edits_path[0].get_path_name()
         item.properties["unreal_shot"] = ".".join([lseq.get_name() for lseq in edits_path[1:]])
         self.logger.info("Master sequence %s, shot %s" % (
-            item.properties["unreal_master_sequence"].get_name(),
+            edits_path[0].get_name(),
             item.properties["unreal_shot"] or "all shots",
         ))
         # Get the configured publish template
@@ -487,7 +2156,10 @@ class UnrealMoviePublishPlugin(HookBaseClass):
             self.logger.info("Movie Render Queue not available, Level Sequencer will be used for rendering.")
 
         item.properties["use_movie_render_queue"] = use_movie_render_queue
-        item.properties["movie_render_queue_presets"] = render_presets
+        # Only keep the presets path, presets are loaded again when rendering.
+        item.properties["movie_render_queue_presets_path"] = (
+            render_presets.get_path_name() if render_presets else None
+        )
         # Set the UE movie extension based on the current platform and rendering engine
         if use_movie_render_queue:
             fields["ue_mov_ext"] = "mov"  # mov on all platforms
@@ -518,159 +2190,1398 @@ class UnrealMoviePublishPlugin(HookBaseClass):
             )
         item.properties["path"] = publish_path
         item.properties["publish_path"] = publish_path
+        render_path = publish_path
+        if settings["Render Scratch Folder"].value:
+            # Use a folder per publish path, so movie names are kept.
+            render_path = os.path.join(
+                settings["Render Scratch Folder"].value,
+                hashlib.sha1(six.ensure_binary(os.path.normcase(publish_path))).hexdigest()[:16],
+                os.path.basename(publish_path),
+            )
+            self.logger.info("Movie will be rendered to %s before being published." % render_path)
+        item.properties["render_path"] = render_path
         item.properties["publish_type"] = "Unreal Render"
         item.properties["version_number"] = version_number
+        render_profile = settings["Render Profile"].value
+        if render_profile not in settings["Render Profiles"].value:
+            error_msg = "Unknown render profile %s, available profiles are %s." % (
+                render_profile, ", ".join(sorted(settings["Render Profiles"].value))
+            )
+            self.logger.error(error_msg)
+            raise ValueError(error_msg)
+        self.logger.info("Render profile %s will be used." % render_profile)
+        item.properties["render_profile_name"] = render_profile
+        item.properties["render_profile"] = settings["Render Profiles"].value[render_profile]
+        try:
+            _check_resource_limits(_get_resource_limits(item.properties["render_profile"]))
+        except ValueError as e:
+            error_msg = "Invalid render profile %s: %s" % (render_profile, e)
+            self.logger.error(error_msg)
+            raise ValueError(error_msg)
+        item.properties["ffmpeg_path"] = None
+        # Individual shots are not split, their frame range is in the master
+        # sequence time.
+        render_chunks = 1
+        incremental_render = False
+        if use_movie_render_queue and not item.properties["unreal_shot"]:
+            render_chunks = max(settings["Frame Range Chunks"].value, 1)
+            incremental_render = settings["Incremental Master Render"].value
+        item.properties["render_chunks"] = render_chunks
+        item.properties["incremental_render"] = incremental_render
+        # Shots can be cut from a master render if we can retrieve their range
+        # in the master sequence.
+        item.properties["master_frame_range"] = None
+        if use_movie_render_queue and item.properties["unreal_shot"] and settings["Cut Shots From Master"].value:
+            item.properties["master_frame_range"] = self._get_frame_range_in_master(edits_path)
+            if not item.properties["master_frame_range"]:
+                self.logger.warning(
+                    "Unable to retrieve the range of %s in %s, it will be rendered on its own." % (
+                        item.properties["unreal_shot"], edits_path[0].get_name(),
+                    )
+                )
+        cut_from_master = bool(item.properties["master_frame_range"])
+        if settings["Review Proxy"].value or render_chunks > 1 or incremental_render or cut_from_master:
+            ffmpeg_path = shutil.which(settings["FFmpeg Path"].value or "ffmpeg")
+            if not ffmpeg_path:
+                error_msg = "Unable to find FFmpeg executable %s." % (
+                    settings["FFmpeg Path"].value
+                )
+                self.logger.error(error_msg)
+                raise ValueError(error_msg)
+            item.properties["ffmpeg_path"] = ffmpeg_path
+        item.properties["review_proxy"] = settings["Review Proxy"].value
+        # Check upload settings now, publish() uploads after registering the
+        # publish.
+        upload_mode = settings["Upload Mode"].value or "upload"
+        if upload_mode not in _UPLOAD_MODES:
+            error_msg = "Invalid upload mode %s, valid modes are %s." % (
+                upload_mode, ", ".join(_UPLOAD_MODES)
+            )
+            self.logger.error(error_msg)
+            raise ValueError(error_msg)
+        if upload_mode == "deferred":
+            try:
+                self._get_deferred_upload_queue(settings)
+            except ValueError as e:
+                self.logger.error(str(e))
+                raise
+        item.properties["render_cache_key"] = None
+        if use_movie_render_queue and settings["Render Cache"].value:
+            item.properties["render_cache_key"] = self._get_render_cache_key(item)
+        # Register the item so it can be rendered with others, unless a previous
+        # render will be reused.
+        self._render_results.pop(id(item), None)
+        self._render_jobs.pop(id(item), None)
+        self._pending_render_items.pop(id(item), None)
+        cached_path = None
+        if item.properties["render_cache_key"]:
+            cached_path = self._get_render_cache().load().get(item.properties["render_cache_key"])
+        if cached_path:
+            self.logger.info(
+                "Nothing changed since %s was rendered, it will be reused." % cached_path
+            )
+        elif use_movie_render_queue and render_chunks == 1 and not incremental_render and not cut_from_master:
+            self._pending_render_items[id(item)] = item
         self.save_ui_settings(settings)
         return True
 
-    def _check_render_settings(self, render_config):
+    def _resolve_edits_path(self, item):
+        """
+        Return the Level Sequences in the edits path for the given item.
+
+        Items only store the object paths of the Level Sequences in their edit,
+        Level Sequences are loaded, if not already, when this method is called.
+        They are not stored on the item, so they are not kept in memory for the
+        whole publish and the item can be serialized.
+
+        :param item: Item to process.
+        :returns: A list of :class:`unreal.LevelSequence` instances, from the
+                  top master sequence to the shot, or None if some of them
+                  can't be loaded.
+        """
+        object_paths = item.properties.get("edits_path") or ()
+        edits_path = [
+            unreal.load_asset(object_path, unreal.LevelSequence) for object_path in object_paths
+        ]
+        if not edits_path or not all(edits_path):
+            self.logger.warning("Unable to load Level Sequences %s" % list(object_paths))
+            return None
+        return edits_path
+
+    def _get_frame_range_in_master(self, edits_path):
+        """
+        Return the frame range of the last Level Sequence in the given edits path
+        in the master sequence, the first one.
+
+        Sections are assumed to not have start offsets or time scales.
+
+        :param edits_path: A list of :class:`unreal.LevelSequence` instances,
+                           from the master sequence to the shot.
+        :returns: A (start, end, frame rate) tuple, with start and end, excluded,
+                  in frames from the start of the master sequence and the master
+                  sequence display rate as a (numerator, denominator) tuple, or
+                  None.
+        """
+        master = edits_path[0]
+        start = end = None
+        # Offset to convert frames in the current parent sequence to frames in
+        # the master sequence.
+        offset = 0
+        for parent, child in zip(edits_path[:-1], edits_path[1:]):
+            child_path = child.get_path_name()
+            sections = []
+            for track in parent.find_master_tracks_by_type(unreal.MovieSceneCinematicShotTrack):
+                sections.extend([
+                    section for section in track.get_sections()
+                    if section.get_sequence() and section.get_sequence().get_path_name() == child_path
+                ])
+            if len(sections) != 1:
+                # The child is not there, or is there several times and we
+                # don't know which section the item is for.
+                return None
+            section_start = sections[0].get_start_frame() + offset
+            section_end = sections[0].get_end_frame() + offset
+            # Frames in the child sequence start at its playback start.
+            offset = section_start - child.get_playback_start()
+            if start is not None:
+                # Only what is visible in the parent section is rendered.
+                section_start = max(section_start, start)
+                section_end = min(section_end, end)
+            start, end = section_start, section_end
+        if start is None or end <= start:
+            return None
+        display_rate = master.get_display_rate()
+        return (
+            start - master.get_playback_start(),
+            end - master.get_playback_start(),
+            (display_rate.numerator, display_rate.denominator),
+        )
+
+    def _check_render_settings(self, render_config):
+        """
+        Check settings from the given render preset and report which ones are problematic and why.
+
+        :param render_config: An Unreal Movie Pipeline render config.
+        :returns: A potentially empty list of tuples, where each tuple is a setting and a string explaining the problem.
+        """
+        invalid_settings = []
+        # To avoid having multiple outputs, only keep the main render pass and the expected output format.
+        for setting in render_config.get_all_settings():
+            # Check for render passes. Since some classes derive from MoviePipelineDeferredPassBase, which is what we want to only keep
+            # we can't use isinstance and use type instead.
+            if isinstance(setting, unreal.MoviePipelineImagePassBase) and type(setting) != unreal.MoviePipelineDeferredPassBase:
+                invalid_settings.append((setting, "Render pass %s would cause multiple outputs" % setting.get_name()))
+            # Check rendering outputs
+            elif isinstance(setting, unreal.MoviePipelineOutputBase) and not isinstance(setting, unreal.MoviePipelineAppleProResOutput):
+                invalid_settings.append((setting, "Render output %s would cause multiple outputs" % setting.get_name()))
+        return invalid_settings
+
+    def publish(self, settings, item):
+        """
+        Executes the publish logic for the given item and settings.
+
+        :param settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        """
+
+        # This is where you insert custom information into `item`, like the
+        # path of the file being published or any dependency this publish
+        # has on other publishes.
+
+        # get the path in a normalized state. no trailing separator, separators
+        # are appropriate for current os, no double separators, etc.
+
+        # let the base class register the publish
+
+        publish_path = os.path.normpath(item.properties["publish_path"])
+
+        # Split the destination path into folder and filename
+        destination_folder, movie_name = os.path.split(publish_path)
+        movie_name = os.path.splitext(movie_name)[0]
+
+        # Ensure that the destination path exists before rendering the sequence
+        self.parent.ensure_folder_exists(destination_folder)
+        render_path = os.path.normpath(item.properties.get("render_path") or publish_path)
+        self.parent.ensure_folder_exists(os.path.dirname(render_path))
+
+        # Get the level sequence and map paths again
+        unreal_asset_path = item.properties["unreal_asset_path"]
+        unreal_map_path = item.properties["unreal_map_path"]
+        unreal.log("movie name: {}".format(movie_name))
+        self._setup_render_caches(settings)
+        self._render_scratch_dir = settings["Render Scratch Folder"].value or None
+        # Render the movie
+        render_cache_key = item.properties.get("render_cache_key")
+        cached_path = None
+        if render_cache_key:
+            cached_path = self._get_render_cache().load().fetch(render_cache_key, publish_path)
+        try:
+            if cached_path:
+                self.logger.info(
+                    "Skipping render: the Level Sequence, its sub-sequences, the map, "
+                    "the presets and render settings did not change since %s was "
+                    "rendered, reusing it." % cached_path
+                )
+                res = True
+            elif item.properties.get("use_movie_render_queue") and settings["Use Render Worker"].value:
+                render_request = self._get_movie_render_request(item)
+                self.logger.info("Rendering %s with the render worker." % publish_path)
+                res, _ = self._render_with_render_worker(
+                    [render_request],
+                    settings["Render Worker Idle Timeout"].value,
+                    timeout=settings["Render Timeout"].value,
+                )[0]
+            elif item.properties.get("use_movie_render_queue") and item.properties.get("master_frame_range"):
+                res, _ = self._render_item_from_master(
+                    item,
+                    item.properties["ffmpeg_path"],
+                    timeout=settings["Render Timeout"].value,
+                )
+            elif item.properties.get("use_movie_render_queue") and item.properties.get("incremental_render"):
+                shot_cache_dir = settings["Shot Render Cache Folder"].value or os.path.join(
+                    self._get_unreal_saved_dir(), "ShotGrid", "ShotRenders"
+                )
+                res, _ = self._render_item_incrementally(
+                    item,
+                    shot_cache_dir,
+                    item.properties["ffmpeg_path"],
+                    timeout=settings["Render Timeout"].value,
+                )
+            elif item.properties.get("use_movie_render_queue") and item.properties.get("render_chunks", 1) > 1:
+                res, _ = self._render_item_in_chunks(
+                    item,
+                    item.properties["render_chunks"],
+                    item.properties["ffmpeg_path"],
+                    max_workers=settings["Max Concurrent Renders"].value,
+                    timeout=settings["Render Timeout"].value,
+                )
+            elif item.properties.get("use_movie_render_queue") and settings["Batch Render"].value:
+                res, _ = self._render_pending_items_with_movie_queue(
+                    item, timeout=settings["Render Timeout"].value
+                )
+            elif item.properties.get("use_movie_render_queue") and settings["Max Concurrent Renders"].value > 1:
+                res, _ = self._render_item_with_worker_pool(
+                    item,
+                    settings["Max Concurrent Renders"].value,
+                    timeout=settings["Render Timeout"].value,
+                )
+            elif item.properties.get("use_movie_render_queue"):
+                render_request = self._get_movie_render_request(item)
+                if render_request.presets:
+                    self.logger.info("Rendering %s with the Movie Render Queue with %s presets." % (publish_path, render_request.presets.get_name()))
+                else:
+                    self.logger.info("Rendering %s with the Movie Render Queue." % publish_path)
+                res, _ = self._unreal_render_sequence_with_movie_queue(
+                    *render_request, timeout=settings["Render Timeout"].value
+                )
+            else:
+                self.logger.info("Rendering %s with the Level Sequencer." % publish_path)
+                res, _ = self._unreal_render_sequence_with_sequencer(
+                    render_path,
+                    unreal_map_path,
+                    unreal_asset_path,
+                    profile=item.properties.get("render_profile"),
+                    timeout=settings["Render Timeout"].value,
+                )
+            if not res:
+                raise RuntimeError(
+                    "Unable to render %s" % publish_path
+                )
+            if not cached_path and render_path != publish_path:
+                self.logger.info("Moving %s to %s" % (render_path, publish_path))
+                checksum = _move_file(render_path, publish_path)
+                if checksum:
+                    self.logger.info("Copied %s with SHA-256 checksum %s." % (publish_path, checksum))
+        finally:
+            if render_path != publish_path:
+                # Don't leave partial or failed renders behind in the scratch
+                # folder, nor the folder used for this publish.
+                if os.path.isfile(render_path):
+                    os.remove(render_path)
+                try:
+                    os.rmdir(os.path.dirname(render_path))
+                except OSError:
+                    pass
+        if render_cache_key and not cached_path:
+            self._get_render_cache().set(render_cache_key, publish_path)
+        # Increment the version number
+        self._unreal_asset_set_version(unreal_asset_path, item.properties["version_number"])
+
+        # Publish the movie file to Shotgun
+        super(UnrealMoviePublishPlugin, self).publish(settings, item)
+
+        # Create a Version entry linked with the new publish
+        # Populate the version data to send to SG
+        self.logger.info("Creating Version...")
+        version_data = {
+            "project": item.context.project,
+            "code": movie_name,
+            "description": item.description,
+            "entity": self._get_version_entity(item),
+            "sg_path_to_movie": publish_path,
+            "sg_task": item.context.task
+        }
+
+        publish_data = item.properties.get("sg_publish_data")
+
+        # If the file was published, add the publish data to the version
+        if publish_data:
+            version_data["published_files"] = [publish_data]
+
+        # Log the version data for debugging
+        self.logger.debug(
+            "Populated Version data...",
+            extra={
+                "action_show_more_info": {
+                    "label": "Version Data",
+                    "tooltip": "Show the complete Version data dictionary",
+                    "text": "<pre>%s</pre>" % (
+                        pprint.pformat(version_data),
+                    )
+                }
+            }
+        )
+
+        # On windows, ensure the path is utf-8 encoded to avoid issues with
+        # the shotgun api
+        upload_path = str(item.properties.get("publish_path"))
+        unreal.log("upload_path: {}".format(upload_path))
+
+        upload_mode = self._get_upload_mode(settings, upload_path)
+        if upload_mode == "deferred":
+            self._get_deferred_upload_queue(settings)
+
+        if settings["Background Upload"].value:
+            # Let the next items render while this one is uploaded.
+            if self._upload_pool is None:
+                self._upload_pool = ThreadPoolExecutor(max_workers=1)
+            self.logger.info("Queuing Version creation and upload for %s..." % movie_name)
+            self._uploads[id(item)] = self._upload_pool.submit(
+                self._create_version_and_upload,
+                item,
+                version_data,
+                upload_path,
+                item.properties["ffmpeg_path"] if item.properties.get("review_proxy") else None,
+                upload_mode,
+            )
+        else:
+            if item.properties.get("review_proxy") and upload_mode == "upload":
+                self.logger.info("Transcoding review proxy...")
+            self.logger.info("Creating version for review...")
+            self._create_version_and_upload(
+                item,
+                version_data,
+                upload_path,
+                item.properties["ffmpeg_path"] if item.properties.get("review_proxy") else None,
+                upload_mode,
+            )
+            if upload_mode == "upload":
+                self.logger.info("Upload complete!")
+            elif upload_mode == "deferred":
+                self.logger.info("Upload queued for off-peak hours.")
+            else:
+                self.logger.info("Version linked to %s, nothing uploaded." % upload_path)
+
+    def _get_upload_mode(self, settings, movie_path):
+        """
+        Return how the given movie should be sent to its Version.
+
+        :param settings: Dictionary of Settings.
+        :param str movie_path: Full path to the rendered movie.
+        :returns: "upload", "link" or "deferred".
+        :raises ValueError: If the "Upload Mode" setting is invalid.
+        """
+        upload_mode = settings["Upload Mode"].value or "upload"
+        if upload_mode not in _UPLOAD_MODES:
+            raise ValueError("Invalid upload mode %s" % upload_mode)
+        if upload_mode == "upload":
+            return upload_mode
+        storage_root = self._get_local_storage_root(movie_path)
+        if not storage_root:
+            self.logger.info(
+                "%s is not in a Local Storage root, it will be uploaded." % movie_path
+            )
+            return "upload"
+        self.logger.info(
+            "%s is in Local Storage %s, using %s mode." % (movie_path, storage_root["code"], upload_mode)
+        )
+        return upload_mode
+
+    def _get_local_storage_root(self, path):
+        """
+        Return the ShotGrid Local Storage the given path is in, if any.
+
+        :param str path: A full path.
+        :returns: A Local Storage dictionary or None.
+        """
+        path = os.path.normcase(os.path.abspath(path))
+        storage_roots = self.parent.shotgun.find(
+            "LocalStorage",
+            [],
+            ["code", _OS_LOCAL_STORAGE_PATH_FIELD]
+        )
+        for storage_root in storage_roots:
+            root_path = storage_root[_OS_LOCAL_STORAGE_PATH_FIELD]
+            if not root_path:
+                continue
+            root_path = os.path.normcase(os.path.abspath(root_path))
+            if path.startswith(root_path.rstrip(os.path.sep) + os.path.sep):
+                return storage_root
+        return None
+
+    def _get_deferred_upload_queue(self, settings):
+        """
+        Return the deferred upload queue, configured with the given settings.
+
+        The queue is stored on the current engine, so it is retrieved after
+        hooks are reloaded. When it is created, uploads left over from previous
+        sessions are resumed. Errors from previous deferred uploads are reported
+        as warnings.
+
+        :param settings: Dictionary of Settings.
+        :returns: A :class:`DeferredUploadQueue` instance.
+        :raises ValueError: If the "Off-Peak Upload Hours" setting is invalid.
+        """
+        off_peak_hours = settings["Off-Peak Upload Hours"].value
+        if off_peak_hours:
+            try:
+                start_hour, end_hour = [int(hour) for hour in off_peak_hours.split("-")]
+            except ValueError:
+                raise ValueError("Invalid off-peak upload hours %s" % off_peak_hours)
+            off_peak_hours = (start_hour, end_hour)
+        else:
+            off_peak_hours = None
+        engine = sgtk.platform.current_engine()
+        deferred_upload_queue = getattr(engine, _DEFERRED_UPLOAD_QUEUE_ENGINE_ATTRIBUTE, None)
+        created = deferred_upload_queue is None
+        if created:
+            deferred_upload_queue = DeferredUploadQueue(
+                os.path.join(self._get_unreal_saved_dir(), "ShotGrid", "deferred_uploads.json"),
+                self._upload_movie,
+            )
+            setattr(engine, _DEFERRED_UPLOAD_QUEUE_ENGINE_ATTRIBUTE, deferred_upload_queue)
+        else:
+            # Use this instance of the hook if it was reloaded.
+            deferred_upload_queue.upload_callback = self._upload_movie
+        deferred_upload_queue.off_peak_hours = off_peak_hours
+        if created and deferred_upload_queue.pending:
+            self.logger.info("Resuming deferred uploads from %s" % deferred_upload_queue.path)
+            deferred_upload_queue.start()
+        while deferred_upload_queue.errors:
+            self.logger.warning(deferred_upload_queue.errors.pop(0))
+        self._deferred_upload_queue = deferred_upload_queue
+        return deferred_upload_queue
+
+    def _create_version_and_upload(self, item, version_data, upload_path, ffmpeg_path=None, upload_mode="upload"):
+        """
+        Create a Version for the given item and upload the given movie to it.
+
+        If a FFmpeg path is given, a H.264 review proxy is transcoded from the
+        movie and uploaded instead. With the "link" upload mode nothing is
+        uploaded, with the "deferred" mode the upload is queued for off-peak
+        hours.
+
+        This can be called from a background thread: SG connections are per
+        thread. Nothing is logged since the publisher logger must be used from
+        the main thread.
+
+        :param item: Item to process.
+        :param version_data: A dictionary with the Version fields.
+        :param str upload_path: Full path to the movie to upload.
+        :param str ffmpeg_path: Optional full path to the FFmpeg executable.
+        :param str upload_mode: "upload", "link" or "deferred".
+        :returns: The created Version, as a dictionary.
+        :raises RuntimeError: If the review proxy can't be transcoded.
+        """
+        # Create the version
+        version = self.parent.shotgun.create("Version", version_data)
+
+        # Stash the version info in the item just in case
+        item.properties["sg_version_data"] = version
+
+        if upload_mode == "upload":
+            self._upload_movie(version["id"], upload_path, ffmpeg_path)
+        elif upload_mode == "deferred":
+            # The queue was retrieved from the main thread, before the upload.
+            self._deferred_upload_queue.add(version["id"], upload_path, ffmpeg_path)
+        return version
+
+    def _upload_movie(self, version_id, movie_path, ffmpeg_path=None):
+        """
+        Upload the given movie to the given Version.
+
+        This can be called from a background thread.
+
+        :param int version_id: The id of the Version to upload the movie to.
+        :param str movie_path: Full path to the movie to upload.
+        :param str ffmpeg_path: Optional full path to the FFmpeg executable, to
+                                upload a H.264 review proxy instead of the movie.
+        :raises RuntimeError: If the review proxy can't be transcoded.
+        """
+        proxy_path = None
+        if ffmpeg_path:
+            proxy_path = self._transcode_review_proxy(ffmpeg_path, movie_path)
+        try:
+            # Upload the file to SG
+            self.parent.shotgun.upload(
+                "Version",
+                version_id,
+                proxy_path or movie_path,
+                "sg_uploaded_movie"
+            )
+        finally:
+            if proxy_path:
+                os.remove(proxy_path)
+
+    def _transcode_review_proxy(self, ffmpeg_path, movie_path):
+        """
+        Transcode a compact H.264 review proxy from the given movie.
+
+        The proxy is written to a temporary file, which should be deleted once
+        uploaded. The Unreal API is not used, so this can be called from a
+        background thread.
+
+        :param str ffmpeg_path: Full path to the FFmpeg executable.
+        :param str movie_path: Full path to the movie to transcode.
+        :returns: Full path to the review proxy.
+        :raises RuntimeError: If the review proxy can't be transcoded.
+        """
+        f, proxy_path = tempfile.mkstemp(
+            prefix="%s_" % os.path.splitext(os.path.basename(movie_path))[0],
+            suffix=".mp4",
+        )
+        os.close(f)
+        cmd_args = [
+            ffmpeg_path,
+            "-y",
+            "-loglevel", "error",
+            "-i", movie_path,
+            "-c:v", "libx264",
+            "-preset", "medium",
+            "-crf", "23",
+            "-pix_fmt", "yuv420p",
+            # H.264 with yuv420p needs even dimensions.
+            "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2",
+            "-c:a", "aac",
+            "-b:a", "128k",
+            # Allow playback to start before the whole file is downloaded.
+            "-movflags", "+faststart",
+            proxy_path,
+        ]
+        process = subprocess.Popen(cmd_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output, _ = process.communicate()
+        if process.returncode:
+            os.remove(proxy_path)
+            raise RuntimeError(
+                "Unable to transcode review proxy for %s: %s" % (
+                    movie_path, six.ensure_str(output, errors="replace").strip()
+                )
+            )
+        return proxy_path
+
+    def finalize(self, settings, item):
+        """
+        Execute the finalization pass. This pass executes once all the publish
+        tasks have completed, and can for example be used to version up files.
+
+        :param settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        """
+        # Wait for the background upload, if any, errors are raised for the item.
+        upload = self._uploads.pop(id(item), None)
+        if upload:
+            if not upload.done():
+                self.logger.info("Waiting for upload to complete...")
+            version = upload.result()
+            self.logger.info("Upload complete for Version %s!" % version["code"])
+        # Delete master renders which are not needed anymore.
+        for master_key, master_render in list(self._master_renders.items()):
+            master_render["items"].discard(id(item))
+            if not master_render["items"]:
+                if os.path.isfile(master_render["path"]):
+                    os.remove(master_render["path"])
+                del self._master_renders[master_key]
+        # Forget about the item, it won't be rendered again.
+        self._pending_render_items.pop(id(item), None)
+        self._render_results.pop(id(item), None)
+        self._render_jobs.pop(id(item), None)
+        if not self._render_jobs:
+            # Don't keep idle render threads for the whole session.
+            self._shutdown_render_pool()
+        # do the base class finalization
+        super(UnrealMoviePublishPlugin, self).finalize(settings, item)
+
+    def _get_render_cache(self):
+        """
+        Return the render cache for the current project.
+
+        :returns: A :class:`RenderCache` instance, call :meth:`RenderCache.load`
+                  to read it.
+        """
+        return RenderCache(
+            os.path.join(self._get_unreal_saved_dir(), "ShotGrid", "render_cache.json")
+        )
+
+    def _get_render_cache_key(self, item):
+        """
+        Return a key for the render of the given item, computed from the content
+        of all packages and settings the render depends on.
+
+        :param item: A validated item.
+        :returns: A key as a string, or None if some packages can't be hashed.
+        """
+        asset_path = item.properties["unreal_asset_path"]
+        map_path = item.properties["unreal_map_path"]
+        presets_path = item.properties.get("movie_render_queue_presets_path")
+
+        package_names = self._get_sequence_packages(asset_path.split(".")[0])
+        package_names.add(map_path.split(".")[0])
+        if presets_path:
+            package_names.add(presets_path.split(".")[0])
+
+        return self._hash_render_inputs(
+            package_names,
+            {
+                "sequence": asset_path,
+                "map": map_path,
+                "presets": presets_path,
+                # Actors of One File Per Actor levels are stored in their own
+                # packages.
+                "external_packages": _get_external_packages_stamp(map_path.split(".")[0]),
+                "shot": item.properties.get("unreal_shot") or None,
+                "extension": os.path.splitext(item.properties["publish_path"])[1],
+                # Render settings we set on the command line.
+                "profile": item.properties.get("render_profile"),
+                "cmd_args": self._get_movie_queue_cmd_args(
+                    profile=item.properties.get("render_profile")
+                )[2:],
+            },
+        )
+
+    def _get_sequence_packages(self, package_name):
+        """
+        Return the given Level Sequence package with all its sub-sequence packages,
+        recursively.
+
+        :param str package_name: A Level Sequence long package name.
+        :returns: A set of long package names.
+        """
+        asset_registry = unreal.AssetRegistryHelpers.get_asset_registry()
+        options = unreal.AssetRegistryDependencyOptions()
+        package_names = set([package_name])
+        to_visit = [package_name]
+        visited = set(to_visit)
+        while to_visit:
+            package_name = to_visit.pop()
+            for dependency in asset_registry.get_dependencies(package_name, options) or []:
+                dependency = str(dependency)
+                if dependency in visited or not dependency.startswith("/Game/"):
+                    continue
+                visited.add(dependency)
+                for asset_data in asset_registry.get_assets_by_package_name(dependency):
+                    if str(asset_data.asset_class_path.asset_name) == "LevelSequence":
+                        package_names.add(dependency)
+                        to_visit.append(dependency)
+                        break
+        return package_names
+
+    def _hash_render_inputs(self, package_names, data):
+        """
+        Return a hash of the content of the given packages and of the given data.
+
+        :param package_names: A list of long package names.
+        :param data: JSON serializable data, e.g. render settings.
+        :returns: A hash as a string, or None if some packages can't be hashed.
         """
-        Check settings from the given render preset and report which ones are problematic and why.
+        hasher = hashlib.sha1()
+        hasher.update(
+            json.dumps(
+                {"version": RenderCache.VERSION, "data": data}, sort_keys=True
+            ).encode("utf-8")
+        )
+        for package_name in sorted(package_names):
+            package_file = _get_package_file(package_name)
+            if not package_file:
+                self.logger.debug(
+                    "Can't find a file for %s, render can't be cached." % package_name
+                )
+                return None
+            hasher.update(package_name.encode("utf-8"))
+            _hash_file(package_file, hasher)
+        return hasher.hexdigest()
 
-        :param render_config: An Unreal Movie Pipeline render config.
-        :returns: A potentially empty list of tuples, where each tuple is a setting and a string explaining the problem.
+    def _get_movie_render_request(self, item):
         """
-        invalid_settings = []
-        # To avoid having multiple outputs, only keep the main render pass and the expected output format.
-        for setting in render_config.get_all_settings():
-            # Check for render passes. Since some classes derive from MoviePipelineDeferredPassBase, which is what we want to only keep
-            # we can't use isinstance and use type instead.
-            if isinstance(setting, unreal.MoviePipelineImagePassBase) and type(setting) != unreal.MoviePipelineDeferredPassBase:
-                invalid_settings.append((setting, "Render pass %s would cause multiple outputs" % setting.get_name()))
-            # Check rendering outputs
-            elif isinstance(setting, unreal.MoviePipelineOutputBase) and not isinstance(setting, unreal.MoviePipelineAppleProResOutput):
-                invalid_settings.append((setting, "Render output %s would cause multiple outputs" % setting.get_name()))
-        return invalid_settings
+        Return what is needed to render the given item with the Movie Render Queue.
 
-    def publish(self, settings, item):
+        :param item: A validated item.
+        :returns: A :class:`MovieRenderRequest` instance.
         """
-        Executes the publish logic for the given item and settings.
+        presets = None
+        presets_path = item.properties.get("movie_render_queue_presets_path")
+        if presets_path:
+            presets = unreal.EditorAssetLibrary.load_asset(presets_path)
+        return MovieRenderRequest(
+            os.path.normpath(item.properties.get("render_path") or item.properties["publish_path"]),
+            item.properties["unreal_map_path"],
+            item.properties["unreal_asset_path"],
+            presets,
+            item.properties.get("unreal_shot") or None,
+            item.properties.get("render_profile"),
+            None,
+        )
 
-        :param settings: Dictionary of Settings. The keys are strings, matching
-            the keys returned in the settings property. The values are `Setting`
-            instances.
-        :param item: Item to process
+    def _render_pending_items_with_movie_queue(self, item, timeout=None):
         """
+        Render the given item, and all other validated items waiting to be rendered,
+        with the Movie Render Queue in a single Unreal process.
 
-        # This is where you insert custom information into `item`, like the
-        # path of the file being published or any dependency this publish
-        # has on other publishes.
+        Nothing is rendered if the item was already rendered in a previous batch.
+        Only items using the same render profile are rendered together.
 
-        # get the path in a normalized state. no trailing separator, separators
-        # are appropriate for current os, no double separators, etc.
+        :param item: The item being published.
+        :param timeout: Optional maximum duration for the render, in seconds.
+        :returns: True if a movie file was generated for the item, False otherwise
+                  string representing the path of the generated movie file
+        """
+        result = self._render_results.get(id(item))
+        if result:
+            return result
+        batch_items = [item]
+        for other_item in self._pending_render_items.values():
+            if other_item is item or id(other_item) in self._render_results:
+                continue
+            # Skip items which were unchecked after being validated.
+            if not getattr(other_item, "checked", True):
+                continue
+            # The render profile is set for the whole render process.
+            if other_item.properties.get("render_profile_name") != item.properties.get("render_profile_name"):
+                continue
+            batch_items.append(other_item)
+        render_requests = []
+        for batch_item in batch_items:
+            render_request = self._get_movie_render_request(batch_item)
+            self.parent.ensure_folder_exists(os.path.dirname(render_request.output_path))
+            render_requests.append(render_request)
+        self.logger.info(
+            "Rendering %d Level Sequences with the Movie Render Queue in a single process." % len(render_requests)
+        )
+        results = self._unreal_render_sequences_with_movie_queue(render_requests, timeout=timeout)
+        for batch_item, batch_result in zip(batch_items, results):
+            self._render_results[id(batch_item)] = batch_result
+        return self._render_results[id(item)]
 
-        # let the base class register the publish
+    def _get_render_work_dir(self, name=None):
+        """
+        Return the folder where intermediate renders are written, creating it
+        if needed.
 
-        publish_path = os.path.normpath(item.properties["publish_path"])
+        The "Render Scratch Folder" is used if set, the Unreal project Saved
+        folder otherwise.
 
-        # Split the destination path into folder and filename
-        destination_folder, movie_name = os.path.split(publish_path)
-        movie_name = os.path.splitext(movie_name)[0]
+        :param str name: Optional sub-folder name.
+        :returns: A full path.
+        """
+        work_dir = self._render_scratch_dir or os.path.join(self._get_unreal_saved_dir(), "ShotGrid")
+        if name:
+            work_dir = os.path.join(work_dir, name)
+        if not os.path.isdir(work_dir):
+            os.makedirs(work_dir)
+        return work_dir
+
+    def _render_item_in_chunks(self, item, chunks, ffmpeg_path, max_workers=1, timeout=None):
+        """
+        Render the given item with the Movie Render Queue by splitting its frame
+        range into chunks rendered concurrently, each of them in its own Unreal
+        process, and concatenate them.
+
+        Chunks are rendered as Apple ProRes movies, which only have intra frames,
+        so they can be concatenated without re-encoding.
+
+        :param item: The item being published.
+        :param int chunks: Number of chunks to split the frame range into.
+        :param str ffmpeg_path: Full path to the FFmpeg executable.
+        :param int max_workers: Maximum number of chunks rendered at the same time.
+        :param timeout: Optional maximum duration for each chunk render, in seconds.
+        :returns: True if a movie file was generated for the item, False otherwise
+                  string representing the path of the generated movie file
+        """
+        render_request = self._get_movie_render_request(item)
+        lvseq = unreal.EditorAssetLibrary.load_asset(render_request.sequence_path)
+        start_frame = lvseq.get_playback_start()
+        end_frame = lvseq.get_playback_end()
+        frame_count = end_frame - start_frame
+        chunks = min(chunks, frame_count)
+        if chunks < 2:
+            return self._unreal_render_sequence_with_movie_queue(*render_request, timeout=timeout)
+
+        chunk_dir = tempfile.mkdtemp(
+            prefix="%s_" % os.path.splitext(os.path.basename(render_request.output_path))[0],
+            dir=self._get_render_work_dir(),
+        )
+        try:
+            jobs = []
+            for i in range(chunks):
+                chunk_range = (
+                    start_frame + i * frame_count // chunks,
+                    start_frame + (i + 1) * frame_count // chunks,
+                )
+                chunk_request = render_request._replace(
+                    output_path=os.path.join(chunk_dir, "chunk_%03d.mov" % i),
+                    frame_range=chunk_range,
+                )
+                jobs.append(self._create_movie_queue_render_job([chunk_request], timeout=timeout))
+            max_workers = max(1, min(chunks, max_workers))
+            self.logger.info(
+                "Rendering frames %d to %d in %d chunks, %d of them at a time." % (
+                    start_frame, end_frame - 1, chunks, max_workers,
+                )
+            )
+            pool = ThreadPoolExecutor(max_workers=max_workers)
+            try:
+                for job in jobs:
+                    pool.submit(job.run)
+                for job in jobs:
+                    result = self._wait_for_render_job(job)
+                    # Don't wait for other chunks if one of them was interrupted.
+                    if result.status in [RenderJob.CANCELLED, RenderJob.TIMED_OUT]:
+                        break
+            finally:
+                for job in jobs:
+                    job.cancel()
+                pool.shutdown(wait=True)
+            chunk_paths = []
+            for job in jobs:
+                rendered, chunk_path = job.get_results()[0]
+                if not rendered:
+                    self.logger.error("Chunk %s was not rendered." % chunk_path)
+                    return False, render_request.output_path
+                chunk_paths.append(chunk_path)
+            self._concatenate_movies(ffmpeg_path, chunk_paths, render_request.output_path)
+        finally:
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+        return os.path.isfile(render_request.output_path), render_request.output_path
+
+    def _render_item_from_master(self, item, ffmpeg_path, timeout=None):
+        """
+        Render the given shot item by cutting it from a render of its master
+        sequence.
 
-        # Ensure that the destination path exists before rendering the sequence
-        self.parent.ensure_folder_exists(destination_folder)
+        The master sequence is rendered once for all shot items using it with
+        the same map, presets and render profile.
 
-        # Get the level sequence and map paths again
-        unreal_asset_path = item.properties["unreal_asset_path"]
-        unreal_map_path = item.properties["unreal_map_path"]
-        unreal.log("movie name: {}".format(movie_name))
-        # Render the movie
-        if item.properties.get("use_movie_render_queue"):
-            presets = item.properties["movie_render_queue_presets"]
-            if presets:
-                self.logger.info("Rendering %s with the Movie Render Queue with %s presets." % (publish_path, presets.get_name()))
-            else:
-                self.logger.info("Rendering %s with the Movie Render Queue." % publish_path)
-            res, _ = self._unreal_render_sequence_with_movie_queue(
-                publish_path,
-                unreal_map_path,
-                unreal_asset_path,
-                presets,
-                item.properties.get("unreal_shot") or None,
+        :param item: The item being published.
+        :param str ffmpeg_path: Full path to the FFmpeg executable.
+        :param timeout: Optional maximum duration for the master render, in seconds.
+        :returns: True if a movie file was generated for the item, False otherwise
+                  string representing the path of the generated movie file
+        """
+        render_request = self._get_movie_render_request(item)
+        master_request = render_request._replace(
+            sequence_path=item.properties["unreal_master_sequence"],
+            shot_name=None,
+        )
+        master_key = (
+            master_request.sequence_path,
+            master_request.unreal_map_path,
+            item.properties.get("movie_render_queue_presets_path"),
+            item.properties.get("render_profile_name"),
+        )
+        master_render = self._master_renders.get(master_key)
+        if not master_render:
+            master_dir = self._get_render_work_dir("MasterRenders")
+            f, master_path = tempfile.mkstemp(
+                prefix="%s_" % master_request.sequence_path.split(".")[-1],
+                suffix=".mov",
+                dir=master_dir,
             )
-        else:
-            self.logger.info("Rendering %s with the Level Sequencer." % publish_path)
-            res, _ = self._unreal_render_sequence_with_sequencer(
-                publish_path,
-                unreal_map_path,
-                unreal_asset_path
+            os.close(f)
+            os.remove(master_path)
+            self.logger.info(
+                "Rendering master sequence %s to cut shots from it." % master_request.sequence_path
             )
-        if not res:
+            rendered, _ = self._unreal_render_sequence_with_movie_queue(
+                *master_request._replace(output_path=master_path), timeout=timeout
+            )
+            master_render = {"path": master_path, "rendered": rendered, "items": set()}
+            self._master_renders[master_key] = master_render
+        master_render["items"].add(id(item))
+        if not master_render["rendered"]:
+            self.logger.error("Master sequence %s was not rendered." % master_request.sequence_path)
+            return False, render_request.output_path
+
+        start_frame, end_frame, frame_rate = item.properties["master_frame_range"]
+        self.logger.info(
+            "Cutting %s from frame %d to %d in the master render." % (
+                item.properties["unreal_shot"], start_frame, end_frame - 1,
+            )
+        )
+        movie_frame_rate = None
+        if (render_request.profile or {}).get("frame_rate"):
+            movie_frame_rate = (render_request.profile["frame_rate"], 1)
+        seek_time, frame_count = _get_frame_cut(start_frame, end_frame, frame_rate, movie_frame_rate)
+        # Apple ProRes only has intra frames, so stream copy can start on
+        # any frame.
+        cmd_args = [
+            ffmpeg_path,
+            "-y",
+            "-loglevel", "error",
+            "-ss", "%.6f" % seek_time,
+            "-i", master_render["path"],
+            "-frames:v", "%d" % frame_count,
+            "-c", "copy",
+            render_request.output_path,
+        ]
+        process = subprocess.Popen(cmd_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output, _ = process.communicate()
+        if process.returncode:
             raise RuntimeError(
-                "Unable to render %s" % publish_path
+                "Unable to cut %s from the master render: %s" % (
+                    render_request.output_path, six.ensure_str(output, errors="replace").strip()
+                )
             )
-        # Increment the version number
-        self._unreal_asset_set_version(unreal_asset_path, item.properties["version_number"])
+        return os.path.isfile(render_request.output_path), render_request.output_path
 
-        # Publish the movie file to Shotgun
-        super(UnrealMoviePublishPlugin, self).publish(settings, item)
+    def _render_item_incrementally(self, item, shot_cache_dir, ffmpeg_path, timeout=None):
+        """
+        Render the given item with the Movie Render Queue shot by shot, only
+        rendering shots which changed since they were last rendered, and splice
+        all shots together.
+
+        Shot renders are cached in the given folder, keyed by a hash of the shot
+        section, the shot sequence packages, the Level Sequence tracks
+        overlapping the shot, the map, the presets and the render settings. Each shot section is rendered from the
+        Level Sequence with its range, so shots used more than once are
+        rendered for each of their sections. Renders replaced by a newer render
+        of the same section are deleted. Level Sequences without shots, or with
+        nested shots, are rendered as a whole.
+
+        :param item: The item being published.
+        :param str shot_cache_dir: Full path to the folder where shot renders
+                                   are cached.
+        :param str ffmpeg_path: Full path to the FFmpeg executable.
+        :param timeout: Optional maximum duration for the render, in seconds.
+        :returns: True if a movie file was generated for the item, False otherwise
+                  string representing the path of the generated movie file
+        """
+        render_request = self._get_movie_render_request(item)
+        lvseq = unreal.EditorAssetLibrary.load_asset(render_request.sequence_path)
+        sections = []
+        for track in lvseq.find_master_tracks_by_type(unreal.MovieSceneCinematicShotTrack):
+            sections.extend(track.get_sections())
+        sections = sorted(
+            [section for section in sections if section.is_active() and section.get_sequence()],
+            key=lambda section: section.get_start_frame(),
+        )
+        nested = any(
+            section.get_sequence().find_master_tracks_by_type(unreal.MovieSceneCinematicShotTrack)
+            for section in sections
+        )
+        if not sections or nested:
+            self.logger.info(
+                "Shot by shot rendering is only available for Level Sequences with shots "
+                "which don't have shots of their own, rendering %s as a whole." % lvseq.get_name()
+            )
+            return self._unreal_render_sequence_with_movie_queue(*render_request, timeout=timeout)
+
+        if not os.path.isdir(shot_cache_dir):
+            os.makedirs(shot_cache_dir)
+        # Track the current render of each section, to delete renders which
+        # were replaced.
+        shot_index = RenderCache(os.path.join(shot_cache_dir, "shots.json"))
+        shot_paths = []
+        shot_requests = []
+        shot_sections = []
+        for section in sections:
+            shot_sequence = section.get_sequence()
+            shot_range = (section.get_start_frame(), section.get_end_frame())
+            # The Level Sequence package is not hashed, so editing a shot
+            # section, or tracks outside the shot range, does not change
+            # other shots keys.
+            master_tracks, master_packages = self._get_master_tracks_stamp(lvseq, shot_range)
+            shot_key = self._hash_render_inputs(
+                self._get_sequence_packages(shot_sequence.get_outermost().get_name()) | master_packages | set(
+                    path.split(".")[0] for path in [
+                        render_request.unreal_map_path,
+                        item.properties.get("movie_render_queue_presets_path"),
+                    ] if path
+                ),
+                {
+                    "section": section.get_path_name(),
+                    "section_stamp": _get_section_stamp(section),
+                    "section_parameters": _get_stamp_value(section.get_editor_property("parameters")),
+                    "master_tracks": master_tracks,
+                    "map": render_request.unreal_map_path,
+                    "external_packages": _get_external_packages_stamp(
+                        render_request.unreal_map_path.split(".")[0]
+                    ),
+                    "presets": item.properties.get("movie_render_queue_presets_path"),
+                    "profile": render_request.profile,
+                    "cmd_args": self._get_movie_queue_cmd_args(profile=render_request.profile)[2:],
+                },
+            )
+            if not shot_key:
+                self.logger.info("Unable to cache shot renders, rendering %s as a whole." % lvseq.get_name())
+                return self._unreal_render_sequence_with_movie_queue(*render_request, timeout=timeout)
+            shot_path = os.path.join(shot_cache_dir, "%s.mov" % shot_key)
+            shot_paths.append(shot_path)
+            if not os.path.isfile(shot_path):
+                # Render the section range from the Level Sequence rather than
+                # selecting the shot by name, which is ambiguous for shots used
+                # more than once.
+                shot_requests.append(render_request._replace(
+                    output_path=os.path.join(shot_cache_dir, "%s_rendering.mov" % shot_key),
+                    shot_name=None,
+                    frame_range=shot_range,
+                ))
+                shot_sections.append(section)
+
+        self.logger.info(
+            "Rendering %d changed shots out of %d." % (len(shot_requests), len(sections))
+        )
+        if shot_requests:
+            results = self._unreal_render_sequences_with_movie_queue(shot_requests, timeout=timeout)
+            for (rendered, rendering_path), section in zip(results, shot_sections):
+                if not rendered:
+                    self.logger.error("Shot %s was not rendered." % section.get_shot_display_name())
+                    return False, render_request.output_path
+                # Only keep complete renders in the cache.
+                os.replace(rendering_path, rendering_path.replace("_rendering.mov", ".mov"))
+        for section, shot_path in zip(sections, shot_paths):
+            replaced_path = shot_index.set(section.get_path_name(), shot_path)
+            if replaced_path and os.path.isfile(replaced_path):
+                self.logger.debug("Deleting replaced shot render %s" % replaced_path)
+                os.remove(replaced_path)
+        self._concatenate_movies(ffmpeg_path, shot_paths, render_request.output_path)
+        return os.path.isfile(render_request.output_path), render_request.output_path
+
+    def _get_master_tracks_stamp(self, lvseq, frame_range):
+        """
+        Return data describing the tracks of the given Level Sequence, other
+        than its shot tracks, which can affect the given frame range, e.g.
+        fade, camera cut or object binding tracks.
 
-        # Create a Version entry linked with the new publish
-        # Populate the version data to send to SG
-        self.logger.info("Creating Version...")
-        version_data = {
-            "project": item.context.project,
-            "code": movie_name,
-            "description": item.description,
-            "entity": self._get_version_entity(item),
-            "sg_path_to_movie": publish_path,
-            "sg_task": item.context.task
+        Only sections overlapping the frame range are considered.
+
+        :param lvseq: A :class:`unreal.LevelSequence` instance.
+        :param frame_range: A (start, end) tuple, with end excluded, in display
+                            rate frames.
+        :returns: A (JSON serializable data, set of long package names) tuple,
+                  packages being sub-sequences used by the tracks.
+        """
+        start, end = frame_range
+
+        def get_tracks_stamp(tracks):
+            tracks_stamp = []
+            for track in tracks:
+                if isinstance(track, unreal.MovieSceneCinematicShotTrack):
+                    continue
+                sections_stamp = []
+                for section in track.get_sections():
+                    if section.has_start_frame() and section.get_start_frame() >= end:
+                        continue
+                    if section.has_end_frame() and section.get_end_frame() <= start:
+                        continue
+                    sections_stamp.append(_get_section_stamp(section))
+                    sub_sequence = getattr(section, "get_sequence", lambda: None)()
+                    if sub_sequence:
+                        package_names.update(
+                            self._get_sequence_packages(sub_sequence.get_outermost().get_name())
+                        )
+                if sections_stamp:
+                    tracks_stamp.append({
+                        "class": track.get_class().get_name(),
+                        "name": str(track.get_display_name()),
+                        "sections": sections_stamp,
+                    })
+            return tracks_stamp
+
+        package_names = set()
+        stamp = {
+            "tracks": get_tracks_stamp(lvseq.get_master_tracks()),
+            "bindings": [
+                [str(binding.get_display_name()), get_tracks_stamp(binding.get_tracks())]
+                for binding in lvseq.get_bindings()
+            ],
         }
+        return stamp, package_names
 
-        publish_data = item.properties.get("sg_publish_data")
+    def _concatenate_movies(self, ffmpeg_path, movie_paths, output_path):
+        """
+        Concatenate the given movies into a single movie, without re-encoding them.
 
-        # If the file was published, add the publish data to the version
-        if publish_data:
-            version_data["published_files"] = [publish_data]
+        :param str ffmpeg_path: Full path to the FFmpeg executable.
+        :param movie_paths: A list of full paths to the movies to concatenate.
+        :param str output_path: Full path to the movie to write.
+        :raises RuntimeError: If the movies can't be concatenated.
+        """
+        f, list_path = tempfile.mkstemp(suffix=".txt", dir=os.path.dirname(output_path))
+        with os.fdopen(f, "w") as fh:
+            for movie_path in movie_paths:
+                # Paths are quoted for the FFmpeg concat demuxer.
+                fh.write("file '%s'\n" % movie_path.replace("\\", "/").replace("'", "'\\''"))
+        cmd_args = [
+            ffmpeg_path,
+            "-y",
+            "-loglevel", "error",
+            "-f", "concat",
+            "-safe", "0",
+            "-i", list_path,
+            "-c", "copy",
+            output_path,
+        ]
+        self.logger.info("Concatenating %d movies into %s" % (len(movie_paths), output_path))
+        try:
+            process = subprocess.Popen(cmd_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            output, _ = process.communicate()
+        finally:
+            os.remove(list_path)
+        if process.returncode:
+            raise RuntimeError(
+                "Unable to concatenate movies into %s: %s" % (
+                    output_path, six.ensure_str(output, errors="replace").strip()
+                )
+            )
 
-        # Log the version data for debugging
-        self.logger.debug(
-            "Populated Version data...",
-            extra={
-                "action_show_more_info": {
-                    "label": "Version Data",
-                    "tooltip": "Show the complete Version data dictionary",
-                    "text": "<pre>%s</pre>" % (
-                        pprint.pformat(version_data),
-                    )
-                }
-            }
+    def _render_item_with_worker_pool(self, item, max_workers, timeout=None):
+        """
+        Render the given item with the Movie Render Queue from the render worker pool.
+
+        If the item wasn't submitted yet, it is submitted, together with all
+        other validated items waiting to be rendered, each of them in its own
+        Unreal process. Only the render for the given item is waited for.
+
+        :param item: The item being published.
+        :param int max_workers: Maximum number of concurrent renders.
+        :param timeout: Optional maximum duration for each render, in seconds.
+        :returns: True if a movie file was generated for the item, False otherwise
+                  string representing the path of the generated movie file
+        """
+        if id(item) not in self._render_jobs:
+            if self._render_pool is None or self._render_pool_size != max_workers:
+                self._shutdown_render_pool()
+                self._render_pool = ThreadPoolExecutor(max_workers=max_workers)
+                self._render_pool_size = max_workers
+            submit_items = [item]
+            for other_item in self._pending_render_items.values():
+                if other_item is item or id(other_item) in self._render_jobs:
+                    continue
+                # Skip items which were unchecked after being validated.
+                if not getattr(other_item, "checked", True):
+                    continue
+                submit_items.append(other_item)
+            self.logger.info(
+                "Submitting %d renders, running up to %d of them concurrently." % (len(submit_items), max_workers)
+            )
+            for submit_item in submit_items:
+                render_request = self._get_movie_render_request(submit_item)
+                self.parent.ensure_folder_exists(os.path.dirname(render_request.output_path))
+                # Jobs must be created from the main thread, which is the only
+                # one allowed to use the Unreal API.
+                job = self._create_movie_queue_render_job([render_request], timeout=timeout)
+                self._render_pool_futures.append((self._render_pool.submit(job.run), job))
+                self._render_jobs[id(submit_item)] = job
+
+        job = self._render_jobs[id(item)]
+        if not job.done:
+            self.logger.info("Waiting for render %s to complete..." % job.name)
+        self._wait_for_render_job(job)
+        return job.get_results()[0]
+
+    def _render_with_render_worker(self, render_requests, idle_timeout, timeout=None):
+        """
+        Render the given sequences with the Movie Render Queue in the render
+        worker, starting it if needed.
+
+        :param render_requests: A list of :class:`MovieRenderRequest` instances.
+        :param int idle_timeout: Number of seconds after which an idle worker
+                                 quits, zero for never.
+        :param timeout: Optional maximum duration for the render, in seconds.
+        :returns: A list with a result for each request, each result is a tuple
+                  with True if a movie file was generated, False otherwise, and
+                  a string representing the path of the generated movie file.
+        """
+        spool_dir = os.path.join(self._get_unreal_saved_dir(), "ShotGrid", "RenderWorker")
+        log_path = os.path.join(self._get_unreal_saved_dir(), "Logs", "ShotGridRenderWorker.log")
+        # Use the regular Movie Render Queue command line, without a
+        # manifest, and let our executor pick up manifests.
+        cmd_args = self._get_movie_queue_cmd_args(None, log_path, render_requests[0].profile) + [
+            "-MoviePipelineLocalExecutorClass=/Script/MovieRenderPipelineCore.MoviePipelinePythonHostExecutor",
+            "-ExecutorPythonClass=/Engine/PythonTypes.ShotGridRenderWorkerExecutor",
+            "-ExecutePythonScript=\"%s\"" % os.path.join(self.disk_location, "movie_render_worker.py"),
+        ]
+        env = self._get_render_env()
+        env["SG_UNREAL_RENDER_WORKER_SPOOL"] = spool_dir
+        env["SG_UNREAL_RENDER_WORKER_IDLE_TIMEOUT"] = str(idle_timeout or 0)
+        resource_limits = _get_resource_limits(render_requests[0].profile)
+
+        queue = unreal.MoviePipelineQueue()
+        for render_request in render_requests:
+            self._add_movie_queue_job(queue, *render_request)
+        manifest_path = os.path.join(
+            self._get_unreal_saved_dir(), self._save_movie_queue_manifest(queue)
         )
+        # The worker can quit, e.g. when idle for too long, right when the
+        # request is submitted: restart it and submit the request again once.
+        for attempt in range(2):
+            worker = self._get_render_worker(cmd_args, spool_dir, env, log_path, resource_limits)
+            job = WorkerRenderJob(
+                os.path.basename(render_requests[0].output_path),
+                worker,
+                manifest_path,
+                output_paths=[render_request.output_path for render_request in render_requests],
+                timeout=timeout,
+            )
+            self._run_render_job(job)
+            if not job.worker_exited:
+                break
+            if not attempt:
+                self.logger.warning("Render worker exited, restarting it to render %s again." % job.name)
+        return job.get_results()
+
+    def _get_render_worker(self, cmd_args, spool_dir, env, log_path, resource_limits):
+        """
+        Return the render worker for the current session, started with the
+        given settings.
+
+        The worker is stored on the current engine, so it is retrieved after
+        hooks are reloaded. It is restarted if its settings changed.
+
+        :param cmd_args: A list of command line arguments for the worker process.
+        :param str spool_dir: Full path to the spool folder.
+        :param env: The environment for the worker process.
+        :param str log_path: Full path to the log file of the worker process.
+        :param resource_limits: A dictionary returned by :func:`_get_resource_limits`.
+        :returns: A running :class:`RenderWorker` instance.
+        """
+        engine = sgtk.platform.current_engine()
+        render_worker = getattr(engine, _RENDER_WORKER_ENGINE_ATTRIBUTE, None)
+        if render_worker and render_worker.running and (
+            render_worker.cmd_args != cmd_args
+            or render_worker.env != env
+            or render_worker.resource_limits != resource_limits
+        ):
+            # Render settings changed, e.g. another render profile is used.
+            self.logger.info("Restarting render worker with new render settings.")
+            render_worker.shutdown()
+        if render_worker is None or not render_worker.running:
+            self.logger.info("Starting render worker %s" % cmd_args)
+            render_worker = RenderWorker(
+                cmd_args, spool_dir, env=env, log_path=log_path, resource_limits=resource_limits
+            )
+            render_worker.start()
+            setattr(engine, _RENDER_WORKER_ENGINE_ATTRIBUTE, render_worker)
+            for warning in render_worker.warnings:
+                self.logger.warning(warning)
+        return render_worker
 
-        # Create the version
-        self.logger.info("Creating version for review...")
-        version = self.parent.shotgun.create("Version", version_data)
+    def cancel_renders(self):
+        """
+        Cancel all renders submitted to the render worker pool, killing running
+        render processes.
+        """
+        for job in self._render_jobs.values():
+            job.cancel()
+        self._shutdown_render_pool()
 
-        # Stash the version info in the item just in case
-        item.properties["sg_version_data"] = version
+    def _shutdown_render_pool(self):
+        """
+        Shut down the render worker pool, if any, cancelling renders which did
+        not start yet.
 
-        # On windows, ensure the path is utf-8 encoded to avoid issues with
-        # the shotgun api
-        upload_path = str(item.properties.get("publish_path"))
-        unreal.log("upload_path: {}".format(upload_path))
+        Running renders are not waited for, so their threads don't block
+        Unreal, they must be cancelled to be stopped.
+        """
+        for future, job in self._render_pool_futures:
+            if future.cancel():
+                # Complete the job as cancelled, so it is not waited for.
+                job.cancel()
+                job.run()
+        self._render_pool_futures = []
+        if self._render_pool is not None:
+            self._render_pool.shutdown(wait=False)
+        self._render_pool = None
+        self._render_pool_size = 0
+
+    def _run_render_job(self, job):
+        """
+        Run the given render job from a worker thread and wait for it to complete.
 
-        # Upload the file to SG
-        self.logger.info("Uploading content...")
-        self.parent.shotgun.upload(
-            "Version",
-            version["id"],
-            upload_path,
-            "sg_uploaded_movie"
-        )
-        self.logger.info("Upload complete!")
+        :param job: A :class:`RenderJob` instance.
+        :returns: A :class:`RenderJobResult` instance.
+        """
+        self.logger.info("Running %s" % job.cmd_args)
+        thread = threading.Thread(target=job.run, name="Render %s" % job.name)
+        thread.daemon = True
+        thread.start()
+        return self._wait_for_render_job(job)
 
-    def finalize(self, settings, item):
+    def _wait_for_render_job(self, job):
         """
-        Execute the finalization pass. This pass executes once all the publish
-        tasks have completed, and can for example be used to version up files.
+        Wait for the given render job to complete, reporting its progress.
 
-        :param settings: Dictionary of Settings. The keys are strings, matching
-            the keys returned in the settings property. The values are `Setting`
-            instances.
-        :param item: Item to process
+        Progress is displayed in an Unreal progress dialog which allows users
+        to cancel the render, and reported to the logger every 10 percent.
+
+        :param job: A :class:`RenderJob` instance.
+        :returns: A :class:`RenderJobResult` instance.
         """
-        # do the base class finalization
-        super(UnrealMoviePublishPlugin, self).finalize(settings, item)
+        with unreal.ScopedSlowTask(100, "Rendering %s" % job.name) as slow_task:
+            slow_task.make_dialog(True)
+            reported_percent = 0
+            while not job.wait(RenderJob.POLL_INTERVAL):
+                if slow_task.should_cancel():
+                    self.logger.warning("Cancelling render %s..." % job.name)
+                    job.cancel()
+                    self.cancel_renders()
+                percent = job.percent
+                if percent is None or percent <= reported_percent:
+                    # Keep the progress dialog responsive.
+                    slow_task.enter_progress_frame(0)
+                    continue
+                slow_task.enter_progress_frame(
+                    percent - reported_percent,
+                    "Rendering %s: %d%%" % (job.name, percent),
+                )
+                if int(percent / 10) > int(reported_percent / 10):
+                    if job.eta is not None:
+                        self.logger.info(
+                            "Rendering %s: %d%%, %s remaining." % (
+                                job.name, percent, datetime.timedelta(seconds=int(job.eta))
+                            )
+                        )
+                    else:
+                        self.logger.info("Rendering %s: %d%%" % (job.name, percent))
+                reported_percent = percent
+
+        result = job.result
+        self._log_cache_prewarm_messages()
+        for warning in job.warnings:
+            self.logger.warning(warning)
+        for name, (queries, hits) in sorted(job.cache_stats.items()):
+            if queries:
+                self.logger.info(
+                    "Render %s %s hit rate: %.1f%% (%d/%d)." % (
+                        job.name, name, 100.0 * hits / queries, hits, queries,
+                    )
+                )
+        if result.status == RenderJob.SUCCEEDED:
+            self.logger.info(
+                "Render %s completed in %s, log saved in %s." % (
+                    job.name, datetime.timedelta(seconds=int(result.duration)), result.log_path,
+                )
+            )
+        else:
+            self.logger.error(
+                "Render %s %s: %s See %s for details." % (
+                    job.name, result.status, result.error, result.log_path,
+                )
+            )
+        return result
 
     def _get_version_entity(self, item):
         """
@@ -723,13 +3634,16 @@ class UnrealMoviePublishPlugin(HookBaseClass):
         for dialog in engine.created_qt_dialogs:
             dialog.raise_()
 
-    def _unreal_render_sequence_with_sequencer(self, output_path, unreal_map_path, sequence_path):
+    def _unreal_render_sequence_with_sequencer(self, output_path, unreal_map_path, sequence_path, profile=None, timeout=None):
         """
         Renders a given sequence in a given level to a movie file with the Level Sequencer.
 
         :param str output_path: Full path to the movie to render.
         :param str unreal_map_path: Path of the Unreal map in which to run the sequence.
         :param str sequence_path: Content Browser path of sequence to render.
+        :param profile: Optional render profile dictionary, the "final" profile
+                        is used if not set.
+        :param timeout: Optional maximum duration for the render, in seconds.
         :returns: True if a movie file was generated, False otherwise
                   string representing the path of the generated movie file
         """
@@ -748,6 +3662,7 @@ class UnrealMoviePublishPlugin(HookBaseClass):
                 )
                 return False, None
 
+        profile = profile or _DEFAULT_RENDER_PROFILES["final"]
         # Render the sequence to a movie file using the following command-line arguments
         cmdline_args = [
             sys.executable,  # Unreal executable path
@@ -764,18 +3679,26 @@ class UnrealMoviePublishPlugin(HookBaseClass):
             "-MovieName=%s" % movie_name,  # Output filename
             "-game",
             "-MovieSceneCaptureType=/Script/MovieSceneCapture.AutomatedLevelSequenceCapture",
-            "-ResX=1280",
-            "-ResY=720",
+            "-ResX=%d" % profile["resolution"][0],
+            "-ResY=%d" % profile["resolution"][1],
             "-ForceRes",
             "-Windowed",
             "-MovieCinematicMode=yes",
             "-MovieFormat=Video",
-            "-MovieFrameRate=24",
-            "-MovieQuality=75",
-            "-NoTextureStreaming",
+            "-MovieFrameRate=%s" % (profile.get("frame_rate") or 24),
+            "-MovieQuality=%d" % profile.get("movie_quality", 75),
+        ]
+        if not profile.get("texture_streaming"):
+            cmdline_args.append("-NoTextureStreaming")
+        cmdline_args.extend([
             "-NoLoadingScreen",
             "-NoScreenMessages",
-        ]
+        ])
+        if profile.get("sequencer_console_settings"):
+            if profile.get("cvars"):
+                cmdline_args.append("-dpcvars=%s" % ",".join(profile["cvars"]))
+            if profile.get("exec_cmds"):
+                cmdline_args.append("-execcmds=%s" % ",".join(profile["exec_cmds"]))
 
         unreal.log(
             "Sequencer command-line arguments: {}".format(
@@ -783,19 +3706,26 @@ class UnrealMoviePublishPlugin(HookBaseClass):
             )
         )
 
-        # Make a shallow copy of the current environment and clear some variables
-        run_env = copy.copy(os.environ)
-        # Prevent SG TK to try to bootstrap in the new process
-        if "UE_SHOTGUN_BOOTSTRAP" in run_env:
-            del run_env["UE_SHOTGUN_BOOTSTRAP"]
-        if "UE_SHOTGRID_BOOTSTRAP" in run_env:
-            del run_env["UE_SHOTGRID_BOOTSTRAP"]
-
-        subprocess.call(cmdline_args, env=run_env)
-
-        return os.path.isfile(output_path), output_path
+        log_dir = os.path.join(self._get_unreal_saved_dir(), "Logs")
+        if not os.path.isdir(log_dir):
+            os.makedirs(log_dir)
+        f, log_path = tempfile.mkstemp(prefix="%s_" % movie_name, suffix=".log", dir=log_dir)
+        os.close(f)
+        cmdline_args.append("-abslog=\"%s\"" % log_path)
+
+        job = RenderJob(
+            output_file,
+            cmdline_args,
+            env=self._get_render_env(),
+            log_path=log_path,
+            output_paths=[output_path],
+            timeout=timeout,
+            resource_limits=_get_resource_limits(profile),
+        )
+        self._run_render_job(job)
+        return job.get_results()[0]
 
-    def _unreal_render_sequence_with_movie_queue(self, output_path, unreal_map_path, sequence_path, presets=None, shot_name=None):
+    def _unreal_render_sequence_with_movie_queue(self, output_path, unreal_map_path, sequence_path, presets=None, shot_name=None, profile=None, timeout=None):
         """
         Renders a given sequence in a given level with the Movie Render queue.
 
@@ -804,16 +3734,103 @@ class UnrealMoviePublishPlugin(HookBaseClass):
         :param str sequence_path: Content Browser path of sequence to render.
         :param presets: Optional :class:`unreal.MoviePipelineMasterConfig` instance to use for renderig.
         :param str shot_name: Optional shot name to render a single shot from this sequence.
+        :param profile: Optional render profile dictionary, the "final" profile
+                        is used if not set.
+        :param timeout: Optional maximum duration for the render, in seconds.
         :returns: True if a movie file was generated, False otherwise
                   string representing the path of the generated movie file
         :raises ValueError: If a shot name is specified but can't be found in
                             the sequence.
         """
+        return self._unreal_render_sequences_with_movie_queue(
+            [MovieRenderRequest(output_path, unreal_map_path, sequence_path, presets, shot_name, profile, None)],
+            timeout=timeout,
+        )[0]
+
+    def _unreal_render_sequences_with_movie_queue(self, render_requests, timeout=None):
+        """
+        Renders the given sequences with the Movie Render queue, in a single
+        Unreal process.
+
+        A Movie Render Queue job is created for each request, Unreal loads and
+        warms up once and renders all of them one after the other.
+
+        :param render_requests: A list of :class:`MovieRenderRequest` instances.
+        :param timeout: Optional maximum duration for the render, in seconds.
+        :returns: A list with a result for each request, each result is a tuple
+                  with True if a movie file was generated, False otherwise, and
+                  a string representing the path of the generated movie file.
+        :raises ValueError: If a shot name is specified but can't be found in
+                            the sequence.
+        """
+        job = self._create_movie_queue_render_job(render_requests, timeout=timeout)
+        self._run_render_job(job)
+        return job.get_results()
+
+    def _create_movie_queue_render_job(self, render_requests, timeout=None):
+        """
+        Create a job rendering the given sequences with the Movie Render queue,
+        in a single Unreal process.
+
+        The render profile of the first request is used for the process.
+
+        :param render_requests: A list of :class:`MovieRenderRequest` instances.
+        :param timeout: Optional maximum duration for the render, in seconds.
+        :returns: A :class:`RenderJob` instance.
+        :raises ValueError: If a shot name is specified but can't be found in
+                            the sequence.
+        """
+        # Use our own queue, so the queue in the Movie Render Queue UI is left
+        # untouched.
+        queue = unreal.MoviePipelineQueue()
+        for render_request in render_requests:
+            self._add_movie_queue_job(queue, *render_request)
+
+        manifest_path = self._save_movie_queue_manifest(queue)
+        # Each render process logs to its own file, next to its manifest.
+        log_path = "%s.log" % os.path.splitext(
+            os.path.join(self._get_unreal_saved_dir(), manifest_path)
+        )[0]
+        cmd_args = self._get_movie_queue_cmd_args(manifest_path, log_path, render_requests[0].profile)
+        unreal.log(
+            "Movie Queue command-line arguments: {}".format(
+                " ".join(cmd_args)
+            )
+        )
+        return RenderJob(
+            os.path.basename(render_requests[0].output_path),
+            cmd_args,
+            env=self._get_render_env(),
+            log_path=log_path,
+            output_paths=[render_request.output_path for render_request in render_requests],
+            timeout=timeout,
+            resource_limits=_get_resource_limits(render_requests[0].profile),
+        )
+
+    def _add_movie_queue_job(self, queue, output_path, unreal_map_path, sequence_path, presets=None, shot_name=None, profile=None, frame_range=None):
+        """
+        Add a job to render the given sequence in the given level to a Movie Render
+        Queue.
+
+        :param queue: A :class:`unreal.MoviePipelineQueue` instance.
+        :param str output_path: Full path to the movie to render.
+        :param str unreal_map_path: Path of the Unreal map in which to run the sequence.
+        :param str sequence_path: Content Browser path of sequence to render.
+        :param presets: Optional :class:`unreal.MoviePipelineMasterConfig` instance to use for renderig.
+        :param str shot_name: Optional shot name to render a single shot from this sequence.
+        :param profile: Optional render profile dictionary, the "final" profile
+                        is used if not set.
+        :param frame_range: Optional (start, end) tuple, with end excluded, to
+                            only render a part of the sequence, in display rate
+                            frames.
+        :returns: The added :class:`unreal.MoviePipelineExecutorJob` instance.
+        :raises ValueError: If a shot name is specified but can't be found in
+                            the sequence.
+        """
+        profile = profile or _DEFAULT_RENDER_PROFILES["final"]
         output_folder, output_file = os.path.split(output_path)
         movie_name = os.path.splitext(output_file)[0]
 
-        qsub = unreal.MoviePipelineQueueEngineSubsystem()
-        queue = qsub.get_queue()
         job = queue.allocate_new_job(unreal.MoviePipelineExecutorJob)
         job.sequence = unreal.SoftObjectPath(sequence_path)
         job.map = unreal.SoftObjectPath(unreal_map_path)
@@ -838,12 +3855,22 @@ class UnrealMoviePublishPlugin(HookBaseClass):
         # https://docs.unrealengine.com/4.26/en-US/PythonAPI/class/MoviePipelineOutputSetting.html?highlight=setting#unreal.MoviePipelineOutputSetting
         output_setting = config.find_or_add_setting_by_class(unreal.MoviePipelineOutputSetting)
         output_setting.output_directory = unreal.DirectoryPath(output_folder)
-        output_setting.output_resolution = unreal.IntPoint(1280, 720)
+        output_setting.output_resolution = unreal.IntPoint(*profile["resolution"])
         output_setting.file_name_format = movie_name
         output_setting.override_existing_output = True  # Overwrite existing files
-        # If needed we could enforce a frame rate, like for the Sequencer code.
-        # output_setting.output_frame_rate = unreal.FrameRate(24)
-        # output_setting.use_custom_frame_rate = True
+        if frame_range:
+            output_setting.use_custom_playback_range = True
+            output_setting.custom_start_frame = frame_range[0]
+            output_setting.custom_end_frame = frame_range[1]
+        if profile.get("frame_rate"):
+            output_setting.output_frame_rate = unreal.FrameRate(profile["frame_rate"])
+            output_setting.use_custom_frame_rate = True
+        if profile.get("spatial_samples") or profile.get("temporal_samples"):
+            aa_setting = config.find_or_add_setting_by_class(unreal.MoviePipelineAntiAliasingSetting)
+            if profile.get("spatial_samples"):
+                aa_setting.spatial_sample_count = profile["spatial_samples"]
+            if profile.get("temporal_samples"):
+                aa_setting.temporal_sample_count = profile["temporal_samples"]
         # Remove problematic settings
         for setting, reason in self._check_render_settings(config):
             self.logger.warning("Disabling %s: %s." % (setting.get_name(), reason))
@@ -854,7 +3881,17 @@ class UnrealMoviePublishPlugin(HookBaseClass):
         # Render to a movie
         config.find_or_add_setting_by_class(unreal.MoviePipelineAppleProResOutput)
         # TODO: check which codec we should use.
+        return job
+
+    def _save_movie_queue_manifest(self, queue):
+        """
+        Save the given Movie Render Queue to a manifest file which can be used
+        to render it in another Unreal process.
 
+        :param queue: A :class:`unreal.MoviePipelineQueue` instance.
+        :returns: The manifest file path, relative to the Unreal project "Saved"
+                  folder.
+        """
         # We render in a forked process that we can control.
         # It would be possible to render in from the running process using an
         # Executor, however it seems to sometimes deadlock if we don't let Unreal
@@ -884,15 +3921,38 @@ class UnrealMoviePublishPlugin(HookBaseClass):
         self.logger.debug("Queue manifest saved in %s" % new_path)
         # We now need a path local to the unreal project "Saved" folder.
         manifest_path = new_path.replace(
-            "%s%s" % (
-                os.path.abspath(
-                    os.path.join(unreal.SystemLibrary.get_project_directory(), "Saved")
-                ),
-                os.path.sep,
-            ),
+            "%s%s" % (self._get_unreal_saved_dir(), os.path.sep),
             "",
         )
         self.logger.debug("Manifest short path: %s" % manifest_path)
+        return manifest_path
+
+    def _get_unreal_saved_dir(self):
+        """
+        Return the absolute path to the Unreal project "Saved" folder.
+
+        :returns: A path.
+        """
+        return os.path.abspath(
+            os.path.join(unreal.SystemLibrary.get_project_directory(), "Saved")
+        )
+
+    def _get_movie_queue_cmd_args(self, manifest_path=None, log_path=None, profile=None):
+        """
+        Return the command line to render the given Movie Render Queue manifest
+        in a new Unreal process.
+
+        :param str manifest_path: Optional manifest path, relative to the Unreal
+                                  project "Saved" folder.
+        :param str log_path: Optional full path to a log file for the Unreal process.
+        :param profile: Optional render profile dictionary, the "final" profile
+                        is used if not set.
+        :returns: A list of command line arguments.
+        """
+        profile = profile or _DEFAULT_RENDER_PROFILES["final"]
+        cvars = list(profile.get("cvars") or [])
+        if not profile.get("texture_streaming"):
+            cvars.append("r.TextureStreaming=0")
         # Command line parameters were retrieved by submitting a queue in Unreal Editor with
         # a MoviePipelineNewProcessExecutor executor.
         # https://docs.unrealengine.com/4.27/en-US/PythonAPI/class/MoviePipelineNewProcessExecutor.html?highlight=executor
@@ -913,40 +3973,26 @@ class UnrealMoviePublishPlugin(HookBaseClass):
             "-SessionName=\"Publish2 Movie Render\"",
             "-nohmd",
             "-windowed",
-            "-ResX=1280",
-            "-ResY=720",
-            # TODO: check what these settings are
-            "-dpcvars=%s" % ",".join([
-                "sg.ViewDistanceQuality=4",
-                "sg.AntiAliasingQuality=4",
-                "sg.ShadowQuality=4",
-                "sg.PostProcessQuality=4",
-                "sg.TextureQuality=4",
-                "sg.EffectsQuality=4",
-                "sg.FoliageQuality=4",
-                "sg.ShadingQuality=4",
-                "r.TextureStreaming=0",
-                "r.ForceLOD=0",
-                "r.SkeletalMeshLODBias=-10",
-                "r.ParticleLODBias=-10",
-                "foliage.DitheredLOD=0",
-                "foliage.ForceLOD=0",
-                "r.Shadow.DistanceScale=10",
-                "r.ShadowQuality=5",
-                "r.Shadow.RadiusThreshold=0.001000",
-                "r.ViewDistanceScale=50",
-                "r.D3D12.GPUTimeout=0",
-                "a.URO.Enable=0",
-            ]),
-            "-execcmds=r.HLOD 0",
-            # This need to be a path relative the to the Unreal project "Saved" folder.
-            "-MoviePipelineConfig=\"%s\"" % manifest_path,
+            "-ResX=%d" % profile["resolution"][0],
+            "-ResY=%d" % profile["resolution"][1],
         ]
-        unreal.log(
-            "Movie Queue command-line arguments: {}".format(
-                " ".join(cmd_args)
-            )
-        )
+        if cvars:
+            cmd_args.append("-dpcvars=%s" % ",".join(cvars))
+        if profile.get("exec_cmds"):
+            cmd_args.append("-execcmds=%s" % ",".join(profile["exec_cmds"]))
+        if manifest_path:
+            # This need to be a path relative the to the Unreal project "Saved" folder.
+            cmd_args.append("-MoviePipelineConfig=\"%s\"" % manifest_path)
+        if log_path:
+            cmd_args.append("-abslog=\"%s\"" % log_path)
+        return cmd_args
+
+    def _get_render_env(self):
+        """
+        Return the environment to use for render processes.
+
+        :returns: A dictionary.
+        """
         # Make a shallow copy of the current environment and clear some variables
         run_env = copy.copy(os.environ)
         # Prevent SG TK to try to bootstrap in the new process
@@ -954,6 +4000,75 @@ class UnrealMoviePublishPlugin(HookBaseClass):
             del run_env["UE_SHOTGUN_BOOTSTRAP"]
         if "UE_SHOTGRID_BOOTSTRAP" in run_env:
             del run_env["UE_SHOTGRID_BOOTSTRAP"]
-        self.logger.info("Running %s" % cmd_args)
-        subprocess.call(cmd_args, env=run_env)
-        return os.path.isfile(output_path), output_path
+        if self._shared_ddc_path:
+            # Override the path of the "Shared" node of the DDC graph.
+            run_env["UE-SharedDataCachePath"] = self._shared_ddc_path
+        return run_env
+
+    def _setup_render_caches(self, settings):
+        """
+        Configure the shared caches used by render processes and start
+        prewarming them, if needed.
+
+        :param settings: Dictionary of Settings.
+        """
+        self._log_cache_prewarm_messages()
+        self._shared_ddc_path = settings["Shared DDC Path"].value or None
+        if self._shared_ddc_path and not os.path.isdir(self._shared_ddc_path):
+            os.makedirs(self._shared_ddc_path)
+        if not self._shared_ddc_path or not settings["Prewarm Render Caches"].value:
+            return
+        engine = sgtk.platform.current_engine()
+        prewarm_threads = getattr(engine, _CACHE_PREWARM_THREADS_ENGINE_ATTRIBUTE, None)
+        if prewarm_threads is None:
+            prewarm_threads = {}
+            setattr(engine, _CACHE_PREWARM_THREADS_ENGINE_ATTRIBUTE, prewarm_threads)
+        if self._shared_ddc_path in prewarm_threads:
+            # Only prewarm once per session.
+            return
+        local_ddc_dir = self._get_local_ddc_dir()
+        if not local_ddc_dir:
+            return
+        max_bytes = max(settings["Prewarm Size Limit"].value or 0, 0) * 1024 * 1024
+        self.logger.info(
+            "Prewarming %s from %s in the background." % (self._shared_ddc_path, local_ddc_dir)
+        )
+        thread = threading.Thread(
+            target=_prewarm_cache,
+            args=(local_ddc_dir, self._shared_ddc_path, max_bytes, self._cache_prewarm_messages),
+            name="Prewarm %s" % self._shared_ddc_path,
+        )
+        thread.daemon = True
+        prewarm_threads[self._shared_ddc_path] = thread
+        thread.start()
+
+    def _log_cache_prewarm_messages(self):
+        """
+        Log messages from cache prewarming threads.
+
+        This must be called from the main thread.
+        """
+        while self._cache_prewarm_messages:
+            level, message = self._cache_prewarm_messages.pop(0)
+            self.logger.log(level, message)
+
+    def _get_local_ddc_dir(self):
+        """
+        Return the local Derived Data Cache folder used by the editor.
+
+        :returns: A full path or None.
+        """
+        local_ddc_dir = os.environ.get("UE-LocalDataCachePath")
+        if local_ddc_dir and local_ddc_dir.lower() != "none":
+            return local_ddc_dir
+        # Default local DDC paths for source and installed builds.
+        for local_ddc_dir in [
+            os.path.join(unreal.SystemLibrary.get_project_directory(), "DerivedDataCache"),
+            os.path.join(
+                unreal.Paths.convert_relative_path_to_full(unreal.Paths.engine_version_agnostic_user_dir()),
+                "DerivedDataCache",
+            ),
+        ]:
+            if os.path.isdir(local_ddc_dir):
+                return os.path.abspath(local_ddc_dir)
+        return None
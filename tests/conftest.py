@@ -0,0 +1,66 @@
+"""
+Fixtures to load the Unreal publish hooks outside of Unreal.
+
+The `unreal` and `sgtk` modules are replaced with the stand-ins used by the
+collector benchmark, see `benchmarks/collector`.
+"""
+import importlib.util
+import os
+import sys
+import types
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(TESTS_DIR)
+HOOKS_DIR = os.path.join(REPO_ROOT, "hooks", "tk-multi-publish2", "unreal")
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks", "collector"))
+import bench_collector  # noqa: E402
+
+
+def _install_fake_modules():
+    """
+    Install the fake `unreal`, `sgtk` and `tank_vendor` modules needed to
+    import the hooks.
+    """
+    bench_collector._install_fake_modules()
+    six = types.ModuleType("tank_vendor.six")
+    six.ensure_str = lambda s, encoding="utf-8", errors="strict": (
+        s.decode(encoding, errors) if isinstance(s, bytes) else s
+    )
+    six.ensure_binary = lambda s, encoding="utf-8", errors="strict": (
+        s.encode(encoding, errors) if not isinstance(s, bytes) else s
+    )
+    tank_vendor = types.ModuleType("tank_vendor")
+    tank_vendor.six = six
+    sys.modules["tank_vendor"] = tank_vendor
+    sys.modules["tank_vendor.six"] = six
+
+
+def _load_hook(name):
+    """
+    Load the given hook as a new module, like tk-core does when hooks are
+    reloaded.
+
+    Fake modules are installed the first time, so the fake engine is kept for
+    the whole test session.
+    """
+    if "tank_vendor" not in sys.modules:
+        _install_fake_modules()
+    spec = importlib.util.spec_from_file_location(
+        "unreal_%s" % name, os.path.join(HOOKS_DIR, "%s.py" % name)
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def collector_module():
+    return _load_hook("collector")
+
+
+@pytest.fixture(scope="session")
+def publish_movie_module():
+    return _load_hook("publish_movie")
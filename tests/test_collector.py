@@ -0,0 +1,174 @@
+"""
+Tests for the Unreal publish collector pure logic.
+"""
+import random
+
+import pytest
+
+
+def _reference_paths(level_sequence, sequence_edits, visited=None):
+    """
+    Edit paths enumeration as done before it was memoized, used as a reference.
+    """
+    visited = list(visited or [])
+    visited.append(level_sequence)
+    if not sequence_edits.get(level_sequence):
+        return [[level_sequence]]
+    all_paths = []
+    for edit in sequence_edits[level_sequence]:
+        if edit.sequence in visited:
+            continue
+        for edit_path in _reference_paths(edit.sequence, sequence_edits, visited):
+            all_paths.append([level_sequence] + edit_path)
+    return all_paths
+
+
+def _random_edits(collector_module, rng, count, allow_cycles):
+    """
+    Return random child -> parent edits between `count` Level Sequences.
+    """
+    names = ["/Game/Seq_%03d.Seq_%03d" % (i, i) for i in range(count)]
+    edits = {}
+    for i, name in enumerate(names):
+        if allow_cycles:
+            candidates = names[:i] + names[i + 1 :]
+        else:
+            # Parents always have a lower index, so there is no cycle.
+            candidates = names[:i]
+        parents = rng.sample(candidates, min(len(candidates), rng.randint(0, 3)))
+        edits[name] = [
+            collector_module.SequenceEdit(parent, "Track", "Section_%d" % j)
+            for j, parent in enumerate(parents)
+        ]
+    return names, edits
+
+
+@pytest.mark.parametrize("allow_cycles", [False, True])
+def test_paths_match_reference(collector_module, allow_cycles):
+    collector = collector_module.UnrealSessionCollector()
+    rng = random.Random(1234)
+    for _ in range(20):
+        names, edits = _random_edits(collector_module, rng, 12, allow_cycles)
+        paths_cache = {}
+        for name in names:
+            assert collector.get_all_paths_from_sequence(
+                name, edits, paths_cache
+            ) == _reference_paths(name, edits)
+            # Without a shared cache as well.
+            assert collector.get_all_paths_from_sequence(
+                name, edits
+            ) == _reference_paths(name, edits)
+
+
+def test_paths_alternate_cuts(collector_module):
+    SequenceEdit = collector_module.SequenceEdit
+    edits = {
+        "Shot": [SequenceEdit("Seq", "Track", "Section")],
+        "Seq": [
+            SequenceEdit("Master", "Track", "Section"),
+            SequenceEdit("Master2", "Track", "Section"),
+        ],
+    }
+    collector = collector_module.UnrealSessionCollector()
+    assert collector.get_all_paths_from_sequence("Shot", edits) == [
+        ["Shot", "Seq", "Master"],
+        ["Shot", "Seq", "Master2"],
+    ]
+
+
+@pytest.mark.parametrize(
+    "definition, fields, expected",
+    [
+        (
+            "/Game/{Sequence}/{Shot}/",
+            {"Sequence": "seq_010", "Shot": "sh_020"},
+            "/Game/seq_010/sh_020/",
+        ),
+        ("/Game/{Sequence}/{Shot}/", {"Sequence": "seq_010"}, "/Game/seq_010/"),
+        (
+            "/Game/{Sequence}/{Shot}/",
+            {"Sequence": "seq_010", "Shot": None},
+            "/Game/seq_010/",
+        ),
+        ("/Game/{Sequence}/{Shot}/", {}, "/Game/"),
+        ("/Game/Cinematics/", {}, "/Game/Cinematics/"),
+        ("/Game/{Step}_{Version}/", {"Step": "anim", "Version": 3}, "/Game/anim_3/"),
+    ],
+)
+def test_apply_fields_to_prefix(collector_module, definition, fields, expected):
+    assert collector_module._apply_fields_to_prefix(definition, fields) == expected
+
+
+def _collect(collector, settings):
+    import bench_collector
+
+    root_item = bench_collector._Item("root", "root", "root")
+    collector.collect_selected_assets(root_item, settings)
+    return root_item.children
+
+
+def _collection_settings(scope):
+    import bench_collector
+
+    return {
+        "Lazy Level Sequence Items": bench_collector._Setting(True),
+        "Cache Sequence Edits": bench_collector._Setting(False),
+        "Keep Sequence Edits Index": bench_collector._Setting(False),
+        "Scope To Context": bench_collector._Setting(scope),
+    }
+
+
+def test_scoped_collection_falls_back_to_project(
+    collector_module, tmp_path, monkeypatch
+):
+    import fake_unreal
+
+    fake_unreal.build_project(str(tmp_path), sequences=2, shots=3, cuts=1)
+    collector = collector_module.UnrealSessionCollector()
+    all_items = _collect(collector, _collection_settings(False))
+    assert all_items
+
+    monkeypatch.setattr(
+        collector, "get_context_content_paths", lambda settings=None: ["/Game/Nowhere"]
+    )
+    scoped_items = _collect(collector, _collection_settings(True))
+    assert [item.name for item in scoped_items] == [item.name for item in all_items]
+
+
+def test_sequence_edit_index_survives_hook_reload(collector_module, tmp_path):
+    import conftest
+    import fake_unreal
+
+    project = fake_unreal.build_project(str(tmp_path), sequences=1, shots=2, cuts=1)
+    shot_asset = project.assets[0]
+    package_name = shot_asset.package_name
+    cache_path = str(tmp_path / "Saved" / "sequence_edits.json")
+
+    index = collector_module.get_sequence_edit_index(cache_path)
+    index.set(package_name, shot_asset.object_path, [])
+    assert index.get(package_name)["object_path"] == shot_asset.object_path
+
+    # A reloaded hook retrieves entries from the engine, without the cache file.
+    reloaded_module = conftest._load_hook("collector")
+    reloaded_index = reloaded_module.get_sequence_edit_index(cache_path)
+    assert reloaded_index.get(package_name)["object_path"] == shot_asset.object_path
+
+    # Entries are invalidated when their package is saved again.
+    package_file = tmp_path / "Content" / ("%s.uasset" % package_name[len("/Game/") :])
+    package_file.write_bytes(b"\0" * 128)
+    assert reloaded_index.get(package_name) is None
+
+
+def test_sequence_edit_graph_rebuild(collector_module, tmp_path):
+    import fake_unreal
+
+    fake_unreal.build_project(str(tmp_path), sequences=2, shots=3, cuts=1)
+    graph = collector_module.SequenceEditGraph()
+    graph.build()
+    edits = dict((path, list(edits)) for path, edits in graph.edits.items())
+    scanned_count = graph.scanned_count
+    assert edits and scanned_count
+    # Building the same graph again does not accumulate edits or counts.
+    graph.build()
+    assert dict(graph.edits) == edits
+    assert graph.scanned_count == scanned_count
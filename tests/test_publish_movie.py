@@ -0,0 +1,239 @@
+"""
+Tests for the Unreal movie publish plugin pure logic.
+"""
+import os
+import sys
+import time
+
+import pytest
+
+
+def _write(path, content="\0"):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, "w") as fh:
+        fh.write(content)
+
+
+def test_external_packages_stamp(publish_movie_module, tmp_path):
+    import fake_unreal
+
+    fake_unreal.build_project(
+        str(tmp_path), sequences=1, shots=1, cuts=1, write_files=False
+    )
+    content_dir = str(tmp_path / "Content")
+    stamp = publish_movie_module._get_external_packages_stamp
+    assert stamp("/Game/Maps/Main") is None
+
+    actor_path = os.path.join(
+        content_dir, "__ExternalActors__", "Maps", "Main", "0", "AB", "Actor.uasset"
+    )
+    _write(actor_path)
+    actor_stamp = stamp("/Game/Maps/Main")
+    assert actor_stamp
+    # Other maps are not affected.
+    assert stamp("/Game/Maps/Other") is None
+
+    # Editing an actor changes the stamp.
+    _write(actor_path, "\0\0")
+    edited_stamp = stamp("/Game/Maps/Main")
+    assert edited_stamp != actor_stamp
+
+    # So does adding an external object.
+    _write(
+        os.path.join(
+            content_dir,
+            "__ExternalObjects__",
+            "Maps",
+            "Main",
+            "0",
+            "CD",
+            "Object.uasset",
+        )
+    )
+    assert stamp("/Game/Maps/Main") != edited_stamp
+
+
+def test_render_cache_set_returns_replaced_movie(publish_movie_module, tmp_path):
+    first_path = str(tmp_path / "first.mov")
+    second_path = str(tmp_path / "second.mov")
+    _write(first_path)
+    _write(second_path)
+    cache = publish_movie_module.RenderCache(str(tmp_path / "shots.json"))
+    assert cache.set("shot_a", first_path) is None
+    assert cache.set("shot_b", first_path) is None
+    # The first movie is still used by the second shot.
+    assert cache.set("shot_a", second_path) is None
+    assert cache.set("shot_b", second_path) == first_path
+    assert cache.set("shot_b", second_path) is None
+
+
+def test_deferred_upload_queue_is_off_peak(publish_movie_module, tmp_path):
+    import datetime
+
+    queue = publish_movie_module.DeferredUploadQueue(
+        str(tmp_path / "uploads.json"), None
+    )
+
+    def at(hour):
+        return datetime.datetime(2024, 1, 1, hour, 30)
+
+    assert queue.is_off_peak(at(12))
+    # A window within a day.
+    queue.off_peak_hours = (9, 17)
+    assert not queue.is_off_peak(at(8))
+    assert queue.is_off_peak(at(9))
+    assert queue.is_off_peak(at(16))
+    assert not queue.is_off_peak(at(17))
+    # A window spanning midnight.
+    queue.off_peak_hours = (20, 7)
+    assert queue.is_off_peak(at(20))
+    assert queue.is_off_peak(at(0))
+    assert queue.is_off_peak(at(6))
+    assert not queue.is_off_peak(at(7))
+    assert not queue.is_off_peak(at(12))
+
+
+def test_frame_cut(publish_movie_module):
+    frame_cut = publish_movie_module._get_frame_cut
+    # Seek to the middle of the first frame, keep a number of frames.
+    seek_time, frame_count = frame_cut(48, 96, (24, 1))
+    assert seek_time == pytest.approx(48.5 / 24)
+    assert frame_count == 48
+    # Fractional frame rates.
+    seek_time, frame_count = frame_cut(100, 130, (30000, 1001))
+    assert seek_time == pytest.approx(100.5 * 1001 / 30000)
+    assert frame_count == 30
+    # The seek time is always strictly within the first frame.
+    for start_frame in range(0, 10000, 7):
+        seek_time, _ = frame_cut(start_frame, start_frame + 1, (30000, 1001))
+        assert int(seek_time * 30000 / 1001) == start_frame
+    # Frames are converted to the movie frame rate, if different.
+    seek_time, frame_count = frame_cut(24, 48, (24, 1), (48, 1))
+    assert seek_time == pytest.approx(48.5 / 48)
+    assert frame_count == 48
+    assert frame_cut(24, 48, (24, 1), (24, 1)) == frame_cut(24, 48, (24, 1))
+
+
+def test_copy_missing_files_size_limit(publish_movie_module, tmp_path):
+    source_dir = str(tmp_path / "source")
+    target_dir = str(tmp_path / "target")
+    for name, mtime in [("older", 1000), ("old", 2000), ("new", 3000)]:
+        path = os.path.join(source_dir, "sub", "%s.ddc" % name)
+        _write(path, "x" * 10)
+        os.utime(path, (mtime, mtime))
+    copy = publish_movie_module._copy_missing_files
+    # Most recent files are copied first, up to the limit.
+    assert copy(source_dir, target_dir, max_bytes=25) == (2, 20)
+    assert sorted(os.listdir(os.path.join(target_dir, "sub"))) == ["new.ddc", "old.ddc"]
+    # Files already there are not copied again.
+    assert copy(source_dir, target_dir) == (1, 10)
+    assert copy(source_dir, target_dir) == (0, 0)
+
+
+@pytest.mark.parametrize(
+    "resource_limits",
+    [
+        {},
+        {"priority": None, "cpu_affinity": None, "memory_limit": None},
+        {"priority": "below_normal", "cpu_affinity": [0, 2], "memory_limit": 16384},
+    ],
+)
+def test_check_resource_limits_valid(publish_movie_module, resource_limits):
+    publish_movie_module._check_resource_limits(resource_limits)
+
+
+@pytest.mark.parametrize(
+    "resource_limits",
+    [
+        {"priority": "lowest"},
+        {"cpu_affinity": []},
+        {"cpu_affinity": [0, -1]},
+        {"cpu_affinity": ["0"]},
+        {"memory_limit": 0},
+        {"memory_limit": "16GB"},
+    ],
+)
+def test_check_resource_limits_invalid(publish_movie_module, resource_limits):
+    with pytest.raises(ValueError):
+        publish_movie_module._check_resource_limits(resource_limits)
+
+
+def test_worker_render_job_result_written_before_exit(publish_movie_module, tmp_path):
+    import json
+
+    class ExitingWorker(publish_movie_module.RenderWorker):
+        @property
+        def running(self):
+            # The worker completes pending requests and quits.
+            for name in os.listdir(self.spool_dir):
+                if name.endswith(self.REQUEST_SUFFIX):
+                    os.remove(os.path.join(self.spool_dir, name))
+                    request_id = name[: -len(self.REQUEST_SUFFIX)]
+                    _write(
+                        os.path.join(self.spool_dir, request_id + self.RESULT_SUFFIX),
+                        json.dumps({"success": True, "error": None}),
+                    )
+            return False
+
+    spool_dir = tmp_path / "spool"
+    spool_dir.mkdir()
+    worker = ExitingWorker(["UnrealEditor-Cmd.exe"], str(spool_dir))
+    job = publish_movie_module.WorkerRenderJob("shot", worker, "manifest.utxt")
+    assert job.run() == 0
+    assert job.status == job.SUCCEEDED
+    assert not job.worker_exited
+
+
+def test_deferred_upload_queue_restarts_after_draining(publish_movie_module, tmp_path):
+    import threading
+
+    uploaded = []
+    done = threading.Event()
+
+    def upload(version_id, movie_path, ffmpeg_path):
+        uploaded.append(version_id)
+        done.set()
+
+    queue = publish_movie_module.DeferredUploadQueue(
+        str(tmp_path / "uploads.json"), upload
+    )
+    for version_id in [1, 2]:
+        done.clear()
+        queue.add(version_id, str(tmp_path / ("%d.mov" % version_id)))
+        assert done.wait(5)
+        # Wait for the thread to see the empty queue and exit.
+        for _ in range(500):
+            if queue._thread is None:
+                break
+            time.sleep(0.01)
+        assert queue._thread is None
+    assert uploaded == [1, 2]
+    assert not queue.pending
+
+
+def test_render_job_cache_stats(publish_movie_module):
+    job = publish_movie_module.RenderJob("render", ["UnrealEditor-Cmd.exe"])
+    log_excerpt = [
+        "[2024.01.01-12.00.00:000][  0]LogShaderCompilers: Display: Total job queries 1,234, among them cache hits 1,000 (81.04%)",
+        "[2024.01.01-12.00.00:000][  0]LogDerivedDataCache: Display: Total Gets: 12,345, Hits: 11,000, Misses: 1,345",
+        "[2024.01.01-12.00.00:000][  0]LogMovieRenderPipeline: Display: Frame 12/240",
+    ]
+    for line in log_excerpt:
+        job._parse_cache_stats(line)
+    assert job.cache_stats == {
+        "shader job cache": (1234, 1000),
+        "DDC": (12345, 11000),
+    }
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Limits are applied on Windows.")
+def test_start_render_process_reports_unsupported_limits(publish_movie_module):
+    process, warnings = publish_movie_module._start_render_process(
+        [sys.executable, "-c", "pass"],
+        None,
+        {"priority": None, "cpu_affinity": [0], "memory_limit": 1024},
+    )
+    assert process.wait() == 0
+    assert len(warnings) == 2